@@ -0,0 +1,299 @@
+"""
+Archival tier for cold form data
+
+Whole months of wheel specifications (by submitted_date) and bogie checksheets
+(by inspection_date) are moved out of the hot tables into zstd-compressed
+Parquet files, one directory per month:
+
+    <ARCHIVE_DIR>/<table>/month=YYYY-MM/part-<timestamp>.parquet
+
+The hot tables then only hold recent inspections, so their indexes, vacuum
+and unfiltered queries stop growing with history. GET requests whose date
+range reaches an archived month read the matching Parquet files as well.
+Archived form numbers are kept in archived_form_numbers, where an insert
+trigger still rejects them, so they cannot be submitted again.
+
+Usage:
+    python archive.py --before 2024-01                 # archive every month before Jan 2024
+    python archive.py --table wheel_specifications --month 2023-06
+"""
+import argparse
+import os
+import time
+from datetime import date, datetime
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import orjson
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, JSON, String, Text, select, delete, insert, literal
+
+from database import open_session
+from models import WheelSpecification, BogieChecksheet, ArchivedFormNumber
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "10000"))
+
+# Table name -> (model, column whose month decides the partition)
+ARCHIVE_TABLES = {
+    "wheel_specifications": (WheelSpecification, "submitted_date"),
+    "bogie_checksheets": (BogieChecksheet, "inspection_date"),
+}
+
+# A condition is (column name, operator function, value), e.g. ("submitted_by", operator.eq, "u1");
+# the same list is applied to SQLAlchemy columns and to pyarrow fields. Filters
+# inside JSON columns cannot be pushed down to Parquet and are passed as a
+# row_filter over the decoded row tuples instead.
+
+def _arrow_type(column):
+    import pyarrow as pa
+    
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Float):
+        return pa.float64()
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, DateTime):
+        return pa.timestamp("us")
+    if isinstance(column.type, Date):
+        return pa.date32()
+    if isinstance(column.type, (String, Text, JSON)):
+        return pa.string()
+    raise TypeError(f"No Parquet type for column {column.name} ({column.type})")
+
+def _arrow_schema(model):
+    import pyarrow as pa
+    
+    return pa.schema([(column.name, _arrow_type(column)) for column in model.__table__.columns])
+
+def _month_bounds(month: str) -> Tuple[date, date]:
+    start = datetime.strptime(month, "%Y-%m").date()
+    end = date(start.year + (start.month == 12), start.month % 12 + 1, 1)
+    return start, end
+
+def _table_dir(table_name: str) -> str:
+    return os.path.join(ARCHIVE_DIR, table_name)
+
+def archived_months(table_name: str) -> List[str]:
+    """Months that have at least one archive file for the table"""
+    path = _table_dir(table_name)
+    if not os.path.isdir(path):
+        return []
+    return sorted(entry[len("month="):] for entry in os.listdir(path) if entry.startswith("month="))
+
+def covers(table_name: str, from_date: Optional[date], to_date: Optional[date]) -> bool:
+    """Whether the date range overlaps an archived month (only ranged queries read the archive)"""
+    if from_date is None:
+        return False
+    low = from_date.strftime("%Y-%m")
+    high = to_date.strftime("%Y-%m") if to_date else "9999-12"
+    return any(low <= month <= high for month in archived_months(table_name))
+
+def _rows_remain(model, conditions) -> bool:
+    """Whether any of the rows being archived are still in the hot table (fresh session)"""
+    db = open_session()
+    try:
+        return db.scalar(select(model.id).where(*conditions).limit(1)) is not None
+    finally:
+        db.close()
+
+def archive_month(table_name: str, month: str) -> int:
+    """Move one month of rows into a Parquet file and delete them from the hot table"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    model, partition_column = ARCHIVE_TABLES[table_name]
+    start, end = _month_bounds(month)
+    partition = getattr(model, partition_column)
+    if not isinstance(partition.type, Date):
+        # Dates stored as ISO strings compare correctly as strings
+        start, end = start.isoformat(), end.isoformat()
+    
+    columns = list(model.__table__.columns)
+    json_columns = {column.name for column in columns if isinstance(column.type, JSON)}
+    schema = _arrow_schema(model)
+    
+    timestamp = int(time.time() * 1000)
+    month_dir = os.path.join(_table_dir(table_name), f"month={month}")
+    final_path = os.path.join(month_dir, f"part-{timestamp}.parquet")
+    # Written beside the month directories; the "_" prefix keeps dataset scans from reading it
+    tmp_path = os.path.join(_table_dir(table_name), f"_month={month}-part-{timestamp}.parquet.tmp")
+    os.makedirs(_table_dir(table_name), exist_ok=True)
+    
+    db = open_session()
+    archived = 0
+    last_id = 0
+    writer = None
+    archived_rows = None
+    try:
+        while True:
+            # Keyset batches keep memory bounded regardless of month size
+            rows = db.execute(
+                select(*columns)
+                .where(partition >= start, partition < end, model.id > last_id)
+                .order_by(model.id)
+                .limit(ARCHIVE_BATCH_SIZE)
+            ).mappings().all()
+            if not rows:
+                break
+            batch = {column.name: [] for column in columns}
+            for row in rows:
+                for name, value in row.items():
+                    if name in json_columns and value is not None:
+                        value = orjson.dumps(value).decode()
+                    batch[name].append(value)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+            writer.write_table(pa.Table.from_pydict(batch, schema=schema))
+            archived += len(rows)
+            last_id = rows[-1]["id"]
+        
+        if writer is None:
+            return 0
+        writer.close()
+        writer = None
+        os.makedirs(month_dir, exist_ok=True)
+        archived_rows = (partition >= start, partition < end, model.id <= last_id)
+        os.replace(tmp_path, final_path)
+        
+        # Rows are only removed once the file is safely in place; their form
+        # numbers stay reserved in the same transaction
+        db.execute(insert(ArchivedFormNumber).from_select(
+            ["form_type", "form_number"],
+            select(literal(table_name), model.form_number).where(*archived_rows)
+        ))
+        db.execute(delete(model).where(*archived_rows))
+        db.commit()
+        return archived
+        
+    except Exception:
+        db.rollback()
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        if archived_rows is not None and os.path.exists(final_path):
+            # Unless the delete committed after all, the rows are still hot and
+            # the file would duplicate them in ranged reads and rollup rebuilds
+            try:
+                remain = _rows_remain(model, archived_rows)
+            except Exception:
+                print(f" Could not check whether {table_name} {month} was deleted; remove {final_path} if its rows are still in the table")
+            else:
+                if remain:
+                    os.remove(final_path)
+                    if not os.listdir(month_dir):
+                        os.rmdir(month_dir)
+        raise
+    finally:
+        db.close()
+
+def _dataset_filter(table_name: str, conditions: Sequence[tuple], months: Sequence[str]):
+    import pyarrow.dataset as ds
+    
+    expression = ds.field("month").isin(list(months))
+    for column, op, value in conditions:
+        expression = expression & op(ds.field(column), value)
+    return expression
+
+def _dataset(table_name: str):
+    import pyarrow.dataset as ds
+    
+    return ds.dataset(_table_dir(table_name), format="parquet", partitioning="hive")
+
+def _months_in_range(table_name: str, from_date: date, to_date: Optional[date]) -> List[str]:
+    low = from_date.strftime("%Y-%m")
+    high = to_date.strftime("%Y-%m") if to_date else "9999-12"
+    return [month for month in archived_months(table_name) if low <= month <= high]
+
+def _rows(table_name: str, columns: Sequence[str], data) -> List[tuple]:
+    """Row tuples of an Arrow table or batch, with JSON columns decoded as in the hot table"""
+    model, _ = ARCHIVE_TABLES[table_name]
+    values = []
+    for name in columns:
+        column = data.column(name).to_pylist()
+        if isinstance(model.__table__.columns[name].type, JSON):
+            column = [orjson.loads(value) if value is not None else None for value in column]
+        values.append(column)
+    return list(zip(*values))
+
+def read_archived(
+    table_name: str,
+    columns: Sequence[str],
+    conditions: Sequence[tuple],
+    from_date: date,
+    to_date: Optional[date] = None,
+    limit: Optional[int] = None,
+    row_filter: Optional[Callable[[tuple], bool]] = None
+) -> List[tuple]:
+    """Archived rows matching the conditions, ordered by id, as tuples in `columns` order"""
+    months = _months_in_range(table_name, from_date, to_date)
+    if not months:
+        return []
+    table = _dataset(table_name).to_table(
+        columns=list(columns), filter=_dataset_filter(table_name, conditions, months)
+    ).sort_by("id")
+    if row_filter is None:
+        if limit is not None:
+            table = table.slice(0, limit)
+        return _rows(table_name, columns, table)
+    rows = [row for row in _rows(table_name, columns, table) if row_filter(row)]
+    return rows if limit is None else rows[:limit]
+
+def iter_archived_batches(
+    table_name: str,
+    columns: Sequence[str],
+    conditions: Sequence[tuple],
+    from_date: date,
+    to_date: Optional[date] = None,
+    row_filter: Optional[Callable[[tuple], bool]] = None
+) -> Iterator[List[tuple]]:
+    """Stream archived rows as lists of tuples (month order, not globally ordered by id)"""
+    months = _months_in_range(table_name, from_date, to_date)
+    if not months:
+        return
+    scanner = _dataset(table_name).scanner(
+        columns=list(columns), filter=_dataset_filter(table_name, conditions, months)
+    )
+    for batch in scanner.to_batches():
+        rows = _rows(table_name, columns, batch)
+        if row_filter is not None:
+            rows = [row for row in rows if row_filter(row)]
+        if rows:
+            yield rows
+
+def _months_before(table_name: str, cutoff: str) -> List[str]:
+    model, partition_column = ARCHIVE_TABLES[table_name]
+    partition = getattr(model, partition_column)
+    db = open_session()
+    try:
+        oldest = db.scalar(select(partition).order_by(partition).limit(1))
+    finally:
+        db.close()
+    if oldest is None:
+        return []
+    if isinstance(oldest, str):
+        oldest = date.fromisoformat(oldest[:10])
+    months = []
+    current = oldest.replace(day=1)
+    end, _ = _month_bounds(cutoff)
+    while current < end:
+        months.append(current.strftime("%Y-%m"))
+        current = _month_bounds(current.strftime("%Y-%m"))[1]
+    return months
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move cold months of form data to Parquet archives")
+    parser.add_argument("--table", choices=sorted(ARCHIVE_TABLES), help="Only archive this table")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--month", help="Archive a single month (YYYY-MM)")
+    group.add_argument("--before", help="Archive every month before this one (YYYY-MM)")
+    args = parser.parse_args()
+    
+    for table_name in ([args.table] if args.table else sorted(ARCHIVE_TABLES)):
+        months = [args.month] if args.month else _months_before(table_name, args.before)
+        for month in months:
+            start = time.perf_counter()
+            count = archive_month(table_name, month)
+            if count:
+                print(f" Archived {count} {table_name} rows for {month} in {time.perf_counter() - start:.1f}s")
+    print(" Archival completed!")
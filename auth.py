@@ -1,14 +1,21 @@
 from datetime import datetime, timedelta
 from typing import Optional
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event
+from sqlalchemy.ext.asyncio import AsyncSession
 import os
 from dotenv import load_dotenv
 
-from database import get_db
+from cache import TTLCache
+from database import open_async_session
+from metrics import Histogram
 from models import User
 
 load_dotenv()
@@ -18,8 +25,93 @@ SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved users are cached per token subject so hot clients skip the database
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+
+# Password hashing: the first scheme is used for new hashes and older schemes
+# or bcrypt costs are upgraded transparently on the next successful login
+PASSWORD_SCHEMES = [s.strip() for s in os.getenv("PASSWORD_SCHEMES", "bcrypt").split(",") if s.strip()]
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+pwd_context = CryptContext(
+    schemes=PASSWORD_SCHEMES,
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_desired_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_desired_rounds=BCRYPT_ROUNDS,
+)
 security = HTTPBearer()
+user_cache = TTLCache(max_size=USER_CACHE_MAX_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
+def invalidate_user(phone_number: str):
+    """Drop a cached user, e.g. after deactivation"""
+    user_cache.delete(phone_number)
+
+@event.listens_for(User.is_active, "set")
+def _invalidate_on_deactivate(target, value, oldvalue, initiator):
+    if not value and target.phone_number is not None:
+        invalidate_user(target.phone_number)
+
+class PasswordHashPool:
+    """Bounded thread pool that keeps bcrypt/argon2 work off the event loop"""
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds = Histogram()
+        self.run_seconds = Histogram()
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent logins, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        submitted = time.perf_counter()
+        
+        def job():
+            started = time.perf_counter()
+            self.queue_wait_seconds.observe(started - submitted)
+            with self._lock:
+                self.in_flight += 1
+            try:
+                return fn(*args)
+            finally:
+                self.run_seconds.observe(time.perf_counter() - started)
+                with self._lock:
+                    self.in_flight -= 1
+                    self.completed += 1
+        
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "queued": max(self.pending - self.in_flight, 0),
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds": self.queue_wait_seconds.snapshot(),
+            "run_seconds": self.run_seconds.snapshot(),
+        }
+
+password_hash_pool = PasswordHashPool(PASSWORD_HASH_CONCURRENCY, PASSWORD_HASH_MAX_QUEUE)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
@@ -27,12 +119,19 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
-def authenticate_user(db: Session, phone_number: str, password: str):
-    user = db.query(User).filter(User.phone_number == phone_number).first()
+async def authenticate_user(db: AsyncSession, phone_number: str, password: str):
+    user = await db.scalar(select(User).where(User.phone_number == phone_number).limit(1))
     if not user:
         return False
-    if not verify_password(password, user.password_hash):
+    valid, new_hash = await password_hash_pool.run(
+        pwd_context.verify_and_update, password, user.password_hash
+    )
+    if not valid:
         return False
+    if new_hash:
+        # Stored hash uses a deprecated scheme or cost; re-hash with the current one
+        user.password_hash = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -46,8 +145,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     return encoded_jwt
 
 async def get_current_user(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    credentials: HTTPAuthorizationCredentials = Depends(security)
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -63,7 +161,15 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.phone_number == phone_number).first()
-    if user is None:
+    user = user_cache.get(phone_number)
+    if user is not None:
+        return user
+    
+    async with open_async_session() as db:
+        user = await db.scalar(select(User).where(User.phone_number == phone_number).limit(1))
+    if user is None or not user.is_active:
         raise credentials_exception
+    
+    # Never keep the user cached past the expiry of the token that resolved it
+    user_cache.set(phone_number, user, ttl=payload["exp"] - time.time())
     return user
@@ -0,0 +1,62 @@
+"""
+Backfill the numeric measurement columns of existing wheel specifications
+Run after scripts/migrate_wheel_measurements.sql; safe to re-run
+"""
+import argparse
+
+from sqlalchemy import select, update, bindparam
+
+from database import open_session
+from measurements import MEASURED_COLUMNS, measurement_columns
+from models import WheelSpecification
+
+def backfill_measurements(batch_size: int = 1000, only_missing: bool = True):
+    print("Backfilling wheel measurement columns...")
+    
+    source_columns = [WheelSpecification.id] + [getattr(WheelSpecification, c) for c in MEASURED_COLUMNS]
+    db = open_session()
+    last_id = 0
+    updated = 0
+    
+    try:
+        while True:
+            # Keyset batches keep memory flat on large tables
+            query = select(*source_columns).where(WheelSpecification.id > last_id)
+            if only_missing:
+                query = query.where(WheelSpecification.tread_diameter_new_nominal.is_(None))
+            rows = db.execute(query.order_by(WheelSpecification.id).limit(batch_size)).all()
+            if not rows:
+                break
+            
+            params = []
+            for row in rows:
+                values = measurement_columns(dict(zip(MEASURED_COLUMNS, row[1:])))
+                params.append({"row_id": row.id, **values})
+            
+            db.execute(
+                update(WheelSpecification.__table__)
+                .where(WheelSpecification.__table__.c.id == bindparam("row_id"))
+                .values({column: bindparam(column) for column in params[0] if column != "row_id"}),
+                params
+            )
+            db.commit()
+            
+            last_id = rows[-1].id
+            updated += len(rows)
+            print(f"   ... {updated} rows backfilled (up to id {last_id})")
+        
+        print(f" Backfill completed: {updated} rows updated")
+        
+    except Exception as e:
+        print(f" Error backfilling measurements: {e}")
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill numeric wheel measurement columns")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--all", action="store_true", help="Re-parse every row, not only unparsed ones")
+    args = parser.parse_args()
+    backfill_measurements(batch_size=args.batch_size, only_missing=not args.all)
@@ -0,0 +1,130 @@
+"""
+Microbenchmark: per-request validation and row mapping, hand-written vs form_engine
+
+Compiles form_engine definitions equivalent to the wheel specification and
+bogie checksheet forms (on a separate declarative base, so no tables are
+registered), checks that they map a submission to the same row as
+form_rows.py, then times one request's worth of work both ways:
+    - validate: request body dict -> Pydantic model
+    - map:      model -> row dict for the insert (incl. measurement columns)
+
+The engine's schemas check a little more than the hand-written ones: the
+form number and inspector are limited to their 50-character columns, and
+the bogie inspectionDate is parsed into a date (BogieChecksheetCreate checks
+the format and keeps the string). No database is needed.
+
+Usage:
+    python benchmarks/bench_forms.py [--requests 20000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from sqlalchemy import Column, Float
+from sqlalchemy.orm import declarative_base
+
+from form_engine import CompiledForm, FormDefinition, FormField, FormSection
+from form_rows import wheel_spec_to_row, bogie_checksheet_to_row
+from load_test import SAMPLE_FIELDS, SAMPLE_BOGIE
+from measurements import MEASURED_COLUMNS, measurement_columns
+from schemas import WheelSpecificationCreate, BogieChecksheetCreate, WHEEL_SPEC_FIELD_COLUMNS
+
+WHEEL_BODY = {
+    "formNumber": "WHEEL-2025-0000001",
+    "submittedBy": "user_id_123",
+    "submittedDate": "2025-07-03",
+    "fields": SAMPLE_FIELDS,
+}
+BOGIE_BODY = {
+    "formNumber": "BOGIE-2025-0000001",
+    "inspectionBy": "user_id_456",
+    "inspectionDate": "2025-07-03",
+    **SAMPLE_BOGIE,
+}
+
+def compile_forms():
+    """Engine definitions of the two hand-written forms"""
+    base = declarative_base()
+    measurement_names = [
+        f"{column}_{part}" for column in MEASURED_COLUMNS for part in ("nominal", "min", "max")
+    ] + ["condemning_margin"]
+    wheel = CompiledForm(FormDefinition(
+        name="wheel_specifications",
+        form_number_prefix="WHEEL-",
+        sections=[FormSection("fields", [FormField(name, column) for name, column in WHEEL_SPEC_FIELD_COLUMNS.items()])],
+        derive=measurement_columns,
+        extra_columns={name: Column(Float) for name in measurement_names},
+    ), base)
+    bogie = CompiledForm(FormDefinition(
+        name="bogie_checksheets",
+        inspector_field="inspectionBy",
+        date_field="inspectionDate",
+        sections=[
+            FormSection(name, list(fields), store="json", column=column)
+            for name, column, fields in (
+                ("bogieDetails", "bogie_details", SAMPLE_BOGIE["bogieDetails"]),
+                ("bogieChecksheet", "bogie_checksheet", SAMPLE_BOGIE["bogieChecksheet"]),
+                ("bmbcChecksheet", "bmbc_checksheet", SAMPLE_BOGIE["bmbcChecksheet"]),
+            )
+        ],
+    ), base)
+    return wheel, bogie
+
+def without_timestamps(row: dict) -> dict:
+    return {key: value for key, value in row.items() if key not in ("created_at", "updated_at")}
+
+def check_rows(wheel, bogie):
+    """Both paths must produce the same insert"""
+    assert without_timestamps(wheel.to_row(wheel.schema.model_validate(WHEEL_BODY))) == \
+        without_timestamps(wheel_spec_to_row(WheelSpecificationCreate.model_validate(WHEEL_BODY)))
+    engine_row = bogie.to_row(bogie.schema.model_validate(BOGIE_BODY))
+    assert engine_row["inspection_date"] == date(2025, 7, 3)
+    engine_row["inspection_date"] = engine_row["inspection_date"].isoformat()
+    assert without_timestamps(engine_row) == \
+        without_timestamps(bogie_checksheet_to_row(BogieChecksheetCreate.model_validate(BOGIE_BODY)))
+
+def per_request(fn, arg, requests, repeat):
+    """Best-of-repeat microseconds per call"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(requests):
+            fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / requests * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wheel, bogie = compile_forms()
+    check_rows(wheel, bogie)
+
+    cases = [
+        ("wheel", WHEEL_BODY, WheelSpecificationCreate, wheel_spec_to_row, wheel.schema, wheel.to_row),
+        ("bogie", BOGIE_BODY, BogieChecksheetCreate, bogie_checksheet_to_row, bogie.schema, bogie.to_row),
+    ]
+    print(f"{'form':<6} {'step':<9} {'hand-written us':>16} {'engine us':>10} {'ratio':>6}")
+    for name, body, schema, to_row, engine_schema, engine_to_row in cases:
+        validated, engine_validated = schema.model_validate(body), engine_schema.model_validate(body)
+        steps = [
+            ("validate", schema.model_validate, body, engine_schema.model_validate, body),
+            ("map", to_row, validated, engine_to_row, engine_validated),
+            ("both", lambda b: to_row(schema.model_validate(b)), body,
+             lambda b: engine_to_row(engine_schema.model_validate(b)), body),
+        ]
+        for step, hand_fn, hand_arg, engine_fn, engine_arg in steps:
+            hand = per_request(hand_fn, hand_arg, args.requests, args.repeat)
+            engine = per_request(engine_fn, engine_arg, args.requests, args.repeat)
+            print(f"{name:<6} {step:<9} {hand:>16.2f} {engine:>10.2f} {engine / hand:>5.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Microbenchmark: wheel-spec list serialization
+
+Compares the previous response path (ORM objects -> hand-written dicts ->
+WheelSpecListResponse -> FastAPI JSON encoder) with the direct row -> orjson
+path in serialization.py, at 1k, 10k and 100k rows. No database is needed.
+
+Usage:
+    python benchmarks/bench_serialization.py [--rows 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models import WheelSpecification
+from schemas import WheelSpecListResponse, WHEEL_SPEC_FIELD_COLUMNS
+from serialization import WHEEL_SPEC_COLUMNS, dump_wheel_spec_list
+
+MESSAGE = "Filtered wheel specification forms fetched successfully."
+
+SAMPLE_FIELDS = {
+    "tread_diameter_new": "915 (900-1000)",
+    "last_shop_issue_size": "837 (800-900)",
+    "condemning_dia": "825 (800-900)",
+    "wheel_gauge": "1600 (+2,-1)",
+    "variation_same_axle": "0.5",
+    "variation_same_bogie": "5",
+    "variation_same_coach": "13",
+    "wheel_profile": "29.4 Flange Thickness",
+    "intermediate_wwp": "20 TO 28",
+    "bearing_seat_diameter": "130.043 TO 130.068",
+    "roller_bearing_outer_dia": "280 (+0.0/-0.035)",
+    "roller_bearing_bore_dia": "130 (+0.0/-0.025)",
+    "roller_bearing_width": "93 (+0/-0.250)",
+    "axle_box_housing_bore_dia": "280 (+0.030/+0.052)",
+    "wheel_disc_width": "127 (+4/-0)",
+}
+
+def make_orm_rows(n):
+    return [
+        WheelSpecification(
+            id=i,
+            form_number=f"WHEEL-2025-{i:07d}",
+            submitted_by="user_id_123",
+            submitted_date=date(2025, 7, 3),
+            status="Saved",
+            **SAMPLE_FIELDS
+        )
+        for i in range(n)
+    ]
+
+def make_tuple_rows(orm_rows):
+    return [tuple(getattr(spec, column.key) for column in WHEEL_SPEC_COLUMNS) for spec in orm_rows]
+
+def legacy_path(orm_rows) -> bytes:
+    """The hand-written dict + response model + default encoder path"""
+    response_data = []
+    for spec in orm_rows:
+        response_data.append({
+            "formNumber": spec.form_number,
+            "submittedBy": spec.submitted_by,
+            "submittedDate": spec.submitted_date,
+            "fields": {name: getattr(spec, column) for name, column in WHEEL_SPEC_FIELD_COLUMNS.items()},
+            "status": spec.status
+        })
+    response = WheelSpecListResponse(success=True, message=MESSAGE, data=response_data)
+    return JSONResponse(content=jsonable_encoder(response)).body
+
+def fast_path(tuple_rows) -> bytes:
+    return dump_wheel_spec_list(tuple_rows, message=MESSAGE)
+
+def best_of(fn, arg, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{'rows':>8} {'legacy ms':>12} {'fast ms':>10} {'speedup':>8}")
+    for n in args.rows:
+        orm_rows = make_orm_rows(n)
+        tuple_rows = make_tuple_rows(orm_rows)
+        legacy = best_of(legacy_path, orm_rows, args.repeat)
+        fast = best_of(fast_path, tuple_rows, args.repeat)
+        print(f"{n:>8} {legacy * 1000:>12.1f} {fast * 1000:>10.1f} {legacy / fast:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+"""
+Compare two load_test.py result files
+
+Usage:
+    python benchmarks/compare_results.py baseline.json candidate.json
+"""
+import json
+import sys
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms")
+
+def main():
+    if len(sys.argv) != 3:
+        print(__doc__)
+        sys.exit(1)
+    with open(sys.argv[1]) as baseline_file, open(sys.argv[2]) as candidate_file:
+        baseline = json.load(baseline_file)["scenarios"]
+        candidate = json.load(candidate_file)["scenarios"]
+    
+    print(f"{'scenario':>15} {'metric':>7} {'baseline':>10} {'candidate':>10} {'change':>8}")
+    for name in sorted(set(baseline) & set(candidate)):
+        for metric in METRICS:
+            before, after = baseline[name].get(metric), candidate[name].get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            print(f"{name:>15} {metric:>7} {before:>10} {after:>10} {change:>+7.1f}%")
+
+if __name__ == "__main__":
+    main()
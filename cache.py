@@ -0,0 +1,163 @@
+"""
+In-process caches for the KPA Form API
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+from urllib.parse import urlencode
+
+class TTLCache:
+    """LRU cache whose entries expire at a per-entry deadline"""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Store a value; ttl overrides the default lifetime (never extends it)"""
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + lifetime)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+class MemoryResponseCache:
+    """Per-worker response cache backed by TTLCache"""
+
+    backend = "memory"
+
+    def __init__(self, max_size: int, ttl: float):
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        return self._cache.get(key)
+
+    async def set(self, key: str, etag: str, body: bytes):
+        self._cache.set(key, (etag, body))
+
+    async def invalidate(self):
+        self._cache.clear()
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend, **self._cache.stats()}
+
+class RedisResponseCache:
+    """
+    Response cache shared by all workers through a Redis-compatible server
+
+    Keys embed a generation counter; invalidation bumps the counter so stale
+    entries are never read again and simply expire.
+    """
+
+    backend = "redis"
+
+    def __init__(self, url: str, ttl: float, namespace: str = "kpa:responses"):
+        import redis.asyncio as redis  # optional dependency
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+
+    async def _generation(self) -> int:
+        return int(await self._redis.get(f"{self.namespace}:generation") or 0)
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        value = await self._redis.get(f"{self.namespace}:{await self._generation()}:{key}")
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        etag, _, body = value.partition(b"\n")
+        return etag.decode(), body
+
+    async def set(self, key: str, etag: str, body: bytes):
+        await self._redis.set(
+            f"{self.namespace}:{await self._generation()}:{key}",
+            etag.encode() + b"\n" + body,
+            px=int(self.ttl * 1000),
+        )
+
+    async def invalidate(self):
+        await self._redis.incr(f"{self.namespace}:generation")
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend, "ttl_seconds": self.ttl, "hits": self.hits, "misses": self.misses}
+
+class NullResponseCache:
+    """Disables response caching"""
+
+    backend = "none"
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        return None
+
+    async def set(self, key: str, etag: str, body: bytes):
+        pass
+
+    async def invalidate(self):
+        pass
+
+    async def stats(self) -> dict:
+        return {"backend": self.backend}
+
+def make_etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+def cache_key(prefix: str, params: dict) -> str:
+    """Normalize query parameters into a cache key (order-free, empty values dropped)"""
+    items = sorted((k, str(v).strip()) for k, v in params.items() if v is not None and str(v).strip() != "")
+    return f"{prefix}?{urlencode(items)}"
+
+def create_response_cache():
+    backend = os.getenv("RESPONSE_CACHE_BACKEND", "memory").lower()
+    ttl = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "5"))
+    if backend == "redis":
+        return RedisResponseCache(os.getenv("REDIS_URL", "redis://localhost:6379/0"), ttl)
+    if backend == "memory":
+        return MemoryResponseCache(int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "512")), ttl)
+    return NullResponseCache()
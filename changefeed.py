@@ -0,0 +1,258 @@
+"""
+Change feed for new form submissions
+
+Every write path (single POST, bulk POST, queued ingestion, import) records
+its inserted forms in form_changes in the same transaction, so each new
+wheel specification or bogie checksheet gets a sequence number (seq).
+Clients fetch only what is new since the last seq they saw:
+    - GET /api/forms/changes?since=<seq> returns the next page of changes
+    - GET /api/forms/changes/stream pushes them as server-sent events as
+      they commit (resume with Last-Event-ID or ?since=)
+
+Commit order: on PostgreSQL, recording changes takes a transaction-level
+advisory lock, so sequence numbers are handed out in commit order and a
+reader never sees seq N+1 before N. Writers only serialize for the short
+stretch between recording their changes and committing. SQLite writes are
+serialized anyway.
+
+Each worker runs one broadcaster that reads new changes once and fans them
+out to all of its stream subscribers. It wakes on local commits, on
+PostgreSQL NOTIFY (sent on commit, so other workers and the import CLI are
+heard at once) and otherwise polls every CHANGE_FEED_POLL_SECONDS. The
+LISTEN connection is opened outside the pool; serve.py reserves one per
+worker for it.
+
+Prune old changes:
+    python changefeed.py --prune-days 30
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, literal, make_url, select
+
+from database import ASYNC_DATABASE_URL, get_async_engine, open_async_session
+from instrumentation import logger
+from form_engine import FORMS
+from models import FormChange, WheelSpecification, BogieChecksheet
+from serialization import WHEEL_SPEC_COLUMNS, BOGIE_COLUMNS, wheel_spec_row_to_dict, bogie_row_to_dict
+
+CHANGE_CHANNEL = "form_changes"
+CHANGE_LOCK_KEY = 0x6B70615F63686E67  # pg_advisory_xact_lock key for form_changes
+CHANGE_FEED_BATCH_SIZE = int(os.getenv("CHANGE_FEED_BATCH_SIZE", "500"))
+CHANGE_FEED_POLL_SECONDS = float(os.getenv("CHANGE_FEED_POLL_SECONDS", "1"))
+CHANGE_FEED_QUEUE_SIZE = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "100"))
+
+# Form type -> (model, columns, row formatter)
+CHANGE_FORMS = {
+    "wheel_specifications": (WheelSpecification, WHEEL_SPEC_COLUMNS, wheel_spec_row_to_dict),
+    "bogie_checksheets": (BogieChecksheet, BOGIE_COLUMNS, bogie_row_to_dict),
+}
+CHANGE_FORMS.update({name: (form.model, form.columns, form.row_to_dict) for name, form in FORMS.items()})
+
+# Recording changes
+
+def change_statements(dialect_name: str, form_type: str, form_numbers: List[str]) -> list:
+    """Statements that add the given newly inserted forms to form_changes"""
+    if not form_numbers:
+        return []
+    model = CHANGE_FORMS[form_type][0]
+    statements = []
+    if dialect_name == "postgresql":
+        statements.append(select(func.pg_advisory_xact_lock(CHANGE_LOCK_KEY)))
+    statements.append(insert(FormChange).from_select(
+        ["form_type", "form_id", "created_at"],
+        select(literal(form_type), model.id, literal(datetime.utcnow()))
+        .where(model.form_number.in_(form_numbers)).order_by(model.id)
+    ))
+    if dialect_name == "postgresql":
+        # Delivered to listeners when the transaction commits
+        statements.append(select(func.pg_notify(CHANGE_CHANNEL, form_type)))
+    return statements
+
+async def record_changes(db, form_type: str, form_numbers: Iterable[str]):
+    """Record inserted forms inside the caller's (async) transaction; call right before commit"""
+    for stmt in change_statements(db.bind.dialect.name, form_type, list(form_numbers)):
+        await db.execute(stmt)
+
+def record_changes_sync(conn, form_type: str, form_numbers: Iterable[str]):
+    """record_changes() for a sync Connection or Session"""
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    for stmt in change_statements(dialect.name, form_type, list(form_numbers)):
+        conn.execute(stmt)
+
+# Reading changes
+
+async def current_seq(db) -> int:
+    return (await db.scalar(select(func.max(FormChange.seq)))) or 0
+
+async def fetch_changes(db, since: int, limit: int, form_type: Optional[str] = None) -> Tuple[List[dict], int]:
+    """
+    Changes after `since` in seq order with their forms, and the seq to resume from
+
+    Forms archived or deleted since they were submitted are skipped.
+    """
+    query = select(FormChange.seq, FormChange.form_type, FormChange.form_id).where(FormChange.seq > since)
+    if form_type:
+        query = query.where(FormChange.form_type == form_type)
+    changes = (await db.execute(query.order_by(FormChange.seq).limit(limit))).all()
+    if not changes:
+        return [], since
+
+    forms = {}
+    for change_type, (model, columns, to_dict) in CHANGE_FORMS.items():
+        ids = [form_id for _, row_type, form_id in changes if row_type == change_type]
+        if ids:
+            for row in (await db.execute(select(*columns).where(model.id.in_(ids)))).all():
+                forms[(change_type, row[0])] = to_dict(row)
+
+    results = [
+        {"seq": seq, "formType": row_type, "data": forms[(row_type, form_id)]}
+        for seq, row_type, form_id in changes
+        if (row_type, form_id) in forms
+    ]
+    return results, changes[-1].seq
+
+# In-process fan-out
+
+class Subscription:
+    """One stream client: batches of changes, or None when it fell too far behind"""
+
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=CHANGE_FEED_QUEUE_SIZE)
+
+    def offer(self, changes: List[dict]) -> bool:
+        try:
+            self.queue.put_nowait(changes)
+            return True
+        except asyncio.QueueFull:
+            # Drop the backlog; the client resumes from its last event id
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+    async def get(self) -> Optional[List[dict]]:
+        return await self.queue.get()
+
+class ChangeFeed:
+    """Per-worker broadcaster: one read of each new change, fanned out to every subscriber"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._listening = False
+        # Broadcast position; None while nobody is subscribed
+        self.last_seq: Optional[int] = None
+
+    def notify(self):
+        """Wake the broadcaster (after a local commit)"""
+        self._wakeup.set()
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        if not self._subscribers:
+            self.last_seq = None
+
+    def caught_up(self, seq: int):
+        """
+        A subscriber has read everything up to seq itself
+
+        The broadcaster must not start past any subscriber's position. Moving
+        it back only re-sends changes, which subscribers skip by seq.
+        """
+        self.last_seq = seq if self.last_seq is None else min(self.last_seq, seq)
+        self.notify()
+
+    async def _broadcast(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                while self._subscribers and self.last_seq is not None:
+                    async with open_async_session() as db:
+                        changes, last_seq = await fetch_changes(db, self.last_seq, CHANGE_FEED_BATCH_SIZE)
+                    if last_seq == self.last_seq:
+                        break
+                    self.last_seq = last_seq
+                    for subscription in list(self._subscribers):
+                        if not subscription.offer(changes):
+                            self._subscribers.discard(subscription)
+            except Exception:
+                logger.exception("Change feed broadcast failed")
+                await asyncio.sleep(CHANGE_FEED_POLL_SECONDS)
+                self.notify()
+
+    async def _poll(self):
+        """Wake periodically unless PostgreSQL NOTIFY is doing it"""
+        while True:
+            await asyncio.sleep(CHANGE_FEED_POLL_SECONDS)
+            if self._subscribers and not self._listening:
+                self.notify()
+
+    async def _listen(self):
+        """LISTEN on a dedicated connection (outside the pool); reconnects after failures"""
+        import asyncpg
+
+        dsn = make_url(ASYNC_DATABASE_URL).set(drivername="postgresql").render_as_string(hide_password=False)
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn)
+                closed = asyncio.Event()
+                conn.add_termination_listener(lambda _: closed.set())
+                await conn.add_listener(CHANGE_CHANNEL, lambda *_: self.notify())
+                self._listening = True
+                # Changes committed while not listening
+                self.notify()
+                await closed.wait()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Change feed LISTEN failed, polling instead: {e!r}")
+            finally:
+                self._listening = False
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            await asyncio.sleep(CHANGE_FEED_POLL_SECONDS * 5)
+
+    def start(self):
+        """Start the broadcaster (FastAPI lifespan)"""
+        self._tasks = [asyncio.create_task(self._broadcast()), asyncio.create_task(self._poll())]
+        if get_async_engine().dialect.name == "postgresql":
+            self._tasks.append(asyncio.create_task(self._listen()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "last_seq": self.last_seq,
+            "listening": self._listening,
+        }
+
+def prune_changes(days: int) -> int:
+    """Delete changes older than `days`; returns the number removed"""
+    from database import get_engine
+
+    with get_engine().begin() as conn:
+        result = conn.execute(delete(FormChange).where(FormChange.created_at < datetime.utcnow() - timedelta(days=days)))
+        return result.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the change feed")
+    parser.add_argument("--prune-days", type=int, required=True, help="Delete changes older than this many days")
+    args = parser.parse_args()
+    print(f"Pruned {prune_changes(args.prune_days)} changes")
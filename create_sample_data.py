@@ -3,19 +3,19 @@ Script to create sample data in the PostgreSQL database
 Run this after starting the application for the first time
 """
 from sqlalchemy.orm import Session
-from database import SessionLocal, engine
-from models import Base, User, WheelSpecification, BogieChecksheet
+from database import open_session
+from init_db import create_schema
+from models import User, WheelSpecification, BogieChecksheet
 from auth import get_password_hash
-import json
-from datetime import datetime
+from datetime import datetime, date
 
 def create_sample_data():
     print("Creating sample data for KPA Form API...")
     
     # Create tables
-    Base.metadata.create_all(bind=engine)
+    create_schema()
     
-    db = SessionLocal()
+    db = open_session()
     
     try:
         # Create sample user
@@ -43,7 +43,7 @@ def create_sample_data():
             sample_wheel = WheelSpecification(
                 form_number="WHEEL-2025-001",
                 submitted_by="user_id_123",
-                submitted_date="2025-07-03",
+                submitted_date=date(2025, 7, 3),
                 tread_diameter_new="915 (900-1000)",
                 last_shop_issue_size="837 (800-900)",
                 condemning_dia="825 (800-900)",
@@ -99,9 +99,9 @@ def create_sample_data():
                 form_number="BOGIE-2025-001",
                 inspection_by="user_id_456",
                 inspection_date="2025-07-03",
-                bogie_details=json.dumps(bogie_details),
-                bogie_checksheet=json.dumps(bogie_checksheet),
-                bmbc_checksheet=json.dumps(bmbc_checksheet),
+                bogie_details=bogie_details,
+                bogie_checksheet=bogie_checksheet,
+                bmbc_checksheet=bmbc_checksheet,
                 status="Saved"
             )
             db.add(sample_bogie)
@@ -0,0 +1,217 @@
+"""
+Streaming export of wheel specifications and bogie checksheets
+
+Rows arrive in batches from a server-side cursor. Each batch is encoded (and
+compressed) before the next one is fetched, so memory stays constant however
+large the export is:
+    - csv: flat columns, with nested bogie values as dotted columns
+      (bogieDetails.bogieNo), the layout importer.py reads back
+    - ndjson: one API response object per line
+    - parquet: one row group per batch, compressed with the Parquet codec
+
+csv and ndjson are compressed on the fly with gzip or zstd.
+"""
+import csv
+import io
+import os
+import zlib
+from typing import AsyncIterator, Callable, Sequence
+
+import orjson
+
+from schemas import BogieDetails, BogieChecksheetFields, BMBCChecksheetFields
+from serialization import FIELD_NAMES, wheel_spec_row_to_dict, bogie_row_to_dict
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# Format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Compression -> (media type, file extension suffix) for csv/ndjson
+COMPRESSIONS = {
+    "none": (None, ""),
+    "gzip": ("application/gzip", ".gz"),
+    "zstd": ("application/zstd", ".zst"),
+}
+
+# Flat columns per table
+
+WHEEL_EXPORT_COLUMNS = ("id", "formNumber", "submittedBy", "submittedDate", *FIELD_NAMES, "status")
+
+def wheel_export_row(row) -> Sequence:
+    # WHEEL_SPEC_COLUMNS rows are already flat and in WHEEL_EXPORT_COLUMNS order
+    return row
+
+# (response key, schema, index in a BOGIE_COLUMNS row)
+_BOGIE_NESTED = (
+    ("bogieDetails", BogieDetails, 4),
+    ("bogieChecksheet", BogieChecksheetFields, 5),
+    ("bmbcChecksheet", BMBCChecksheetFields, 6),
+)
+
+BOGIE_EXPORT_COLUMNS = (
+    "id", "formNumber", "inspectionBy", "inspectionDate",
+    *(f"{key}.{name}" for key, schema, _ in _BOGIE_NESTED for name in schema.model_fields),
+    "status",
+)
+
+def bogie_export_row(row) -> Sequence:
+    values = [row[0], row[1], row[2], row[3]]
+    for _, schema, index in _BOGIE_NESTED:
+        nested = row[index] or {}
+        values.extend(nested.get(name) for name in schema.model_fields)
+    values.append(row[7])
+    return values
+
+# Table name -> (flat columns, flat row function, API response dict function)
+EXPORT_TABLES = {
+    "wheel_specifications": (WHEEL_EXPORT_COLUMNS, wheel_export_row, wheel_spec_row_to_dict),
+    "bogie_checksheets": (BOGIE_EXPORT_COLUMNS, bogie_export_row, bogie_row_to_dict),
+}
+
+# Encoders: encode(batch) -> bytes for each batch, then finish() -> bytes
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+class CsvEncoder:
+    def __init__(self, columns: Sequence[str], flatten: Callable):
+        self._flatten = flatten
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._writer.writerow(columns)
+
+    def encode(self, rows) -> bytes:
+        self._writer.writerows(self._flatten(row) for row in rows)
+        data = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data.encode()
+
+    def finish(self) -> bytes:
+        # The header, if no rows were exported
+        return self.encode(())
+
+class NdjsonEncoder:
+    def __init__(self, to_dict: Callable):
+        self._to_dict = to_dict
+
+    def encode(self, rows) -> bytes:
+        return b"".join(orjson.dumps(self._to_dict(row)) + b"\n" for row in rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+class ParquetEncoder:
+    def __init__(self, columns: Sequence[str], flatten: Callable, codec: str):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._pa = pa
+        self._flatten = flatten
+        self._schema = pa.schema([(name, _parquet_type(pa, name)) for name in columns])
+        self._sink = _ChunkSink()
+        self._writer = pq.ParquetWriter(pa.PythonFile(self._sink, mode="w"), self._schema, compression=codec)
+
+    def encode(self, rows) -> bytes:
+        rows = [self._flatten(row) for row in rows]
+        if not rows:
+            return b""
+        arrays = [
+            self._pa.array(values, type=field.type)
+            for values, field in zip(zip(*rows), self._schema)
+        ]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+        return self._sink.drain()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._sink.drain()
+
+def _parquet_type(pa, name: str):
+    if name == "id":
+        return pa.int64()
+    if name == "submittedDate":
+        return pa.date32()
+    return pa.string()
+
+class CompressedEncoder:
+    """Compress another encoder's output on the fly"""
+
+    def __init__(self, encoder, compression: str):
+        self._encoder = encoder
+        if compression == "gzip":
+            gzip = zlib.compressobj(6, zlib.DEFLATED, 31)
+            self._compress, self._flush = gzip.compress, gzip.flush
+        else:
+            import pyarrow as pa
+
+            sink = _ChunkSink()
+            stream = pa.CompressedOutputStream(pa.PythonFile(sink, mode="w"), compression)
+
+            def compress(data: bytes) -> bytes:
+                stream.write(data)
+                return sink.drain()
+
+            def flush() -> bytes:
+                stream.close()
+                return sink.drain()
+
+            self._compress, self._flush = compress, flush
+
+    def encode(self, rows) -> bytes:
+        return self._compress(self._encoder.encode(rows))
+
+    def finish(self) -> bytes:
+        return self._compress(self._encoder.finish()) + self._flush()
+
+def export_encoder(table_name: str, file_format: str, compression: str = "none"):
+    """Encoder for one export; parquet uses the compression as its codec"""
+    columns, flatten, to_dict = EXPORT_TABLES[table_name]
+    if file_format == "parquet":
+        return ParquetEncoder(columns, flatten, compression)
+    encoder = CsvEncoder(columns, flatten) if file_format == "csv" else NdjsonEncoder(to_dict)
+    if compression != "none":
+        encoder = CompressedEncoder(encoder, compression)
+    return encoder
+
+async def stream_export(encoder, batches: AsyncIterator) -> AsyncIterator[bytes]:
+    """Encode row batches as they arrive"""
+    async for batch in batches:
+        data = encoder.encode(batch)
+        if data:
+            yield data
+    yield encoder.finish()
+
+def export_media_type(file_format: str, compression: str) -> str:
+    if file_format != "parquet" and compression != "none":
+        return COMPRESSIONS[compression][0]
+    return FORMATS[file_format][0]
+
+def export_filename(table_name: str, file_format: str, compression: str) -> str:
+    suffix = "" if file_format == "parquet" else COMPRESSIONS[compression][1]
+    return f"{table_name}.{FORMATS[file_format][1]}{suffix}"
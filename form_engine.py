@@ -0,0 +1,326 @@
+"""
+Declarative form types
+
+A form type is described once, either as a JSON file in FORM_DEFINITIONS_DIR
+or as a FormDefinition registered from Python. At startup each definition
+is compiled into:
+    - a storage model (table) on models.Base
+    - a Pydantic request schema, so validation runs in pydantic-core
+    - a row mapper and a response formatter, generated as plain functions
+      (one dict display each), so no per-request work depends on the
+      definition
+
+main.py adds POST /api/forms/<path> and GET /api/forms/<path> for every
+compiled form. The forms are also registered with rollups, the change feed,
+the importer and queued ingestion, which build their per-form-type tables
+from FORMS.
+
+Definition file (form_definitions/coach_inspections.json):
+    {
+        "name": "coach_inspections",
+        "path": "coach-inspection",
+        "title": "Coach inspection",
+        "formNumberPrefix": "COACH-",
+        "inspectorField": "inspectionBy",
+        "dateField": "inspectionDate",
+        "sections": [
+            {"name": "coachDetails", "fields": ["coachNo", {"name": "coachType", "maxLength": 20}]},
+            {"name": "underframe", "store": "json", "fields": ["sideBearer", "centrePivot"]}
+        ]
+    }
+
+Sections stored as "columns" (the default) get one string column per field,
+named in snake_case unless the field gives "column". "json" sections are
+kept as one JSON (JSONB on PostgreSQL) column. Run `python init_db.py` after
+adding a form type to create its table.
+"""
+import json
+import os
+import re
+from datetime import date, datetime
+from typing import Annotated, Callable, Dict, List, Optional, Union
+
+from pydantic import StringConstraints, create_model, field_validator
+from sqlalchemy import Column, Date, DateTime, Index, Integer, JSON, String
+from sqlalchemy.dialects.postgresql import JSONB
+
+from models import Base, SQLITE_SEARCH_TABLES
+
+FORM_DEFINITIONS_DIR = os.getenv(
+    "FORM_DEFINITIONS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "form_definitions")
+)
+DEFAULT_MAX_LENGTH = 100
+
+# Table names already taken in models (read before any form tables are added)
+# and the SQLite search tables with their FTS5 shadow tables
+RESERVED_NAMES = set(Base.metadata.tables) | {
+    fts_table + suffix
+    for fts_table, _ in SQLITE_SEARCH_TABLES.values()
+    for suffix in ("", "_data", "_idx", "_content", "_docsize", "_config")
+}
+RESERVED_PATHS = {"wheel-specifications", "bogie-checksheet", "changes", "summary", "submissions"}
+
+_NAME = re.compile(r"^[a-z][a-z0-9_]{0,29}$")  # fits the 30-character form_type columns
+_FIELD = re.compile(r"^[A-Za-z][A-Za-z0-9]*$")
+_COLUMN = re.compile(r"^[a-z][a-z0-9_]{0,62}$")
+_PATH = re.compile(r"^[a-z0-9][a-z0-9\-]*$")
+
+def snake_case(name: str) -> str:
+    return re.sub(r"(?<=[a-z0-9])([A-Z])", r"_\1", name).lower()
+
+def _column_name(column: str) -> str:
+    if not _COLUMN.match(column):
+        raise ValueError(f"Invalid column name {column!r}")
+    return column
+
+def _pascal_case(name: str) -> str:
+    return "".join(part[:1].upper() + part[1:] for part in re.split(r"[_\-]", name))
+
+class FormField:
+    """One text field of a section; max_length defaults to DEFAULT_MAX_LENGTH for fields stored as columns"""
+
+    def __init__(self, name: str, column: Optional[str] = None, max_length: Optional[int] = None):
+        if not _FIELD.match(name):
+            raise ValueError(f"Invalid field name {name!r}")
+        self.name = name
+        self.column = _column_name(column or snake_case(name))
+        self.max_length = max_length
+
+class FormSection:
+    """A group of fields in the request body, stored as columns or as one JSON column"""
+
+    def __init__(self, name: str, fields: List[Union[str, FormField]], store: str = "columns", column: Optional[str] = None):
+        if not _FIELD.match(name):
+            raise ValueError(f"Invalid section name {name!r}")
+        if store not in ("columns", "json"):
+            raise ValueError(f"Section {name}: store must be 'columns' or 'json'")
+        self.name = name
+        self.fields = [field if isinstance(field, FormField) else FormField(field) for field in fields]
+        self.store = store
+        self.column = _column_name(column or snake_case(name))
+
+class FormDefinition:
+    """
+    Declarative description of a form type
+
+    derive and extra_columns are for Python definitions only: derive(row)
+    returns additional column values computed from the mapped row, stored
+    in extra_columns.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        sections: List[FormSection],
+        form_number_prefix: str = "",
+        inspector_field: str = "submittedBy",
+        date_field: str = "submittedDate",
+        path: Optional[str] = None,
+        title: Optional[str] = None,
+        derive: Optional[Callable[[dict], dict]] = None,
+        extra_columns: Optional[Dict[str, Column]] = None,
+    ):
+        if not _NAME.match(name):
+            raise ValueError(f"Invalid form name {name!r}: lower-case letters, digits and _, at most 30 characters")
+        if path is not None and not _PATH.match(path):
+            raise ValueError(f"Invalid form path {path!r}")
+        for field in (inspector_field, date_field):
+            if not _FIELD.match(field):
+                raise ValueError(f"Invalid field name {field!r}")
+        self.name = name
+        self.path = path or name.replace("_", "-")
+        self.title = title or name.replace("_", " ").capitalize()
+        self.sections = sections
+        self.form_number_prefix = form_number_prefix
+        self.inspector_field = inspector_field
+        self.date_field = date_field
+        self.derive = derive
+        self.extra_columns = extra_columns or {}
+
+    @classmethod
+    def from_dict(cls, spec: dict) -> "FormDefinition":
+        """Definition from the JSON file format"""
+        def field(value):
+            if isinstance(value, str):
+                return FormField(value)
+            return FormField(value["name"], value.get("column"), value.get("maxLength"))
+
+        return cls(
+            name=spec["name"],
+            path=spec.get("path"),
+            title=spec.get("title"),
+            form_number_prefix=spec.get("formNumberPrefix", ""),
+            inspector_field=spec.get("inspectorField", "submittedBy"),
+            date_field=spec.get("dateField", "submittedDate"),
+            sections=[
+                FormSection(section["name"], [field(value) for value in section["fields"]],
+                            section.get("store", "columns"), section.get("column"))
+                for section in spec["sections"]
+            ],
+        )
+
+class CompiledForm:
+    """A form definition compiled into a model, a request schema and precompiled mappers"""
+
+    def __init__(self, definition: FormDefinition, base=Base):
+        self.definition = definition
+        self.name = definition.name
+        self.path = definition.path
+        self.title = definition.title
+        self.inspector_field = definition.inspector_field
+        self.date_field = definition.date_field
+        self.inspector_column = snake_case(definition.inspector_field)
+        self.date_column = snake_case(definition.date_field)
+
+        flat = [(section, field) for section in definition.sections if section.store == "columns" for field in section.fields]
+        json_sections = [section for section in definition.sections if section.store == "json"]
+        header_columns = ["form_number", self.inspector_column, self.date_column]
+        columns = header_columns + [field.column for _, field in flat] + [section.column for section in json_sections]
+        duplicates = {column for column in columns if columns.count(column) > 1}
+        if duplicates or set(columns) & {"id", "status", "created_at", "updated_at"}:
+            raise ValueError(f"Form {self.name}: column names clash: {sorted(duplicates) or columns}")
+
+        self.schema = self._build_schema(definition)
+        self.model = self._build_model(definition, base, flat, json_sections)
+
+        # Request -> row and row tuple (in self.columns order) -> response, generated once
+        self.columns = (
+            self.model.id,
+            *(getattr(self.model, column) for column in columns),
+            self.model.status,
+        )
+        self.to_row = self._compile_to_row(definition, header_columns, flat, json_sections)
+        self.row_to_dict = self._compile_row_to_dict(definition, columns)
+
+    def _build_schema(self, definition: FormDefinition):
+        def text(field: FormField, store: str):
+            # Column-stored values must fit their String(n) column; JSON has no limit unless one is set
+            max_length = field.max_length or (DEFAULT_MAX_LENGTH if store == "columns" else None)
+            return Annotated[str, StringConstraints(max_length=max_length)] if max_length else str
+
+        sections = {}
+        for section in definition.sections:
+            sections[section.name] = (create_model(
+                f"{_pascal_case(definition.name)}{_pascal_case(section.name)}",
+                **{field.name: (text(field, section.store), ...) for field in section.fields}
+            ), ...)
+
+        prefix = definition.form_number_prefix
+        validators = {}
+        if prefix:
+            def validate_form_number(cls, value):
+                if not value.startswith(prefix):
+                    raise ValueError(f"Form number must start with {prefix}")
+                return value
+
+            validators["validate_form_number"] = field_validator("formNumber")(validate_form_number)
+
+        return create_model(
+            f"{_pascal_case(definition.name)}Create",
+            __validators__=validators,
+            formNumber=(Annotated[str, StringConstraints(max_length=50)], ...),
+            **{definition.inspector_field: (Annotated[str, StringConstraints(max_length=50)], ...)},
+            # Parsed by pydantic-core: YYYY-MM-DD
+            **{definition.date_field: (date, ...)},
+            **sections,
+        )
+
+    def _build_model(self, definition: FormDefinition, base, flat, json_sections):
+        attributes = {
+            "__tablename__": definition.name,
+            "id": Column(Integer, primary_key=True, index=True),
+            "form_number": Column(String(50), unique=True, index=True, nullable=False),
+            self.inspector_column: Column(String(50), nullable=False),
+            self.date_column: Column(Date, nullable=False),
+            **{field.column: Column(String(field.max_length or DEFAULT_MAX_LENGTH)) for _, field in flat},
+            **{section.column: Column(JSON().with_variant(JSONB, "postgresql")) for section in json_sections},
+            **definition.extra_columns,
+            "status": Column(String(20), default="Saved"),
+            "created_at": Column(DateTime, default=datetime.utcnow),
+            "updated_at": Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow),
+            "__table_args__": (
+                Index(f"idx_{definition.name}_{self.inspector_column}", self.inspector_column),
+                Index(f"idx_{definition.name}_{self.date_column}", self.date_column),
+            ),
+        }
+        return type(f"{_pascal_case(definition.name)}Form", (base,), attributes)
+
+    def _compile_to_row(self, definition: FormDefinition, header_columns, flat, json_sections):
+        """
+        to_row(form): map a validated submission onto the table's columns
+
+        Generated as one dict display, so a submission costs the same as a
+        hand-written mapping in form_rows.py.
+        """
+        values = [
+            *zip(header_columns, ("formNumber", definition.inspector_field, definition.date_field)),
+            *((field.column, f"{section.name}.{field.name}") for section, field in flat),
+            *((section.column, f"{section.name}.model_dump()") for section in json_sections),
+        ]
+        lines = [f"        {column!r}: form.{value}," for column, value in values]
+        source = "\n".join([
+            "def to_row(form):",
+            "    now = utcnow()",
+            "    row = {",
+            *lines,
+            "        'status': 'Saved',",
+            "        'created_at': now,",
+            "        'updated_at': now,",
+            "    }",
+            *(["    row.update(derive(row))"] if definition.derive is not None else []),
+            "    return row",
+        ])
+        return _compile_function(self.name, "to_row", source, {"utcnow": datetime.utcnow, "derive": definition.derive})
+
+    def _compile_row_to_dict(self, definition: FormDefinition, columns):
+        """row_to_dict(row): format a self.columns row as the API response shape"""
+        position = {column: index for index, column in enumerate(columns, start=1)}
+        lines = [
+            f"        'formNumber': row[{position['form_number']}],",
+            f"        {definition.inspector_field!r}: row[{position[self.inspector_column]}],",
+            f"        {definition.date_field!r}: row[{position[self.date_column]}],",
+        ]
+        for section in definition.sections:
+            if section.store == "json":
+                lines.append(f"        {section.name!r}: row[{position[section.column]}],")
+            else:
+                fields = ", ".join(f"{field.name!r}: row[{position[field.column]}]" for field in section.fields)
+                lines.append(f"        {section.name!r}: {{{fields}}},")
+        source = "\n".join([
+            "def row_to_dict(row):",
+            "    return {",
+            *lines,
+            f"        'status': row[{len(columns) + 1}],",
+            "    }",
+        ])
+        return _compile_function(self.name, "row_to_dict", source, {})
+
+def _compile_function(form_name: str, name: str, source: str, namespace: dict):
+    """Define a generated function; names in the source were checked against _FIELD / _COLUMN"""
+    exec(compile(source, f"<form {form_name}: {name}>", "exec"), namespace)
+    return namespace[name]
+
+def load_definitions(directory: str = FORM_DEFINITIONS_DIR) -> List[FormDefinition]:
+    """Definitions from every *.json file in the directory, in file name order"""
+    if not os.path.isdir(directory):
+        return []
+    definitions = []
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename)) as definition_file:
+                definitions.append(FormDefinition.from_dict(json.load(definition_file)))
+    return definitions
+
+# Compiled form types by name; populated once at import, before any tables are created
+FORMS: Dict[str, CompiledForm] = {}
+
+def register_form(definition: FormDefinition) -> CompiledForm:
+    if definition.name in FORMS or definition.name in RESERVED_NAMES:
+        raise ValueError(f"Form {definition.name} is already defined")
+    if definition.path in RESERVED_PATHS or any(form.path == definition.path for form in FORMS.values()):
+        raise ValueError(f"Form path {definition.path} is already in use")
+    FORMS[definition.name] = compiled = CompiledForm(definition)
+    return compiled
+
+for _definition in load_definitions():
+    register_form(_definition)
@@ -0,0 +1,40 @@
+"""
+Mapping of validated form submissions onto table rows
+
+Shared by the API handlers and the bulk importer so every write path stores
+the same columns.
+"""
+from datetime import datetime, date
+
+from measurements import measurement_columns
+from schemas import WheelSpecificationCreate, BogieChecksheetCreate, WHEEL_SPEC_FIELD_COLUMNS
+
+def wheel_spec_to_row(wheel_spec: WheelSpecificationCreate) -> dict:
+    """Map a wheel specification submission onto WheelSpecification columns"""
+    now = datetime.utcnow()
+    row = {
+        "form_number": wheel_spec.formNumber,
+        "submitted_by": wheel_spec.submittedBy,
+        "submitted_date": date.fromisoformat(wheel_spec.submittedDate),
+        **{column: getattr(wheel_spec.fields, name) for name, column in WHEEL_SPEC_FIELD_COLUMNS.items()},
+        "status": "Saved",
+        "created_at": now,
+        "updated_at": now
+    }
+    row.update(measurement_columns(row))
+    return row
+
+def bogie_checksheet_to_row(bogie_data: BogieChecksheetCreate) -> dict:
+    """Map a bogie checksheet submission onto BogieChecksheet columns"""
+    now = datetime.utcnow()
+    return {
+        "form_number": bogie_data.formNumber,
+        "inspection_by": bogie_data.inspectionBy,
+        "inspection_date": bogie_data.inspectionDate,
+        "bogie_details": bogie_data.bogieDetails.model_dump(),
+        "bogie_checksheet": bogie_data.bogieChecksheet.model_dump(),
+        "bmbc_checksheet": bogie_data.bmbcChecksheet.model_dump(),
+        "status": "Saved",
+        "created_at": now,
+        "updated_at": now
+    }
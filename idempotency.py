@@ -0,0 +1,59 @@
+"""
+Idempotency-Key support for form submissions
+
+The response of a successful write is stored under the client's key in the
+same transaction as the write itself, so a retried request is answered from
+the stored result instead of running the insert again.
+
+A hash of the validated request body is stored with the key; reusing a key
+for a different body is rejected with 422 instead of replaying a response
+for a submission that was never saved.
+"""
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import IdempotencyKey
+
+def request_hash(body: BaseModel) -> str:
+    """Hash of the validated request body (canonical JSON, so formatting does not matter)"""
+    return hashlib.sha256(body.model_dump_json().encode()).hexdigest()
+
+async def load_response(db: AsyncSession, key: str, request_path: str, body_hash: str) -> Optional[JSONResponse]:
+    """Return the stored response for this key and endpoint, if any; 422 if the key was used for another body"""
+    record = await db.scalar(
+        select(IdempotencyKey).where(
+            IdempotencyKey.key == key,
+            IdempotencyKey.request_path == request_path
+        )
+    )
+    if record is None:
+        return None
+    # Keys stored before hashes were recorded have none and are replayed as before
+    if record.request_hash is not None and record.request_hash != body_hash:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used for a different request body"
+        )
+    return JSONResponse(
+        status_code=record.status_code,
+        content=record.response_body,
+        headers={"Idempotent-Replayed": "true"}
+    )
+
+def save_response(db: AsyncSession, key: str, request_path: str, body_hash: str, status_code: int, body: dict):
+    """Stage the response for this key; it is committed with the write"""
+    db.add(IdempotencyKey(
+        key=key,
+        request_path=request_path,
+        request_hash=body_hash,
+        status_code=status_code,
+        response_body=body,
+        created_at=datetime.utcnow()
+    ))
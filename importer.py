@@ -0,0 +1,265 @@
+"""
+Bulk import of historical wheel specifications and bogie checksheets
+
+Reads CSV or NDJSON as a stream and validates each record against the API
+schemas (WheelSpecificationCreate / BogieChecksheetCreate). Valid records are
+loaded in batches of IMPORT_BATCH_SIZE, so memory stays flat however large
+the input is:
+    - PostgreSQL: COPY into a temporary staging table, then
+      INSERT ... SELECT ... ON CONFLICT (form_number) DO NOTHING
+    - SQLite: executemany INSERT ... ON CONFLICT DO NOTHING
+
+Invalid records, and records whose form number already exists, are written
+to a reject file as NDJSON lines {"line", "errors", "record"}.
+
+Input layout:
+    - NDJSON: one API request body per line
+    - CSV: one column per top-level field. Wheel measurement fields can be
+      plain columns (treadDiameterNew, ...). Nested values can use dotted
+      columns (bogieDetails.bogieNo) or a JSON object column (bogieDetails)
+
+Usage:
+    python importer.py wheel_specifications wheel_history.csv
+    python importer.py bogie_checksheets bogies.ndjson --rejects bogies.rejects.ndjson
+"""
+import argparse
+import csv
+import io
+import os
+import time
+from datetime import date, datetime
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+import orjson
+from pydantic import ValidationError
+
+from database import get_engine, insert_ignoring_conflicts
+from form_engine import FORMS
+from form_rows import wheel_spec_to_row, bogie_checksheet_to_row
+from models import WheelSpecification, BogieChecksheet
+from rollups import apply_rollups_sync
+from changefeed import record_changes_sync
+from schemas import WheelSpecificationCreate, BogieChecksheetCreate, WHEEL_SPEC_FIELD_COLUMNS
+
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))
+IMPORT_DIR = os.getenv("IMPORT_DIR", "imports")
+
+# Table name -> (model, request schema, row mapper)
+IMPORT_TABLES = {
+    "wheel_specifications": (WheelSpecification, WheelSpecificationCreate, wheel_spec_to_row),
+    "bogie_checksheets": (BogieChecksheet, BogieChecksheetCreate, bogie_checksheet_to_row),
+}
+IMPORT_TABLES.update({name: (form.model, form.schema, form.to_row) for name, form in FORMS.items()})
+
+FORMATS = ("csv", "ndjson")
+
+# Reading
+
+def detect_format(filename: Optional[str], content_type: Optional[str] = None) -> str:
+    """csv or ndjson, from the content type or file extension"""
+    if content_type and "csv" in content_type:
+        return "csv"
+    if filename and filename.lower().endswith(".csv"):
+        return "csv"
+    return "ndjson"
+
+def _csv_record(table_name: str, row: dict) -> dict:
+    """Nest a flat CSV row into the shape of the API request body"""
+    record = {}
+    for key, value in row.items():
+        if key is None or value is None or value == "":
+            continue
+        if table_name == "wheel_specifications" and key in WHEEL_SPEC_FIELD_COLUMNS:
+            record.setdefault("fields", {})[key] = value
+        elif "." in key:
+            parent, child = key.split(".", 1)
+            record.setdefault(parent, {})[child] = value
+        elif value.startswith("{"):
+            record[key] = orjson.loads(value)
+        else:
+            record[key] = value
+    return record
+
+def read_records(table_name: str, stream: BinaryIO, file_format: str) -> Iterator[Tuple[int, object]]:
+    """(line number, record) pairs; a record that cannot be parsed is yielded as an exception"""
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if file_format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            try:
+                yield reader.line_num, _csv_record(table_name, row)
+            except orjson.JSONDecodeError as e:
+                yield reader.line_num, ValueError(f"Invalid JSON in CSV column: {e}")
+    else:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                yield line_number, ValueError(f"Invalid JSON: {e}")
+
+# Loading
+
+def _copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, (dict, list)):
+        return orjson.dumps(value).decode()
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+def _copy_batch(conn, model, rows: list) -> set:
+    """COPY rows into a staging table and move the new ones across; returns inserted form numbers"""
+    table = model.__table__.name
+    staging = f"import_{table}"
+    column_list = ", ".join(rows[0])
+    conn.exec_driver_sql(
+        f"CREATE TEMP TABLE IF NOT EXISTS {staging} AS SELECT {column_list} FROM {table} WITH NO DATA"
+    )
+    conn.exec_driver_sql(f"TRUNCATE {staging}")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([_copy_value(value) for value in row.values()])
+    buffer.seek(0)
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert(f"COPY {staging} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer)
+    finally:
+        cursor.close()
+
+    result = conn.exec_driver_sql(
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+        f"ON CONFLICT (form_number) DO NOTHING RETURNING form_number"
+    )
+    return set(result.scalars())
+
+def _insert_batch(conn, model, rows: list) -> set:
+    """executemany INSERT ... ON CONFLICT DO NOTHING; returns inserted form numbers"""
+    stmt = insert_ignoring_conflicts(model, conn.dialect.name, "form_number").returning(model.form_number)
+    return set(conn.execute(stmt, rows).scalars())
+
+def import_records(
+    table_name: str,
+    records: Iterator[Tuple[int, object]],
+    reject_file: BinaryIO,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    engine=None
+) -> dict:
+    """
+    Validate and load records batch by batch; returns the import summary
+
+    Each batch is committed on its own, so an interrupted import keeps the
+    batches already loaded and can be re-run (existing form numbers are rejected).
+    Runs on one connection of `engine` (default: the shared sync engine).
+    """
+    model, schema, to_row = IMPORT_TABLES[table_name]
+    if engine is None:
+        engine = get_engine()
+    load_batch = _copy_batch if engine.dialect.name == "postgresql" else _insert_batch
+    summary = {"table": table_name, "read": 0, "imported": 0, "rejected": 0}
+    start = time.perf_counter()
+
+    def reject(line, errors, record):
+        summary["rejected"] += 1
+        reject_file.write(orjson.dumps(
+            {"line": line, "errors": errors, "record": record}, default=str
+        ) + b"\n")
+
+    def flush(conn, batch):
+        # A form number may repeat within the batch; only its first row can be inserted
+        rows = {}
+        for line, record, row in batch:
+            if row["form_number"] in rows:
+                reject(line, [f"Form number {row['form_number']} is duplicated in this file"], record)
+            else:
+                rows[row["form_number"]] = (line, record, row)
+        inserted = load_batch(conn, model, [row for _, _, row in rows.values()])
+        apply_rollups_sync(conn, table_name, [row for form_number, (_, _, row) in rows.items() if form_number in inserted])
+        record_changes_sync(conn, table_name, inserted)
+        conn.commit()
+        summary["imported"] += len(inserted)
+        for form_number, (line, record, _) in rows.items():
+            if form_number not in inserted:
+                reject(line, [f"Form number {form_number} already exists"], record)
+        if progress is not None:
+            elapsed = time.perf_counter() - start
+            progress({**summary, "seconds": round(elapsed, 3), "rowsPerSecond": round(summary["read"] / elapsed, 1)})
+
+    with engine.connect() as conn:
+        batch = []
+        for line, record in records:
+            summary["read"] += 1
+            if isinstance(record, Exception):
+                reject(line, [str(record)], None)
+                continue
+            try:
+                row = to_row(schema.model_validate(record))
+            except ValidationError as e:
+                reject(line, e.errors(include_url=False, include_context=False), record)
+                continue
+            except (TypeError, ValueError) as e:
+                reject(line, [str(e)], record)
+                continue
+            batch.append((line, record, row))
+            if len(batch) >= batch_size:
+                flush(conn, batch)
+                batch = []
+        if batch:
+            flush(conn, batch)
+
+    elapsed = time.perf_counter() - start
+    summary["seconds"] = round(elapsed, 3)
+    summary["rowsPerSecond"] = round(summary["read"] / elapsed, 1) if elapsed else None
+    return summary
+
+def import_file(
+    table_name: str,
+    stream: BinaryIO,
+    file_format: str,
+    reject_path: str,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    progress: Optional[Callable[[dict], None]] = None,
+    engine=None
+) -> dict:
+    """Import a CSV/NDJSON byte stream, writing rejected records to reject_path"""
+    os.makedirs(os.path.dirname(reject_path) or ".", exist_ok=True)
+    with open(reject_path, "wb") as reject_file:
+        summary = import_records(
+            table_name, read_records(table_name, stream, file_format), reject_file, batch_size, progress, engine
+        )
+    if summary["rejected"]:
+        summary["rejectFile"] = reject_path
+    else:
+        os.remove(reject_path)
+    return summary
+
+def reject_path_for(table_name: str) -> str:
+    """Default reject file under IMPORT_DIR"""
+    return os.path.join(IMPORT_DIR, f"{table_name}-{datetime.utcnow():%Y%m%dT%H%M%S%f}.rejects.ndjson")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import wheel specifications or bogie checksheets")
+    parser.add_argument("table", choices=sorted(IMPORT_TABLES))
+    parser.add_argument("path", help="CSV or NDJSON file")
+    parser.add_argument("--format", choices=FORMATS, help="Input format (default: from the file extension)")
+    parser.add_argument("--rejects", help="Reject file (default: under IMPORT_DIR)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    def report(summary):
+        print(f" {summary['read']:,} read, {summary['imported']:,} imported, "
+              f"{summary['rejected']:,} rejected ({summary['rowsPerSecond']:,.0f} rows/s)")
+
+    with open(args.path, "rb") as stream:
+        summary = import_file(
+            args.table, stream, args.format or detect_format(args.path),
+            args.rejects or reject_path_for(args.table), args.batch_size, report
+        )
+    print(f" Import completed in {summary['seconds']:.1f}s: {summary['imported']:,} imported, {summary['rejected']:,} rejected")
+    if summary["rejected"]:
+        print(f" Rejected records written to {summary['rejectFile']}")
@@ -0,0 +1,399 @@
+"""
+Write-behind ingestion queue for form submissions (INGEST_MODE=queued)
+
+POST handlers validate a submission, append it to a local SQLite queue in
+WAL mode and answer 202 Pending straight away. Submit latency is then one
+local fsync, not a pooled database connection and a commit. A background
+batcher in each worker claims pending submissions and writes them to the
+main database in one transaction per batch (group commit), then records
+each one as saved or rejected. Clients poll GET /api/forms/submissions/{id}.
+
+The queue file is shared by all workers on a host. Claims use BEGIN
+IMMEDIATE, so each submission is flushed by exactly one worker. Submissions
+a crashed worker had claimed return to pending after INGEST_CLAIM_TIMEOUT seconds.
+Each flushed form is recorded in ingest_receipts with a hash of its queue
+entry, in the same transaction, so a retried flush that finds the form number
+taken can tell its own earlier commit from someone else's form.
+
+A batch whose group commit fails is written again one submission per
+transaction, so a row the database refuses cannot hold back the others. A
+submission the database has refused INGEST_MAX_ATTEMPTS times is rejected.
+
+Backpressure: once INGEST_MAX_PENDING submissions are waiting, new ones get
+503 with Retry-After instead of growing the backlog without bound.
+"""
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import DBAPIError
+
+from database import open_async_session, insert_ignoring_conflicts
+from form_engine import FORMS
+from form_rows import wheel_spec_to_row, bogie_checksheet_to_row
+from instrumentation import logger
+from models import WheelSpecification, BogieChecksheet, IngestReceipt
+from rollups import apply_rollups
+from changefeed import record_changes
+from schemas import WheelSpecificationCreate, BogieChecksheetCreate
+
+INGEST_MODE = os.getenv("INGEST_MODE", "direct").lower()  # direct / queued
+INGEST_QUEUE_PATH = os.getenv("INGEST_QUEUE_PATH", "ingest_queue.db")
+INGEST_QUEUE_SYNCHRONOUS = os.getenv("INGEST_QUEUE_SYNCHRONOUS", "FULL").upper()
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "10000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "500"))
+INGEST_LINGER_SECONDS = float(os.getenv("INGEST_LINGER_MS", "20")) / 1000
+INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "0.5"))
+INGEST_RETRY_SECONDS = float(os.getenv("INGEST_RETRY_SECONDS", "2"))
+INGEST_CLAIM_TIMEOUT = float(os.getenv("INGEST_CLAIM_TIMEOUT", "60"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "5"))
+INGEST_RETENTION_SECONDS = float(os.getenv("INGEST_RETENTION_SECONDS", "86400"))
+
+# Form type -> (model, request schema, row mapper)
+INGEST_FORMS = {
+    "wheel_specifications": (WheelSpecification, WheelSpecificationCreate, wheel_spec_to_row),
+    "bogie_checksheets": (BogieChecksheet, BogieChecksheetCreate, bogie_checksheet_to_row),
+}
+INGEST_FORMS.update({name: (form.model, form.schema, form.to_row) for name, form in FORMS.items()})
+
+PENDING = "pending"
+FLUSHING = "flushing"
+STORED = "stored"
+REJECTED = "rejected"
+
+# Queue status -> status shown to clients
+API_STATUS = {PENDING: "Pending", FLUSHING: "Pending", STORED: "Saved", REJECTED: "Rejected"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    form_type TEXT NOT NULL,
+    form_number TEXT NOT NULL,
+    idempotency_key TEXT,
+    payload BLOB NOT NULL,
+    status TEXT NOT NULL,
+    message TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL,
+    processed_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_submissions_status ON submissions (status, id);
+CREATE INDEX IF NOT EXISTS idx_submissions_form_number ON submissions (form_type, form_number);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_submissions_idempotency_key
+    ON submissions (form_type, idempotency_key) WHERE idempotency_key IS NOT NULL;
+"""
+
+class IngestQueue:
+    """Durable submission queue in a local SQLite file; one connection per thread"""
+
+    def __init__(self, path: str = INGEST_QUEUE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are explicit BEGIN IMMEDIATE blocks
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={INGEST_QUEUE_SYNCHRONOUS}")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], object]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def enqueue(self, form_type: str, form_number: str, payload: bytes, idempotency_key: Optional[str] = None) -> Tuple[dict, bool]:
+        """Append a validated submission; returns (entry, created). A repeated idempotency key returns the original entry (422 if the body differs)"""
+        def work(conn):
+            if idempotency_key:
+                existing = conn.execute(
+                    "SELECT * FROM submissions WHERE form_type = ? AND idempotency_key = ?",
+                    (form_type, idempotency_key)
+                ).fetchone()
+                if existing is not None:
+                    if existing["payload"] != payload:
+                        raise HTTPException(
+                            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                            detail="Idempotency-Key was already used for a different request body"
+                        )
+                    return dict(existing), False
+            backlog = conn.execute(
+                "SELECT count(*) FROM submissions WHERE status IN (?, ?)", (PENDING, FLUSHING)
+            ).fetchone()[0]
+            if backlog >= INGEST_MAX_PENDING:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many submissions are waiting to be saved; retry shortly",
+                    headers={"Retry-After": "5"}
+                )
+            waiting = conn.execute(
+                "SELECT 1 FROM submissions WHERE form_type = ? AND form_number = ? AND status IN (?, ?)",
+                (form_type, form_number, PENDING, FLUSHING)
+            ).fetchone()
+            if waiting is not None:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"Form number {form_number} already exists"
+                )
+            now = time.time()
+            cursor = conn.execute(
+                "INSERT INTO submissions (form_type, form_number, idempotency_key, payload, status, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (form_type, form_number, idempotency_key, payload, PENDING, now)
+            )
+            return {"id": cursor.lastrowid, "form_type": form_type, "form_number": form_number,
+                    "status": PENDING, "message": None, "enqueued_at": now, "processed_at": None}, True
+        return self._transaction(work)
+
+    def claim(self, limit: int) -> List[dict]:
+        """Mark up to `limit` pending submissions as flushing and return them in queue order"""
+        def work(conn):
+            rows = [dict(row) for row in conn.execute(
+                "SELECT * FROM submissions WHERE status = ? ORDER BY id LIMIT ?", (PENDING, limit)
+            )]
+            if rows:
+                conn.executemany(
+                    "UPDATE submissions SET status = ?, attempts = attempts + 1, claimed_at = ? WHERE id = ?",
+                    [(FLUSHING, time.time(), row["id"]) for row in rows]
+                )
+            for row in rows:
+                # Count this claim, as the UPDATE did
+                row["attempts"] += 1
+            return rows
+        return self._transaction(work)
+
+    def complete(self, results: List[Tuple[int, str, Optional[str]]]):
+        """Record (id, STORED/REJECTED, message) outcomes"""
+        now = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE submissions SET status = ?, message = ?, processed_at = ? WHERE id = ?",
+            [(outcome, message, now, submission_id) for submission_id, outcome, message in results]
+        ))
+
+    def release(self, ids: List[int]):
+        """Return claimed submissions to pending after a failed flush"""
+        self._transaction(lambda conn: conn.executemany(
+            "UPDATE submissions SET status = ? WHERE id = ? AND status = ?",
+            [(PENDING, submission_id, FLUSHING) for submission_id in ids]
+        ))
+
+    def recover(self, claim_timeout: float = INGEST_CLAIM_TIMEOUT) -> int:
+        """Return submissions claimed by a worker that died mid-flush to pending"""
+        return self._transaction(lambda conn: conn.execute(
+            "UPDATE submissions SET status = ? WHERE status = ? AND claimed_at < ?",
+            (PENDING, FLUSHING, time.time() - claim_timeout)
+        ).rowcount)
+
+    def purge(self, retention: float = INGEST_RETENTION_SECONDS) -> int:
+        """Drop finished submissions older than the retention period"""
+        return self._transaction(lambda conn: conn.execute(
+            "DELETE FROM submissions WHERE status IN (?, ?) AND processed_at < ?",
+            (STORED, REJECTED, time.time() - retention)
+        ).rowcount)
+
+    def get(self, submission_id: int) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT id, form_type, form_number, status, message, attempts, enqueued_at, processed_at "
+            "FROM submissions WHERE id = ?", (submission_id,)
+        ).fetchone()
+        return dict(row) if row is not None else None
+
+    def stats(self) -> dict:
+        counts = dict(self._connect().execute("SELECT status, count(*) FROM submissions GROUP BY status").fetchall())
+        return {
+            "path": self.path,
+            "max_pending": INGEST_MAX_PENDING,
+            **{name: counts.get(name, 0) for name in (PENDING, FLUSHING, STORED, REJECTED)},
+        }
+
+def submission_hash(entry: dict) -> str:
+    """Identifies one queue entry across hosts: its payload and the time it was enqueued"""
+    return hashlib.sha256(entry["payload"] + repr(entry["enqueued_at"]).encode()).hexdigest()
+
+async def flush_submissions(claimed: List[dict]) -> List[Tuple[int, str, Optional[str]]]:
+    """Write claimed submissions to the database in one transaction; returns their outcomes"""
+    results = []
+    async with open_async_session() as db:
+        for form_type, (model, schema, to_row) in INGEST_FORMS.items():
+            entries = []
+            for entry in claimed:
+                if entry["form_type"] != form_type:
+                    continue
+                try:
+                    row = to_row(schema.model_validate_json(entry["payload"]))
+                except ValidationError as e:
+                    results.append((entry["id"], REJECTED, str(e)))
+                    continue
+                # Keep the time the inspector submitted, not the time of the flush
+                row["created_at"] = row["updated_at"] = datetime.utcfromtimestamp(entry["enqueued_at"])
+                entries.append((entry, row))
+            if not entries:
+                continue
+
+            stmt = insert_ignoring_conflicts(model, db.bind.dialect.name, "form_number").returning(model.form_number)
+            inserted = set((await db.scalars(stmt, [row for _, row in entries])).all())
+            await apply_rollups(db, form_type, [row for _, row in entries if row["form_number"] in inserted])
+            await record_changes(db, form_type, inserted)
+            if inserted:
+                await db.execute(insert(IngestReceipt), [
+                    {"form_type": form_type, "form_number": row["form_number"],
+                     "submission_hash": submission_hash(entry), "created_at": datetime.utcnow()}
+                    for entry, row in entries if row["form_number"] in inserted
+                ])
+            # A retried entry may have been committed by a flush that died before recording the outcome
+            retried = [row["form_number"] for entry, row in entries
+                       if entry["attempts"] > 1 and row["form_number"] not in inserted]
+            receipts = {}
+            if retried:
+                receipts = dict((await db.execute(
+                    select(IngestReceipt.form_number, IngestReceipt.submission_hash).where(
+                        IngestReceipt.form_type == form_type, IngestReceipt.form_number.in_(retried)
+                    )
+                )).all())
+            for entry, row in entries:
+                if row["form_number"] in inserted or receipts.get(row["form_number"]) == submission_hash(entry):
+                    results.append((entry["id"], STORED, None))
+                else:
+                    results.append((entry["id"], REJECTED, f"Form number {row['form_number']} already exists"))
+        await db.commit()
+    return results
+
+async def flush_individually(claimed: List[dict]) -> Tuple[List[Tuple[int, str, Optional[str]]], List[int]]:
+    """
+    Fallback after a failed group commit: one transaction per submission.
+    Returns the outcomes and the ids to release for another attempt.
+    """
+    results, failed = [], []
+    for position, entry in enumerate(claimed):
+        try:
+            results.extend(await flush_submissions([entry]))
+        except DBAPIError as e:
+            if e.connection_invalidated:
+                # The database went away, not this row; retry everything left later
+                failed.extend(other["id"] for other in claimed[position:])
+                break
+            if entry["attempts"] >= INGEST_MAX_ATTEMPTS:
+                logger.warning(f"Rejecting queued submission {entry['id']} after {entry['attempts']} attempts: {e.orig!r}")
+                results.append((entry["id"], REJECTED, f"Could not be saved: {e.orig}"))
+            else:
+                failed.append(entry["id"])
+        except Exception:
+            failed.extend(other["id"] for other in claimed[position:])
+            break
+    return results, failed
+
+async def prune_receipts(retention: float = INGEST_RETENTION_SECONDS) -> int:
+    """Drop receipts older than the retention period; their submissions are long finished"""
+    async with open_async_session() as db:
+        result = await db.execute(
+            delete(IngestReceipt).where(IngestReceipt.created_at < datetime.utcnow() - timedelta(seconds=retention))
+        )
+        await db.commit()
+        return result.rowcount
+
+class IngestBatcher:
+    """Background task that drains the queue into the database in group commits"""
+
+    def __init__(self, queue: IngestQueue, on_flushed: Optional[Callable[[], Awaitable[None]]] = None):
+        self.queue = queue
+        self.on_flushed = on_flushed
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_purge = 0.0
+        self._last_recover = 0.0
+
+    def start(self):
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        """Wake the batcher after an enqueue in this worker"""
+        self._wakeup.set()
+
+    async def stop(self, timeout: float = 30):
+        """Flush what is pending, then stop"""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingest batcher did not drain before shutdown; pending submissions stay queued")
+        self._task = None
+
+    async def flush_once(self) -> int:
+        """Flush one batch; returns the number of submissions processed"""
+        claimed = await run_in_threadpool(self.queue.claim, INGEST_BATCH_SIZE)
+        if not claimed:
+            return 0
+        failed = []
+        try:
+            try:
+                results = await flush_submissions(claimed)
+            except Exception:
+                logger.warning("Ingest group commit failed; writing the batch one submission at a time", exc_info=True)
+                results, failed = await flush_individually(claimed)
+        except Exception:
+            await run_in_threadpool(self.queue.release, [entry["id"] for entry in claimed])
+            raise
+        await run_in_threadpool(self.queue.complete, results)
+        if failed:
+            await run_in_threadpool(self.queue.release, failed)
+            if not results:
+                raise RuntimeError(f"None of {len(failed)} claimed submissions could be saved")
+        if self.on_flushed is not None:
+            await self.on_flushed()
+        return len(claimed)
+
+    async def _run(self):
+        while True:
+            try:
+                # Claims of a crashed worker go back to pending about INGEST_CLAIM_TIMEOUT after they were made
+                if time.time() - self._last_recover >= INGEST_POLL_SECONDS:
+                    self._last_recover = time.time()
+                    await run_in_threadpool(self.queue.recover)
+                if await self.flush_once():
+                    continue
+                if time.time() - self._last_purge > 3600:
+                    self._last_purge = time.time()
+                    await run_in_threadpool(self.queue.purge)
+                    await prune_receipts()
+            except Exception:
+                logger.exception("Ingest batcher flush failed")
+                if self._stopping:
+                    return
+                await asyncio.sleep(INGEST_RETRY_SECONDS)
+                continue
+            if self._stopping:
+                return
+            self._wakeup.clear()
+            try:
+                # Submissions from other workers arrive without a wakeup, hence the poll
+                await asyncio.wait_for(self._wakeup.wait(), INGEST_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            # Let concurrent submissions pile up into one group commit
+            await asyncio.sleep(INGEST_LINGER_SECONDS)
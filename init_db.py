@@ -0,0 +1,29 @@
+"""
+Create the database schema
+
+Schema management is an explicit step instead of something the API does on
+import. Run once per deployment (and after model changes on development
+databases); safe to re-run, existing tables are left untouched.
+
+PostgreSQL deployments can use scripts/create_kpa_database.sql instead.
+
+Usage:
+    python init_db.py
+"""
+from database import DATABASE_URL, get_engine, safe_url
+from models import Base
+import form_engine  # adds the tables of the declarative form types to Base.metadata
+
+def create_schema():
+    """Create any missing tables and indexes"""
+    Base.metadata.create_all(bind=get_engine())
+
+async def create_schema_async(async_engine):
+    """create_schema() on an async engine, for CREATE_SCHEMA_ON_STARTUP"""
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+if __name__ == "__main__":
+    print(f" Creating database tables on {safe_url(DATABASE_URL)}...")
+    create_schema()
+    print("Database tables created successfully!")
@@ -0,0 +1,242 @@
+"""
+Request-level performance instrumentation
+
+An ASGI middleware gives each request a RequestStats object through a
+context variable. SQLAlchemy cursor events add database time and query counts to it,
+and handlers report rows returned and serialization time. When the request
+finishes the stats are:
+    - added to the Prometheus metrics served at /metrics
+    - returned to the client in a Server-Timing header
+    - written as one structured JSON log line
+
+Queries slower than SLOW_QUERY_MS are logged to "kpa.slow_query" together
+with their EXPLAIN plan.
+
+Logging goes through a queue so request handlers never block on stdout.
+"""
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+import orjson
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+from metrics import (
+    http_requests_total, http_request_seconds, db_seconds, db_queries_total,
+    rows_returned_total, serialize_seconds, slow_queries_total
+)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+SLOW_QUERY_EXPLAIN = os.getenv("SLOW_QUERY_EXPLAIN", "true").lower() in ("1", "true", "yes")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+
+logger = logging.getLogger("kpa")
+request_logger = logging.getLogger("kpa.request")
+slow_query_logger = logging.getLogger("kpa.slow_query")
+
+class RequestStats:
+    """Timing collected while one request is handled"""
+
+    __slots__ = ("scope", "db_seconds", "queries", "rows", "serialize_seconds")
+
+    def __init__(self, scope: Optional[dict] = None):
+        self.scope = scope
+        self.db_seconds = 0.0
+        self.queries = 0
+        self.rows = 0
+        self.serialize_seconds = 0.0
+
+    @property
+    def route(self) -> str:
+        route = self.scope.get("route") if self.scope else None
+        return route.path if route is not None else "unmatched"
+
+_current_stats: contextvars.ContextVar = contextvars.ContextVar("request_stats", default=None)
+
+def record_rows(count: int):
+    """Report how many rows the current request returned"""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.rows += count
+
+@contextmanager
+def timed_serialization():
+    """Count the enclosed block as serialization time for the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.serialize_seconds += time.perf_counter() - start
+
+# Logging
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return orjson.dumps(entry, default=str).decode()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def configure_logging():
+    """Route the "kpa" loggers through a background thread that writes JSON lines to stdout"""
+    global _listener
+    if _listener is not None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+# Database hooks
+
+def _explain(conn, statement: str, parameters, context) -> Optional[list]:
+    prefix = {"postgresql": "EXPLAIN ", "sqlite": "EXPLAIN QUERY PLAN "}.get(conn.dialect.name)
+    if prefix is None or not statement.lstrip().upper().startswith("SELECT"):
+        return None
+    if context is not None and context.execution_options.get("stream_results"):
+        # A server-side cursor is still open on this connection
+        return None
+    # The EXPLAIN shares the request's transaction. On PostgreSQL a failed
+    # statement would abort it, so it runs inside a savepoint that is rolled
+    # back when the EXPLAIN fails.
+    savepoint = conn.dialect.name == "postgresql"
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        if savepoint:
+            cursor.execute("SAVEPOINT kpa_explain")
+        try:
+            cursor.execute(prefix + statement, parameters)
+            plan = [" ".join(str(value) for value in row) for row in cursor.fetchall()]
+        except Exception:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT kpa_explain")
+                cursor.execute("RELEASE SAVEPOINT kpa_explain")
+            raise
+        if savepoint:
+            cursor.execute("RELEASE SAVEPOINT kpa_explain")
+        return plan
+    except Exception:
+        slow_query_logger.warning("EXPLAIN failed", exc_info=True, extra={"fields": {"statement": statement}})
+        return None
+    finally:
+        cursor.close()
+
+def instrument_engine(engine):
+    """Attach query timing and the slow-query log to a sync Engine (async engines: .sync_engine)"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        stats = _current_stats.get()
+        if stats is not None:
+            stats.db_seconds += elapsed
+            stats.queries += 1
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            route = stats.route if stats is not None else "background"
+            slow_queries_total.inc(1, route)
+            plan = None
+            if SLOW_QUERY_EXPLAIN and not executemany:
+                plan = _explain(conn, statement, parameters, context)
+            slow_query_logger.warning("slow query", extra={"fields": {
+                "duration_ms": round(elapsed * 1000, 3),
+                "route": route,
+                "statement": statement,
+                "parameters": None if executemany else parameters,
+                "plan": plan,
+            }})
+
+    @event.listens_for(engine, "handle_error")
+    def _handle_error(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start"):
+            connection.info["query_start"].pop()
+
+# Middleware
+
+class InstrumentationMiddleware:
+    """
+    Pure ASGI middleware (no BaseHTTPMiddleware task and body re-streaming)
+
+    Metrics and the log line are recorded once the response body is complete,
+    so database time spent while a StreamingResponse is sent is counted. The
+    Server-Timing header goes out with the response start and covers the work
+    done before it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope)
+        token = _current_stats.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed = time.perf_counter() - start
+                MutableHeaders(scope=message).append("Server-Timing", (
+                    f"app;dur={elapsed * 1000:.2f}, "
+                    f'db;dur={stats.db_seconds * 1000:.2f};desc="{stats.queries} queries", '
+                    f"serialize;dur={stats.serialize_seconds * 1000:.2f}"
+                ))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            route = stats.route
+            method = scope["method"]
+            http_requests_total.inc(1, method, route, str(status_code))
+            http_request_seconds.observe(elapsed, method, route)
+            db_seconds.observe(stats.db_seconds, method, route)
+            db_queries_total.inc(stats.queries, method, route)
+            rows_returned_total.inc(stats.rows, method, route)
+            serialize_seconds.observe(stats.serialize_seconds, method, route)
+            request_logger.info("request", extra={"fields": {
+                "method": method,
+                "route": route,
+                "path": scope["path"],
+                "query": scope["query_string"].decode("latin-1"),
+                "status": status_code,
+                "duration_ms": round(elapsed * 1000, 3),
+                "db_ms": round(stats.db_seconds * 1000, 3),
+                "queries": stats.queries,
+                "rows": stats.rows,
+                "serialize_ms": round(stats.serialize_seconds * 1000, 3),
+            }})
+            _current_stats.reset(token)
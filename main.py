@@ -1,31 +1,208 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Query
+from fastapi import FastAPI, HTTPException, Depends, status, Query, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
+from pydantic import BaseModel
+from sqlalchemy import select, func, bindparam, literal_column
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Callable, List, Optional
+from operator import itemgetter
+import asyncio
+import heapq
+import orjson
+import operator
 import uvicorn
-from datetime import datetime
-import json
+from datetime import date
+from contextlib import asynccontextmanager
+import os
+import tempfile
 
-from database import get_db, engine
-from models import Base, WheelSpecification, BogieChecksheet, User
+from database import (
+    get_async_db, open_async_session, get_async_engine, get_import_engine, dispose_engines,
+    pool_status, insert_ignoring_conflicts, safe_url, ASYNC_DATABASE_URL, IMPORT_CONNECTIONS
+)
+from metrics import pool_wait_seconds, render_prometheus
+from instrumentation import (
+    configure_logging, InstrumentationMiddleware,
+    record_rows, timed_serialization, logger
+)
+from models import WheelSpecification, BogieChecksheet, User, FormDailyCount, WheelTreadDaily
+from init_db import create_schema_async
 from schemas import (
     WheelSpecificationCreate, WheelSpecificationResponse, 
     WheelSpecCreateResponse, WheelSpecListResponse,
-    BogieChecksheetCreate, UserLogin, UserResponse
+    WheelSpecBulkItemResult, WheelSpecBulkResponse,
+    BogieChecksheetCreate, BogieChecksheetListResponse, BOGIE_COMPONENT_COLUMNS,
+    UserLogin, UserResponse
+)
+from form_rows import wheel_spec_to_row, bogie_checksheet_to_row
+from form_engine import FORMS, CompiledForm
+from rollups import apply_rollups
+from changefeed import ChangeFeed, record_changes, fetch_changes, current_seq, CHANGE_FEED_BATCH_SIZE
+from search import search, SEARCH_SOURCES, SEARCH_CANDIDATES, MIN_QUERY_LENGTH
+import archive
+from importer import import_file, detect_format, reject_path_for, IMPORT_BATCH_SIZE
+from exporter import export_encoder, stream_export, export_media_type, export_filename, EXPORT_BATCH_SIZE
+from serialization import (
+    WHEEL_SPEC_COLUMNS, WHEEL_SPEC_COLUMN_NAMES, BOGIE_COLUMNS, BOGIE_COLUMN_NAMES,
+    dump_wheel_spec_list, dump_wheel_spec_ndjson, dump_bogie_list
 )
-from auth import authenticate_user, create_access_token, get_current_user
+from cache import create_response_cache, cache_key, make_etag
+from idempotency import load_response, save_response, request_hash
+from auth import authenticate_user, create_access_token, get_current_user, user_cache, password_hash_pool
+from ingest_queue import IngestQueue, IngestBatcher, INGEST_MODE, API_STATUS
+from replicas import replica_set, open_read_session, reads_pinned_to_primary, ReadYourWritesMiddleware
+
+# Schema creation is normally an explicit step (python init_db.py)
+CREATE_SCHEMA_ON_STARTUP = os.getenv("CREATE_SCHEMA_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Worker startup and shutdown
 
-# tables
-print(" Creating database tables...")
-Base.metadata.create_all(bind=engine)
-print("Database tables created successfully!")
+    Importing this module has no side effects; logging and the engine are set
+    up here. Creating the engine does not connect, so a worker boots even if
+    the database is briefly unavailable.
+    """
+    configure_logging()
+    async_engine = get_async_engine()
+    logger.info(f"Database engine ready for {safe_url(ASYNC_DATABASE_URL)}")
+    if CREATE_SCHEMA_ON_STARTUP:
+        await create_schema_async(async_engine)
+        logger.info("Database tables created successfully!")
+    if ingest_batcher is not None:
+        ingest_batcher.start()
+        logger.info(f"Queued ingestion enabled ({ingest_queue.path})")
+    if replica_set:
+        replica_set.start()
+        logger.info(f"Routing reads to {len(replica_set.replicas)} replica(s)")
+    change_feed.start()
+    yield
+    await change_feed.stop()
+    if ingest_batcher is not None:
+        await ingest_batcher.stop()
+    await replica_set.stop()
+    await dispose_engines()
 
 app = FastAPI(
     title="KPA Form Data API",
     description="Railway Operations API for KPA form submissions",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Cache for GET list responses, invalidated by wheel-spec writes
+response_cache = create_response_cache()
+
+# Pushes new submissions to change stream subscribers of this worker
+change_feed = ChangeFeed()
+
+async def forms_committed():
+    """After new forms are committed: wake the change feed and drop cached lists"""
+    change_feed.notify()
+    await response_cache.invalidate()
+
+# Write-behind ingestion: POSTs are queued locally and saved by a background batcher
+if INGEST_MODE == "queued":
+    ingest_queue = IngestQueue()
+    ingest_batcher = IngestBatcher(ingest_queue, on_flushed=forms_committed)
+else:
+    ingest_queue = ingest_batcher = None
+
+async def get_write_db():
+    """Session for form submissions; none in queued mode, where POSTs never touch the database"""
+    if ingest_queue is not None:
+        yield None
+        return
+    async with open_async_session() as db:
+        yield db
+
+def submission_url(submission_id: int) -> str:
+    return f"/api/forms/submissions/{submission_id}"
+
+async def queue_submission(form_type: str, form_number: str, payload: bytes, idempotency_key: Optional[str], message: str, data: dict) -> JSONResponse:
+    """Queue a validated submission and answer 202 Pending"""
+    entry, created = await run_in_threadpool(
+        ingest_queue.enqueue, form_type, form_number, payload, idempotency_key
+    )
+    if created:
+        ingest_batcher.notify()
+    status_url = submission_url(entry["id"])
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content={
+            "success": True,
+            "message": message,
+            "data": {
+                **data,
+                "status": API_STATUS[entry["status"]],
+                "submissionId": entry["id"],
+                "statusUrl": status_url
+            }
+        },
+        headers={"Location": status_url}
+    )
+
+async def insert_form(
+    db: AsyncSession,
+    request: Request,
+    idempotency_key: Optional[str],
+    form_data: BaseModel,
+    form_type: str,
+    model,
+    row: dict,
+    returning: tuple,
+    make_response: Callable[[tuple], dict],
+    cached: bool = False
+) -> dict:
+    """
+    Direct-mode write of one submitted form, shared by every POST handler
+
+    Replays a stored Idempotency-Key response, inserts unless the form number
+    already exists (400), updates the rollups and change feed, stores the
+    response under the key and commits. `make_response` builds the 201 body
+    from (form_number, *returning). Lists of `cached` form types are dropped
+    from the response cache after the commit.
+    """
+    body_hash = request_hash(form_data) if idempotency_key else None
+    if idempotency_key:
+        replay = await load_response(db, idempotency_key, request.url.path, body_hash)
+        if replay is not None:
+            return replay
+    
+    # Insert unless the form number already exists, in one round-trip
+    stmt = insert_ignoring_conflicts(
+        model, db.bind.dialect.name, "form_number"
+    ).values(**row).returning(model.form_number, *returning)
+    created = (await db.execute(stmt)).first()
+    
+    if created is None:
+        await db.rollback()
+        # A concurrent retry with the same key may have won the insert
+        if idempotency_key:
+            replay = await load_response(db, idempotency_key, request.url.path, body_hash)
+            if replay is not None:
+                return replay
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Form number {row['form_number']} already exists"
+        )
+    
+    await apply_rollups(db, form_type, [row])
+    await record_changes(db, form_type, [created[0]])
+    
+    response = make_response(created)
+    if idempotency_key:
+        save_response(db, idempotency_key, request.url.path, body_hash, status.HTTP_201_CREATED, response)
+    await db.commit()
+    if cached:
+        await forms_committed()
+    else:
+        change_feed.notify()
+    return response
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -35,6 +212,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Per-request timing: metrics, Server-Timing header and a structured log line
+app.add_middleware(InstrumentationMiddleware)
+
+# Read-replica routing: pin a client's reads to the primary right after its own writes
+app.add_middleware(ReadYourWritesMiddleware)
+
 @app.get("/")
 async def root():
     return {
@@ -50,153 +233,323 @@ async def root():
     }
 
 # API 1: POST - Submit Wheel Specifications
-
 @app.post("/api/forms/wheel-specifications", response_model=WheelSpecCreateResponse, status_code=status.HTTP_201_CREATED)
 async def create_wheel_specification(
     wheel_spec: WheelSpecificationCreate,
-    db: Session = Depends(get_db)
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Optional[AsyncSession] = Depends(get_write_db)
 ):
     """
     Submit wheel specification form
     
     Creates a new wheel specification entry with all the technical measurements
     and specifications required for railway wheel maintenance.
+    
+    Send an Idempotency-Key header to have retries answered with the stored result.
+    With INGEST_MODE=queued the form is queued and answered with 202 Pending.
     """
+    if ingest_queue is not None:
+        return await queue_submission(
+            "wheel_specifications", wheel_spec.formNumber, wheel_spec.model_dump_json().encode(), idempotency_key,
+            "Wheel specification accepted for processing.",
+            {
+                "formNumber": wheel_spec.formNumber,
+                "submittedBy": wheel_spec.submittedBy,
+                "submittedDate": wheel_spec.submittedDate
+            }
+        )
     try:
-        print(f"Creating wheel specification: {wheel_spec.formNumber}")
-        
-        # Check if form number already exists
-        existing_form = db.query(WheelSpecification).filter(
-            WheelSpecification.form_number == wheel_spec.formNumber
-        ).first()
+        return await insert_form(
+            db, request, idempotency_key, wheel_spec, "wheel_specifications", WheelSpecification,
+            wheel_spec_to_row(wheel_spec),
+            (WheelSpecification.submitted_by, WheelSpecification.submitted_date, WheelSpecification.status),
+            lambda created: WheelSpecCreateResponse(
+                success=True,
+                message="Wheel specification submitted successfully.",
+                data={
+                    "formNumber": created.form_number,
+                    "submittedBy": created.submitted_by,
+                    "submittedDate": created.submitted_date.isoformat(),
+                    "status": created.status
+                }
+            ).model_dump(),
+            cached=True
+        )
         
-        if existing_form:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Form number {wheel_spec.formNumber} already exists"
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error creating wheel specification")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create wheel specification: {str(e)}"
+        )
+
+# Bulk POST - Submit many Wheel Specifications in one transaction
+
+MAX_BULK_SIZE = 1000
+
+@app.post("/api/forms/wheel-specifications/bulk", response_model=WheelSpecBulkResponse)
+async def create_wheel_specifications_bulk(
+    wheel_specs: List[WheelSpecificationCreate],
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Submit a batch of wheel specification forms
+
+    Duplicates are checked with one set-based query and the new forms are
+    inserted with a single multi-row statement. Each item gets its own
+    success/failure entry in the response.
+    """
+    if len(wheel_specs) > MAX_BULK_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {MAX_BULK_SIZE} forms can be submitted per batch"
+        )
+    
+    try:
+        form_numbers = {spec.formNumber for spec in wheel_specs}
+        existing = set((await db.scalars(
+            select(WheelSpecification.form_number).where(
+                WheelSpecification.form_number.in_(form_numbers)
             )
+        )).all())
         
-        # Create new wheel specification
-        db_wheel_spec = WheelSpecification(
-            form_number=wheel_spec.formNumber,
-            submitted_by=wheel_spec.submittedBy,
-            submitted_date=wheel_spec.submittedDate,
-            tread_diameter_new=wheel_spec.fields.treadDiameterNew,
-            last_shop_issue_size=wheel_spec.fields.lastShopIssueSize,
-            condemning_dia=wheel_spec.fields.condemningDia,
-            wheel_gauge=wheel_spec.fields.wheelGauge,
-            variation_same_axle=wheel_spec.fields.variationSameAxle,
-            variation_same_bogie=wheel_spec.fields.variationSameBogie,
-            variation_same_coach=wheel_spec.fields.variationSameCoach,
-            wheel_profile=wheel_spec.fields.wheelProfile,
-            intermediate_wwp=wheel_spec.fields.intermediateWWP,
-            bearing_seat_diameter=wheel_spec.fields.bearingSeatDiameter,
-            roller_bearing_outer_dia=wheel_spec.fields.rollerBearingOuterDia,
-            roller_bearing_bore_dia=wheel_spec.fields.rollerBearingBoreDia,
-            roller_bearing_width=wheel_spec.fields.rollerBearingWidth,
-            axle_box_housing_bore_dia=wheel_spec.fields.axleBoxHousingBoreDia,
-            wheel_disc_width=wheel_spec.fields.wheelDiscWidth,
-            status="Saved",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
-        )
+        results = []
+        rows = []
+        seen = set()
+        for spec in wheel_specs:
+            if spec.formNumber in existing:
+                results.append(WheelSpecBulkItemResult(
+                    formNumber=spec.formNumber,
+                    success=False,
+                    message=f"Form number {spec.formNumber} already exists"
+                ))
+            elif spec.formNumber in seen:
+                results.append(WheelSpecBulkItemResult(
+                    formNumber=spec.formNumber,
+                    success=False,
+                    message=f"Form number {spec.formNumber} is duplicated in this batch"
+                ))
+            else:
+                seen.add(spec.formNumber)
+                rows.append(wheel_spec_to_row(spec))
+                results.append(WheelSpecBulkItemResult(
+                    formNumber=spec.formNumber,
+                    success=True,
+                    message="Wheel specification submitted successfully."
+                ))
         
-        db.add(db_wheel_spec)
-        db.commit()
-        db.refresh(db_wheel_spec)
+        created = 0
+        if rows:
+            # Rows inserted concurrently since the duplicate check are skipped, not fatal
+            stmt = insert_ignoring_conflicts(
+                WheelSpecification, db.bind.dialect.name, "form_number"
+            ).returning(WheelSpecification.form_number)
+            inserted = set((await db.scalars(stmt, rows)).all())
+            await apply_rollups(db, "wheel_specifications", [row for row in rows if row["form_number"] in inserted])
+            await record_changes(db, "wheel_specifications", inserted)
+            await db.commit()
+            await forms_committed()
+            created = len(inserted)
+            for result in results:
+                if result.success and result.formNumber not in inserted:
+                    result.success = False
+                    result.message = f"Form number {result.formNumber} already exists"
         
-        print(f"Wheel specification created successfully: {db_wheel_spec.form_number}")
+        logger.info(f"Bulk wheel specification insert: {created} created, {len(wheel_specs) - created} rejected")
         
-        return WheelSpecCreateResponse(
-            success=True,
-            message="Wheel specification submitted successfully.",
-            data={
-                "formNumber": db_wheel_spec.form_number,
-                "submittedBy": db_wheel_spec.submitted_by,
-                "submittedDate": db_wheel_spec.submitted_date,
-                "status": db_wheel_spec.status
-            }
+        return WheelSpecBulkResponse(
+            success=created == len(wheel_specs),
+            message=f"{created} of {len(wheel_specs)} wheel specifications submitted.",
+            data=results
         )
         
-    except HTTPException:
-        raise
     except Exception as e:
-        print(f" Error creating wheel specification: {str(e)}")
-        db.rollback()
+        logger.exception("Error creating wheel specifications in bulk")
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create wheel specification: {str(e)}"
+            detail=f"Failed to create wheel specifications: {str(e)}"
         )
 
 # API 2: GET - Retrieve Wheel Specifications with Filters
 
+STREAM_BATCH_SIZE = 500
+MAX_PAGE_SIZE = 1000
+
+def wheel_spec_conditions(
+    formNumber=None, submittedBy=None, submittedDate=None, fromDate=None, toDate=None,
+    treadDiameterBelow=None, nearCondemning=None, cursor=None
+) -> list:
+    """
+    GET filters as (column, operator, value) conditions
+
+    The same list is applied to the hot table in SQL and to the Parquet archive.
+    """
+    conditions = []
+    if formNumber:
+        conditions.append(("form_number", operator.eq, formNumber))
+    if submittedBy:
+        conditions.append(("submitted_by", operator.eq, submittedBy))
+    if submittedDate:
+        conditions.append(("submitted_date", operator.eq, submittedDate))
+    if fromDate:
+        conditions.append(("submitted_date", operator.ge, fromDate))
+    if toDate:
+        conditions.append(("submitted_date", operator.le, toDate))
+    if treadDiameterBelow is not None:
+        conditions.append(("tread_diameter_new_nominal", operator.lt, treadDiameterBelow))
+    if nearCondemning is not None:
+        conditions.append(("condemning_margin", operator.le, nearCondemning))
+    if cursor is not None:
+        conditions.append(("id", operator.gt, cursor))
+    return conditions
+
+def wheel_spec_query(conditions: list):
+    """SELECT of WHEEL_SPEC_COLUMNS matching the conditions, in id order"""
+    query = select(*WHEEL_SPEC_COLUMNS)
+    for column, op, value in conditions:
+        query = query.where(op(getattr(WheelSpecification, column), value))
+    return query.order_by(WheelSpecification.id)
+
+async def iter_row_batches(query, batch_size: int, archived_batches=None):
+    """Yield lists of rows: archived batches first, then the hot table through a server-side cursor"""
+    if archived_batches is not None:
+        async for batch in iterate_in_threadpool(archived_batches):
+            record_rows(len(batch))
+            yield batch
+    async with open_read_session() as db:
+        result = await db.stream(query.execution_options(yield_per=batch_size))
+        async for batch in result.partitions():
+            record_rows(len(batch))
+            yield batch
+
+async def stream_wheel_specifications(query, archived_batches=None):
+    """Yield matching rows as NDJSON, fetching in batches from a server-side cursor"""
+    async for batch in iter_row_batches(query, STREAM_BATCH_SIZE, archived_batches):
+        yield b"".join(dump_wheel_spec_ndjson(row) for row in batch)
+
+def cached_response(etag: str, body: bytes, if_none_match: Optional[str]) -> Response:
+    """Serve a cached body, or 304 when the client already has this version"""
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
 @app.get("/api/forms/wheel-specifications", response_model=WheelSpecListResponse)
 async def get_wheel_specifications(
     formNumber: Optional[str] = Query(None, description="Filter by form number"),
     submittedBy: Optional[str] = Query(None, description="Filter by submitted by user"),
-    submittedDate: Optional[str] = Query(None, description="Filter by submitted date"),
-    db: Session = Depends(get_db)
+    submittedDate: Optional[date] = Query(None, description="Filter by submitted date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Submitted on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Submitted on or before this date (YYYY-MM-DD)"),
+    treadDiameterBelow: Optional[float] = Query(None, description="Nominal new tread diameter below this value (mm)"),
+    nearCondemning: Optional[float] = Query(None, ge=0, description="Last shop issue size within this many mm of the condemning diameter"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size for cursor pagination"),
+    cursor: Optional[int] = Query(None, ge=0, description="Return rows after this cursor (nextCursor of the previous page)"),
+    stream: bool = Query(False, description="Stream all matching rows as NDJSON"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
 ):
     """
     Retrieve wheel specifications with optional filtering
-    
+
     Query parameters:
     - formNumber: Filter by specific form number
     - submittedBy: Filter by user who submitted
     - submittedDate: Filter by submission date
+    - fromDate / toDate: Inclusive submission date range
+    - treadDiameterBelow: Nominal new tread diameter below this value (mm)
+    - nearCondemning: At most this many mm above the condemning diameter
+    - limit / cursor: Keyset pagination on id; pass nextCursor back as cursor
+    - stream: Stream every matching row as application/x-ndjson
+
+    List responses are cached per filter combination and carry an ETag;
+    send it back in If-None-Match to get 304 Not Modified.
     """
     try:
-        print(f" Fetching wheel specifications with filters: formNumber={formNumber}, submittedBy={submittedBy}, submittedDate={submittedDate}")
+        conditions = wheel_spec_conditions(
+            formNumber=formNumber,
+            submittedBy=submittedBy,
+            submittedDate=submittedDate,
+            fromDate=fromDate,
+            toDate=toDate,
+            treadDiameterBelow=treadDiameterBelow,
+            nearCondemning=nearCondemning,
+            cursor=cursor
+        )
+        query = wheel_spec_query(conditions)
         
-        query = db.query(WheelSpecification)
+        # Date ranges that reach archived months also read the Parquet archive
+        archive_from = submittedDate or fromDate
+        archive_to = submittedDate or toDate
+        use_archive = archive.covers("wheel_specifications", archive_from, archive_to)
         
-        # Apply filters
-        if formNumber:
-            query = query.filter(WheelSpecification.form_number == formNumber)
-        if submittedBy:
-            query = query.filter(WheelSpecification.submitted_by == submittedBy)
-        if submittedDate:
-            query = query.filter(WheelSpecification.submitted_date == submittedDate)
+        if stream:
+            archived_batches = None
+            if use_archive:
+                archived_batches = archive.iter_archived_batches(
+                    "wheel_specifications", WHEEL_SPEC_COLUMN_NAMES, conditions, archive_from, archive_to
+                )
+            return StreamingResponse(
+                stream_wheel_specifications(query, archived_batches),
+                media_type="application/x-ndjson"
+            )
         
-        specifications = query.all()
-        print(f"Found {len(specifications)} wheel specifications")
+        key = cache_key("wheel-specifications", {
+            "formNumber": formNumber,
+            "submittedBy": submittedBy,
+            "submittedDate": submittedDate,
+            "fromDate": fromDate,
+            "toDate": toDate,
+            "treadDiameterBelow": treadDiameterBelow,
+            "nearCondemning": nearCondemning,
+            "limit": limit,
+            "cursor": cursor
+        })
+        # A client that just wrote skips the cache, which may hold a replica's older view
+        cached = None if reads_pinned_to_primary() else await response_cache.get(key)
+        if cached is not None:
+            return cached_response(*cached, if_none_match)
         
-        # Format response data
-        response_data = []
-        for spec in specifications:
-            spec_data = {
-                "formNumber": spec.form_number,
-                "submittedBy": spec.submitted_by,
-                "submittedDate": spec.submitted_date,
-                "fields": {
-                    "treadDiameterNew": spec.tread_diameter_new,
-                    "lastShopIssueSize": spec.last_shop_issue_size,
-                    "condemningDia": spec.condemning_dia,
-                    "wheelGauge": spec.wheel_gauge,
-                    "variationSameAxle": spec.variation_same_axle,
-                    "variationSameBogie": spec.variation_same_bogie,
-                    "variationSameCoach": spec.variation_same_coach,
-                    "wheelProfile": spec.wheel_profile,
-                    "intermediateWWP": spec.intermediate_wwp,
-                    "bearingSeatDiameter": spec.bearing_seat_diameter,
-                    "rollerBearingOuterDia": spec.roller_bearing_outer_dia,
-                    "rollerBearingBoreDia": spec.roller_bearing_bore_dia,
-                    "rollerBearingWidth": spec.roller_bearing_width,
-                    "axleBoxHousingBoreDia": spec.axle_box_housing_bore_dia,
-                    "wheelDiscWidth": spec.wheel_disc_width
-                },
-                "status": spec.status
-            }
-            response_data.append(spec_data)
+        next_cursor = None
+        paginated = limit is not None or cursor is not None
+        page_size = limit or MAX_PAGE_SIZE
+        async with open_read_session() as db:
+            if paginated:
+                # Fetch one extra row to know whether another page exists
+                specifications = (await db.execute(query.limit(page_size + 1))).all()
+            else:
+                specifications = (await db.execute(query)).all()
         
-        return WheelSpecListResponse(
-            success=True,
-            message="Filtered wheel specification forms fetched successfully.",
-            data=response_data
-        )
+        if use_archive:
+            archived = await run_in_threadpool(
+                archive.read_archived,
+                "wheel_specifications", WHEEL_SPEC_COLUMN_NAMES, conditions, archive_from, archive_to,
+                page_size + 1 if paginated else None
+            )
+            specifications = list(heapq.merge(archived, specifications, key=itemgetter(0)))
+        
+        if paginated and len(specifications) > page_size:
+            specifications = specifications[:page_size]
+            next_cursor = specifications[-1][0]
+        record_rows(len(specifications))
+        
+        # Encode rows straight to the WheelSpecListResponse JSON body
+        with timed_serialization():
+            body = dump_wheel_spec_list(
+                specifications,
+                message="Filtered wheel specification forms fetched successfully.",
+                next_cursor=next_cursor
+            )
+        etag = make_etag(body)
+        await response_cache.set(key, etag, body)
+        
+        return cached_response(etag, body, if_none_match)
         
     except Exception as e:
-        print(f"Error fetching wheel specifications: {str(e)}")
+        logger.exception("Error fetching wheel specifications")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to retrieve wheel specifications: {str(e)}"
@@ -206,74 +559,844 @@ async def get_wheel_specifications(
 @app.post("/api/forms/bogie-checksheet", status_code=status.HTTP_201_CREATED)
 async def create_bogie_checksheet(
     bogie_data: BogieChecksheetCreate,
-    db: Session = Depends(get_db)
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: Optional[AsyncSession] = Depends(get_write_db)
 ):
     """
     Submit bogie checksheet form
     
     Creates a new bogie inspection checksheet with detailed component conditions.
+    
+    Send an Idempotency-Key header to have retries answered with the stored result.
+    With INGEST_MODE=queued the form is queued and answered with 202 Pending.
     """
+    if ingest_queue is not None:
+        return await queue_submission(
+            "bogie_checksheets", bogie_data.formNumber, bogie_data.model_dump_json().encode(), idempotency_key,
+            "Bogie checksheet accepted for processing.",
+            {
+                "formNumber": bogie_data.formNumber,
+                "inspectionBy": bogie_data.inspectionBy,
+                "inspectionDate": bogie_data.inspectionDate
+            }
+        )
     try:
-        print(f" Creating bogie checksheet: {bogie_data.formNumber}")
-        
-        # Check if form number already exists
-        existing_form = db.query(BogieChecksheet).filter(
-            BogieChecksheet.form_number == bogie_data.formNumber
-        ).first()
+        return await insert_form(
+            db, request, idempotency_key, bogie_data, "bogie_checksheets", BogieChecksheet,
+            bogie_checksheet_to_row(bogie_data),
+            (BogieChecksheet.inspection_by, BogieChecksheet.inspection_date, BogieChecksheet.status),
+            lambda created: {
+                "success": True,
+                "message": "Bogie checksheet submitted successfully.",
+                "data": {
+                    "formNumber": created.form_number,
+                    "inspectionBy": created.inspection_by,
+                    "inspectionDate": created.inspection_date,
+                    "status": created.status
+                }
+            }
+        )
         
-        if existing_form:
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Error creating bogie checksheet")
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to create bogie checksheet: {str(e)}"
+        )
+
+# Status of a queued submission (INGEST_MODE=queued)
+@app.get("/api/forms/submissions/{submission_id}")
+async def get_submission_status(submission_id: int):
+    """
+    Processing status of a queued form submission
+
+    Pending until the background batcher has written it, then Saved, or
+    Rejected with the reason (e.g. the form number already exists).
+    """
+    entry = await run_in_threadpool(ingest_queue.get, submission_id) if ingest_queue is not None else None
+    if entry is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Submission {submission_id} not found"
+        )
+    return {
+        "success": True,
+        "data": {
+            "submissionId": entry["id"],
+            "formType": entry["form_type"],
+            "formNumber": entry["form_number"],
+            "status": API_STATUS[entry["status"]],
+            "message": entry["message"],
+            "attempts": entry["attempts"],
+            "statusUrl": submission_url(entry["id"])
+        }
+    }
+
+# Bulk import of historical forms
+
+# Each running import holds one unpooled connection; further imports wait here
+import_slots = asyncio.Semaphore(IMPORT_CONNECTIONS)
+
+async def import_request_body(table_name: str, request: Request, file_format: Optional[str]) -> dict:
+    """Spool a CSV/NDJSON request body to disk and import it off the event loop"""
+    file_format = file_format or detect_format(None, request.headers.get("content-type"))
+    with tempfile.TemporaryFile() as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        async with import_slots:
+            return await run_in_threadpool(
+                import_file, table_name, spool, file_format, reject_path_for(table_name), IMPORT_BATCH_SIZE,
+                lambda summary: logger.info("Import progress", extra={"fields": summary}),
+                get_import_engine()
+            )
+
+@app.post("/api/forms/wheel-specifications/import")
+async def import_wheel_specifications(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Body format (default: from Content-Type)")
+):
+    """
+    Import historical wheel specification forms
+
+    The request body is CSV or NDJSON (Content-Type text/csv or
+    application/x-ndjson). Records are validated like POST submissions and
+    loaded in batches; rejected records are written to a reject file whose
+    path is returned.
+    """
+    try:
+        summary = await import_request_body("wheel_specifications", request, format)
+        await forms_committed()
+        return {
+            "success": summary["rejected"] == 0,
+            "message": f"{summary['imported']} of {summary['read']} wheel specifications imported.",
+            "data": summary
+        }
+    except Exception as e:
+        logger.exception("Error importing wheel specifications")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import wheel specifications: {str(e)}"
+        )
+
+@app.post("/api/forms/bogie-checksheet/import")
+async def import_bogie_checksheets(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Body format (default: from Content-Type)")
+):
+    """
+    Import historical bogie checksheet forms
+
+    Same body formats and reject handling as the wheel specification import.
+    """
+    try:
+        summary = await import_request_body("bogie_checksheets", request, format)
+        change_feed.notify()
+        return {
+            "success": summary["rejected"] == 0,
+            "message": f"{summary['imported']} of {summary['read']} bogie checksheets imported.",
+            "data": summary
+        }
+    except Exception as e:
+        logger.exception("Error importing bogie checksheets")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to import bogie checksheets: {str(e)}"
+        )
+
+# GET - Retrieve Bogie Checksheets with Filters
+
+def json_text(column, key: str, dialect_name: str):
+    """column->>key, written to match the expression indexes on BogieChecksheet"""
+    if dialect_name == "postgresql":
+        return column.op("->>")(literal_column(f"'{key}'"))
+    return func.json_extract(column, literal_column(f"'$.{key}'"))
+
+def component_condition(component: str, condition: str, dialect_name: str):
+    """Predicate for one checksheet component having the given condition"""
+    column = getattr(BogieChecksheet, BOGIE_COMPONENT_COLUMNS[component])
+    if dialect_name == "postgresql":
+        # Containment is served by the GIN index
+        return column.op("@>")(bindparam(None, {component: condition}, type_=JSONB))
+    return json_text(column, component, dialect_name) == condition
+
+def parse_component_conditions(condition: List[str]) -> list:
+    """component:value query strings as (component, value) pairs; 400 on unknown components"""
+    conditions = []
+    for item in condition:
+        component, sep, value = item.partition(":")
+        if not sep or component not in BOGIE_COMPONENT_COLUMNS:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Form number {bogie_data.formNumber} already exists"
+                detail=f"Invalid condition '{item}'; expected component:value with component one of {sorted(BOGIE_COMPONENT_COLUMNS)}"
             )
+        conditions.append((component, value))
+    return conditions
+
+def bogie_checksheet_conditions(
+    formNumber=None, inspectionBy=None, fromDate=None, toDate=None, cursor=None
+) -> list:
+    """
+    GET filters on plain columns as (column, operator, value) conditions
+
+    The same list is applied to the hot table in SQL and to the Parquet archive;
+    bogieNo and component conditions live inside JSON columns (see bogie_json_filter).
+    """
+    conditions = []
+    if formNumber:
+        conditions.append(("form_number", operator.eq, formNumber))
+    if inspectionBy:
+        conditions.append(("inspection_by", operator.eq, inspectionBy))
+    if fromDate:
+        conditions.append(("inspection_date", operator.ge, fromDate.isoformat()))
+    if toDate:
+        conditions.append(("inspection_date", operator.le, toDate.isoformat()))
+    if cursor is not None:
+        conditions.append(("id", operator.gt, cursor))
+    return conditions
+
+def bogie_checksheet_query(dialect_name: str, conditions: list, bogieNo=None, components=()):
+    """SELECT of BOGIE_COLUMNS matching the GET filters, in id order"""
+    query = select(*BOGIE_COLUMNS)
+    for column, op, value in conditions:
+        query = query.where(op(getattr(BogieChecksheet, column), value))
+    if bogieNo:
+        query = query.where(json_text(BogieChecksheet.bogie_details, "bogieNo", dialect_name) == bogieNo)
+    for component, value in components:
+        query = query.where(component_condition(component, value, dialect_name))
+    return query.order_by(BogieChecksheet.id)
+
+def bogie_json_filter(bogieNo=None, components=()):
+    """Row predicate for the JSON filters on archived BOGIE_COLUMNS rows, or None"""
+    if not bogieNo and not components:
+        return None
+    details = BOGIE_COLUMN_NAMES.index("bogie_details")
+    checks = [(BOGIE_COLUMN_NAMES.index(BOGIE_COMPONENT_COLUMNS[component]), component, value)
+              for component, value in components]
+    
+    def matches(row) -> bool:
+        if bogieNo and (row[details] or {}).get("bogieNo") != bogieNo:
+            return False
+        return all((row[index] or {}).get(component) == value for index, component, value in checks)
+    return matches
+
+@app.get("/api/forms/bogie-checksheet", response_model=BogieChecksheetListResponse)
+async def get_bogie_checksheets(
+    formNumber: Optional[str] = Query(None, description="Filter by form number"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by inspector"),
+    bogieNo: Optional[str] = Query(None, description="Filter by bogie number"),
+    fromDate: Optional[date] = Query(None, description="Inspected on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Inspected on or before this date (YYYY-MM-DD)"),
+    condition: List[str] = Query([], description="Component condition as component:value, e.g. bolster:Cracked (repeatable)"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+    cursor: Optional[int] = Query(None, ge=0, description="Return rows after this cursor (nextCursor of the previous page)")
+):
+    """
+    Retrieve bogie checksheets with optional filtering
+
+    Query parameters:
+    - formNumber / inspectionBy / bogieNo: Exact match filters
+    - fromDate / toDate: Inclusive inspection date range
+    - condition: component:value pairs matched inside the checksheets,
+      e.g. condition=bolster:Cracked&condition=axleGuide:Worn
+    - limit / cursor: Keyset pagination on id; pass nextCursor back as cursor
+    """
+    components = parse_component_conditions(condition)
+    
+    try:
+        conditions = bogie_checksheet_conditions(
+            formNumber=formNumber,
+            inspectionBy=inspectionBy,
+            fromDate=fromDate,
+            toDate=toDate,
+            cursor=cursor
+        )
+        async with open_read_session() as db:
+            query = bogie_checksheet_query(db.bind.dialect.name, conditions, bogieNo, components)
+            # Fetch one extra row to know whether another page exists
+            checksheets = (await db.execute(query.limit(limit + 1))).all()
+        
+        # Date ranges that reach archived months also read the Parquet archive
+        if archive.covers("bogie_checksheets", fromDate, toDate):
+            archived = await run_in_threadpool(
+                archive.read_archived,
+                "bogie_checksheets", BOGIE_COLUMN_NAMES, conditions, fromDate, toDate,
+                limit + 1, bogie_json_filter(bogieNo, components)
+            )
+            checksheets = list(heapq.merge(archived, checksheets, key=itemgetter(0)))
+        
+        next_cursor = None
+        if len(checksheets) > limit:
+            checksheets = checksheets[:limit]
+            next_cursor = checksheets[-1][0]
+        record_rows(len(checksheets))
         
-        # Create new bogie checksheet
-        db_bogie = BogieChecksheet(
-            form_number=bogie_data.formNumber,
-            inspection_by=bogie_data.inspectionBy,
-            inspection_date=bogie_data.inspectionDate,
-            bogie_details=json.dumps(bogie_data.bogieDetails.dict()),
-            bogie_checksheet=json.dumps(bogie_data.bogieChecksheet.dict()),
-            bmbc_checksheet=json.dumps(bogie_data.bmbcChecksheet.dict()),
-            status="Saved",
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+        with timed_serialization():
+            body = dump_bogie_list(
+                checksheets,
+                message="Filtered bogie checksheet forms fetched successfully.",
+                next_cursor=next_cursor
+            )
+        return Response(content=body, media_type="application/json")
+        
+    except Exception as e:
+        logger.exception("Error fetching bogie checksheets")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve bogie checksheets: {str(e)}"
+        )
+
+# Declarative form types (form_engine.py): generated POST and GET routes
+
+def add_form_routes(form: CompiledForm):
+    """POST and GET /api/forms/<path> for a compiled form type, like the bogie checksheet routes"""
+    model = form.model
+    inspector_column = getattr(model, form.inspector_column)
+    date_column = getattr(model, form.date_column)
+    submitted = f"{form.title} submitted successfully."
+    fetched = f"Filtered {form.title.lower()} forms fetched successfully."
+
+    async def create_form(
+        form_data: form.schema,
+        request: Request,
+        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+        db: Optional[AsyncSession] = Depends(get_write_db)
+    ):
+        if ingest_queue is not None:
+            return await queue_submission(
+                form.name, form_data.formNumber, form_data.model_dump_json().encode(), idempotency_key,
+                f"{form.title} accepted for processing.",
+                {
+                    "formNumber": form_data.formNumber,
+                    form.inspector_field: getattr(form_data, form.inspector_field),
+                    form.date_field: getattr(form_data, form.date_field).isoformat()
+                }
+            )
+        try:
+            return await insert_form(
+                db, request, idempotency_key, form_data, form.name, model,
+                form.to_row(form_data),
+                (inspector_column, date_column, model.status),
+                lambda created: {
+                    "success": True,
+                    "message": submitted,
+                    "data": {
+                        "formNumber": created[0],
+                        form.inspector_field: created[1],
+                        form.date_field: created[2].isoformat(),
+                        "status": created[3]
+                    }
+                }
+            )
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.exception(f"Error creating {form.name}")
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to create {form.title.lower()}: {str(e)}"
+            )
+
+    async def list_forms(
+        formNumber: Optional[str] = Query(None, description="Filter by form number"),
+        inspector: Optional[str] = Query(None, alias=form.inspector_field, description="Filter by inspector"),
+        fromDate: Optional[date] = Query(None, description=f"{form.date_field} on or after this date (YYYY-MM-DD)"),
+        toDate: Optional[date] = Query(None, description=f"{form.date_field} on or before this date (YYYY-MM-DD)"),
+        limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Page size"),
+        cursor: Optional[int] = Query(None, ge=0, description="Return rows after this cursor (nextCursor of the previous page)")
+    ):
+        query = select(*form.columns)
+        if formNumber:
+            query = query.where(model.form_number == formNumber)
+        if inspector:
+            query = query.where(inspector_column == inspector)
+        if fromDate:
+            query = query.where(date_column >= fromDate)
+        if toDate:
+            query = query.where(date_column <= toDate)
+        if cursor is not None:
+            query = query.where(model.id > cursor)
+
+        try:
+            async with open_read_session() as db:
+                # Fetch one extra row to know whether another page exists
+                rows = (await db.execute(query.order_by(model.id).limit(limit + 1))).all()
+
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = rows[-1][0]
+            record_rows(len(rows))
+
+            with timed_serialization():
+                body = orjson.dumps({
+                    "success": True,
+                    "message": fetched,
+                    "data": [form.row_to_dict(row) for row in rows],
+                    "nextCursor": next_cursor
+                })
+            return Response(content=body, media_type="application/json")
+
+        except Exception as e:
+            logger.exception(f"Error fetching {form.name}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Failed to retrieve {form.title.lower()} forms: {str(e)}"
+            )
+
+    app.post(
+        f"/api/forms/{form.path}", status_code=status.HTTP_201_CREATED,
+        summary=f"Submit {form.title.lower()}", name=f"create_{form.name}",
+        description=f"Submit a {form.title.lower()} form. Send an Idempotency-Key header to have retries answered with the stored result."
+    )(create_form)
+    app.get(
+        f"/api/forms/{form.path}",
+        summary=f"Retrieve {form.title.lower()} forms", name=f"get_{form.name}",
+        description=f"Filter by formNumber, {form.inspector_field} and a fromDate / toDate range; keyset pagination with limit / cursor."
+    )(list_forms)
+
+for _form in FORMS.values():
+    add_form_routes(_form)
+
+# Fleet summary from the rollup tables
+
+FORM_TYPE_PATTERN = f"^({'|'.join(['wheel_specifications', 'bogie_checksheets', *FORMS])})$"
+
+@app.get("/api/forms/summary")
+async def get_fleet_summary(
+    fromDate: Optional[date] = Query(None, description="Forms dated on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Forms dated on or before this date (YYYY-MM-DD)"),
+    inspector: Optional[str] = Query(None, description="Only forms by this inspector (submittedBy / inspectionBy)"),
+    formType: Optional[str] = Query(None, pattern=FORM_TYPE_PATTERN, description="Only this form type")
+):
+    """
+    Fleet summary for supervisor dashboards
+
+    - formsPerInspectorPerDay: form count per form type, inspector and day
+    - statusBreakdown: form count per form type and status
+    - treadDiameter: min/avg/max nominal new tread diameter per inspector and day
+
+    Read from rollup tables that every insert keeps current, so the cost
+    grows with the number of groups, not the number of forms.
+    """
+    try:
+        counts = select(
+            FormDailyCount.form_type,
+            FormDailyCount.inspector,
+            FormDailyCount.day,
+            FormDailyCount.status,
+            FormDailyCount.form_count
         )
+        treads = select(WheelTreadDaily)
+        if fromDate:
+            counts = counts.where(FormDailyCount.day >= fromDate)
+            treads = treads.where(WheelTreadDaily.day >= fromDate)
+        if toDate:
+            counts = counts.where(FormDailyCount.day <= toDate)
+            treads = treads.where(WheelTreadDaily.day <= toDate)
+        if inspector:
+            counts = counts.where(FormDailyCount.inspector == inspector)
+            treads = treads.where(WheelTreadDaily.inspector == inspector)
+        if formType:
+            counts = counts.where(FormDailyCount.form_type == formType)
         
-        db.add(db_bogie)
-        db.commit()
-        db.refresh(db_bogie)
+        async with open_read_session() as db:
+            count_rows = (await db.execute(counts.order_by(FormDailyCount.day, FormDailyCount.inspector))).all()
+            tread_rows = [] if formType not in (None, "wheel_specifications") else (
+                await db.scalars(treads.order_by(WheelTreadDaily.day, WheelTreadDaily.inspector))
+            ).all()
         
-        print(f" Bogie checksheet created successfully: {db_bogie.form_number}")
+        per_day = {}
+        per_status = {}
+        for form_type, inspector_name, day, form_status, form_count in count_rows:
+            per_day[(form_type, inspector_name, day)] = per_day.get((form_type, inspector_name, day), 0) + form_count
+            per_status[(form_type, form_status)] = per_status.get((form_type, form_status), 0) + form_count
+        record_rows(len(count_rows) + len(tread_rows))
         
         return {
             "success": True,
-            "message": "Bogie checksheet submitted successfully.",
+            "message": "Fleet summary fetched successfully.",
             "data": {
-                "formNumber": db_bogie.form_number,
-                "inspectionBy": db_bogie.inspection_by,
-                "inspectionDate": db_bogie.inspection_date,
-                "status": db_bogie.status
+                "formsPerInspectorPerDay": [
+                    {"formType": form_type, "inspector": inspector_name, "date": day.isoformat(), "count": count}
+                    for (form_type, inspector_name, day), count in per_day.items()
+                ],
+                "statusBreakdown": [
+                    {"formType": form_type, "status": form_status, "count": count}
+                    for (form_type, form_status), count in sorted(per_status.items())
+                ],
+                "treadDiameter": [
+                    {
+                        "inspector": tread.inspector,
+                        "date": tread.day.isoformat(),
+                        "count": tread.measured_count,
+                        "min": tread.tread_diameter_min,
+                        "avg": round(tread.tread_diameter_sum / tread.measured_count, 3),
+                        "max": tread.tread_diameter_max
+                    }
+                    for tread in tread_rows
+                ]
             }
         }
         
-    except HTTPException:
-        raise
     except Exception as e:
-        print(f" Error creating bogie checksheet: {str(e)}")
-        db.rollback()
+        logger.exception("Error fetching fleet summary")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to create bogie checksheet: {str(e)}"
+            detail=f"Failed to retrieve fleet summary: {str(e)}"
+        )
+
+# Search across forms and inspectors
+
+MAX_SEARCH_PAGE_SIZE = 100
+
+@app.get("/api/search")
+async def search_forms(
+    q: str = Query(..., min_length=MIN_QUERY_LENGTH, max_length=100, description="Part of a form number, bogie number or inspector name"),
+    type: Optional[List[str]] = Query(None, description=f"Only these result types: {', '.join(SEARCH_SOURCES)}"),
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE, description="Page size"),
+    offset: int = Query(0, ge=0, le=SEARCH_CANDIDATES, description="Skip this many results (nextOffset of the previous page)")
+):
+    """
+    Ranked substring and fuzzy search
+
+    Matches form numbers and submitters of wheel specifications, form
+    numbers, bogie numbers and inspectors of bogie checksheets, and the
+    full names of active users. Exact matches rank first, then prefixes,
+    then substrings, then near misses (typos). Served by trigram indexes
+    (pg_trgm on PostgreSQL, FTS5 on SQLite).
+    """
+    sources = type or list(SEARCH_SOURCES)
+    unknown = sorted(set(sources) - set(SEARCH_SOURCES))
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid type {unknown}; expected one of {list(SEARCH_SOURCES)}"
+        )
+    # min_length counts surrounding spaces, which are not searched
+    q = q.strip()
+    if len(q) < MIN_QUERY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"q must have at least {MIN_QUERY_LENGTH} characters besides surrounding spaces"
+        )
+    try:
+        async with open_read_session() as db:
+            results, next_offset = await search(db, q, sources, limit, offset)
+        record_rows(len(results))
+        return {
+            "success": True,
+            "message": "Search results fetched successfully.",
+            "data": results,
+            "nextOffset": next_offset
+        }
+    except Exception as e:
+        logger.exception("Error searching forms")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to search forms: {str(e)}"
+        )
+
+# Change feed: new submissions since a sequence number
+
+CHANGE_STREAM_HEARTBEAT_SECONDS = float(os.getenv("CHANGE_STREAM_HEARTBEAT_SECONDS", "15"))
+
+@app.get("/api/forms/changes")
+async def get_form_changes(
+    since: int = Query(0, ge=0, description="Return changes after this sequence number (nextSince of the previous call)"),
+    formType: Optional[str] = Query(None, pattern=FORM_TYPE_PATTERN, description="Only this form type"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Page size")
+):
+    """
+    Incremental fetch of new form submissions
+
+    Returns wheel specifications and bogie checksheets submitted after
+    `since`, oldest first, each with its sequence number. Pass nextSince
+    back as since to poll for only what is new.
+    """
+    try:
+        async with open_read_session() as db:
+            changes, next_since = await fetch_changes(db, since, limit, formType)
+        record_rows(len(changes))
+        with timed_serialization():
+            body = orjson.dumps({
+                "success": True,
+                "message": "Form changes fetched successfully.",
+                "data": changes,
+                "nextSince": next_since
+            })
+        return Response(content=body, media_type="application/json")
+    except Exception as e:
+        logger.exception("Error fetching form changes")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve form changes: {str(e)}"
+        )
+
+def change_event(change: dict) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (
+        change["seq"], change["formType"].encode(), orjson.dumps(change)
+    )
+
+async def stream_changes(since: Optional[int], form_type: Optional[str]):
+    """Server-sent events: the backlog after `since`, then changes as this worker's feed broadcasts them"""
+    subscription = change_feed.subscribe()
+    try:
+        yield b"retry: 3000\n\n"
+        # Catch up from the primary, so nothing committed before subscribing is missed.
+        # Sessions are released before yielding so a slow client never holds a connection.
+        cursor = since
+        while True:
+            async with open_async_session() as db:
+                if cursor is None:
+                    cursor = await current_seq(db)
+                changes, cursor = await fetch_changes(db, cursor, CHANGE_FEED_BATCH_SIZE, form_type)
+            if changes:
+                yield b"".join(change_event(change) for change in changes)
+            if len(changes) < CHANGE_FEED_BATCH_SIZE:
+                break
+        change_feed.caught_up(cursor)
+        
+        while True:
+            try:
+                changes = await asyncio.wait_for(subscription.get(), CHANGE_STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+                continue
+            if changes is None:
+                # Fell too far behind; the client reconnects with Last-Event-ID
+                return
+            events = []
+            for change in changes:
+                if change["seq"] > cursor and (form_type is None or change["formType"] == form_type):
+                    events.append(change_event(change))
+                    cursor = change["seq"]
+            if events:
+                yield b"".join(events)
+    finally:
+        change_feed.unsubscribe(subscription)
+
+@app.get("/api/forms/changes/stream")
+async def stream_form_changes(
+    since: Optional[int] = Query(None, ge=0, description="Start after this sequence number (default: only new submissions)"),
+    formType: Optional[str] = Query(None, pattern=FORM_TYPE_PATTERN, description="Only this form type"),
+    last_event_id: Optional[int] = Header(None, alias="Last-Event-ID")
+):
+    """
+    Server-sent events for new form submissions
+
+    Each event has the sequence number as id, the form type as event name
+    and the change (seq, formType, data) as JSON. Browsers reconnect with
+    Last-Event-ID and resume where they left off. A comment line is sent
+    every CHANGE_STREAM_HEARTBEAT_SECONDS to keep proxies from timing out.
+    """
+    return StreamingResponse(
+        stream_changes(last_event_id if last_event_id is not None else since, formType),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Streaming exports
+
+EXPORT_FORMAT_PATTERN = "^(csv|ndjson|parquet)$"
+EXPORT_COMPRESSION_PATTERN = "^(none|gzip|zstd)$"
+
+def export_response(table_name: str, batches, format: str, compression: str) -> StreamingResponse:
+    return StreamingResponse(
+        stream_export(export_encoder(table_name, format, compression), batches),
+        media_type=export_media_type(format, compression),
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(table_name, format, compression)}"'}
+    )
+
+@app.get("/api/forms/wheel-specifications/export")
+async def export_wheel_specifications(
+    formNumber: Optional[str] = Query(None, description="Filter by form number"),
+    submittedBy: Optional[str] = Query(None, description="Filter by submitted by user"),
+    submittedDate: Optional[date] = Query(None, description="Filter by submitted date (YYYY-MM-DD)"),
+    fromDate: Optional[date] = Query(None, description="Submitted on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Submitted on or before this date (YYYY-MM-DD)"),
+    treadDiameterBelow: Optional[float] = Query(None, description="Nominal new tread diameter below this value (mm)"),
+    nearCondemning: Optional[float] = Query(None, ge=0, description="Last shop issue size within this many mm of the condemning diameter"),
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN, description="csv, ndjson or parquet"),
+    compression: str = Query("none", pattern=EXPORT_COMPRESSION_PATTERN, description="none, gzip or zstd (the codec for parquet)")
+):
+    """
+    Export wheel specifications as a file download
+
+    Takes the same filters as GET /api/forms/wheel-specifications (including
+    archived months) and streams every matching row from a server-side cursor
+    in fixed-size batches, so memory use does not grow with the export.
+    """
+    conditions = wheel_spec_conditions(
+        formNumber=formNumber,
+        submittedBy=submittedBy,
+        submittedDate=submittedDate,
+        fromDate=fromDate,
+        toDate=toDate,
+        treadDiameterBelow=treadDiameterBelow,
+        nearCondemning=nearCondemning
+    )
+    archive_from = submittedDate or fromDate
+    archive_to = submittedDate or toDate
+    archived_batches = None
+    if archive.covers("wheel_specifications", archive_from, archive_to):
+        archived_batches = archive.iter_archived_batches(
+            "wheel_specifications", WHEEL_SPEC_COLUMN_NAMES, conditions, archive_from, archive_to
+        )
+    batches = iter_row_batches(wheel_spec_query(conditions), EXPORT_BATCH_SIZE, archived_batches)
+    return export_response("wheel_specifications", batches, format, compression)
+
+@app.get("/api/forms/bogie-checksheet/export")
+async def export_bogie_checksheets(
+    formNumber: Optional[str] = Query(None, description="Filter by form number"),
+    inspectionBy: Optional[str] = Query(None, description="Filter by inspector"),
+    bogieNo: Optional[str] = Query(None, description="Filter by bogie number"),
+    fromDate: Optional[date] = Query(None, description="Inspected on or after this date (YYYY-MM-DD)"),
+    toDate: Optional[date] = Query(None, description="Inspected on or before this date (YYYY-MM-DD)"),
+    condition: List[str] = Query([], description="Component condition as component:value, e.g. bolster:Cracked (repeatable)"),
+    format: str = Query("csv", pattern=EXPORT_FORMAT_PATTERN, description="csv, ndjson or parquet"),
+    compression: str = Query("none", pattern=EXPORT_COMPRESSION_PATTERN, description="none, gzip or zstd (the codec for parquet)")
+):
+    """
+    Export bogie checksheets as a file download
+
+    Takes the same filters as GET /api/forms/bogie-checksheet (including
+    archived months). In CSV and Parquet the checksheet components become
+    dotted columns (bogieChecksheet.bolster), the layout the import endpoint
+    reads back.
+    """
+    components = parse_component_conditions(condition)
+    conditions = bogie_checksheet_conditions(
+        formNumber=formNumber,
+        inspectionBy=inspectionBy,
+        fromDate=fromDate,
+        toDate=toDate
+    )
+    query = bogie_checksheet_query(get_async_engine().dialect.name, conditions, bogieNo, components)
+    archived_batches = None
+    if archive.covers("bogie_checksheets", fromDate, toDate):
+        archived_batches = archive.iter_archived_batches(
+            "bogie_checksheets", BOGIE_COLUMN_NAMES, conditions, fromDate, toDate,
+            bogie_json_filter(bogieNo, components)
+        )
+    batches = iter_row_batches(query, EXPORT_BATCH_SIZE, archived_batches)
+    return export_response("bogie_checksheets", batches, format, compression)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """
+    Request, database and serialization metrics for this worker in Prometheus text format
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+# Internal: connection pool health for sizing workers against the database
+@app.get("/internal/pool", include_in_schema=False)
+async def get_pool_stats():
+    """
+    Live connection pool statistics for this worker
+    """
+    return {
+        "pool": pool_status(get_async_engine().pool),
+        "wait_seconds": pool_wait_seconds.snapshot()
+    }
+
+# Internal: cache hit/miss counters
+@app.get("/internal/cache", include_in_schema=False)
+async def get_cache_stats():
+    """
+    In-process cache statistics for this worker
+    """
+    return {
+        "users": user_cache.stats(),
+        "responses": await response_cache.stats()
+    }
+
+# Internal: password hashing pool load
+@app.get("/internal/password-hashing", include_in_schema=False)
+async def get_password_hashing_stats():
+    """
+    Password hashing pool queue and latency statistics for this worker
+    """
+    return password_hash_pool.stats()
+
+# Internal: write-behind ingestion backlog
+@app.get("/internal/ingest", include_in_schema=False)
+async def get_ingest_stats():
+    """
+    Queued ingestion backlog shared by the workers on this host
+    """
+    if ingest_queue is None:
+        return {"mode": INGEST_MODE}
+    return {"mode": INGEST_MODE, **await run_in_threadpool(ingest_queue.stats)}
+
+# Internal: read replica health and lag
+@app.get("/internal/replicas", include_in_schema=False)
+async def get_replica_stats():
+    """
+    Read replicas as seen by this worker's health checks
+    """
+    return replica_set.stats()
+
+# Internal: change stream subscribers
+@app.get("/internal/changes", include_in_schema=False)
+async def get_change_feed_stats():
+    """
+    Change feed broadcaster state for this worker
+    """
+    return change_feed.stats()
+
+# Health probes for load balancers and orchestrators
+
+READINESS_TIMEOUT_SECONDS = float(os.getenv("READINESS_TIMEOUT_SECONDS", "2"))
+
+async def ping_database():
+    async with open_async_session() as db:
+        await db.execute(select(1))
+
+@app.get("/health/live", include_in_schema=False)
+async def liveness():
+    """
+    The worker process is up
+    """
+    return {"status": "ok"}
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    """
+    The worker can serve database requests
+
+    Checks out a pooled connection and runs SELECT 1 within
+    READINESS_TIMEOUT_SECONDS. An unreachable database or an exhausted pool
+    answers 503 so the load balancer routes around this worker.
+    """
+    try:
+        await asyncio.wait_for(ping_database(), READINESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"Readiness check failed: {e!r}")
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "unavailable",
+                "detail": str(e) or type(e).__name__,
+                "pool": pool_status(get_async_engine().pool)
+            }
         )
+    return {"status": "ready", "pool": pool_status(get_async_engine().pool)}
 
 # Authentication endpoints (for testing)
 @app.post("/api/v1/auth/login")
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """
     Authenticate user with phone number and password
     """
-    user = authenticate_user(db, user_credentials.phone_number, user_credentials.password)
+    user = await authenticate_user(db, user_credentials.phone_number, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -295,6 +1418,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     }
 
 if __name__ == "__main__":
+    # Single-process development server; use serve.py in production
     print(" Starting KPA Form Data API...")
     print("API will be available at:")
     print("   - http://localhost:8000")
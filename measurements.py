@@ -0,0 +1,77 @@
+"""
+Parsing of free-text wheel measurements into numeric columns
+
+Form values follow a few shapes used on the KPA sheets:
+    "915 (900-1000)"        nominal with a permitted range
+    "1600 (+2,-1)"          nominal with plus/minus tolerance
+    "280 (+0.0/-0.035)"     nominal with plus/minus tolerance
+    "130.043 TO 130.068"    range without a nominal
+    "29.4 Flange Thickness" nominal followed by a label
+The original text is always kept; the parsed numbers back range queries.
+"""
+import re
+from typing import NamedTuple, Optional
+
+NUMBER = r"[-+]?\d+(?:\.\d+)?"
+
+_RANGE_IN_PARENS = re.compile(rf"^\s*({NUMBER})\s*\(\s*({NUMBER})\s*-\s*({NUMBER})\s*\)")
+_TOLERANCE = re.compile(rf"^\s*({NUMBER})\s*\(\s*([-+]\d+(?:\.\d+)?)\s*[,/]\s*([-+]\d+(?:\.\d+)?)\s*\)")
+_RANGE_TO = re.compile(rf"^\s*({NUMBER})\s*(?:TO|-)\s*({NUMBER})\s*$", re.IGNORECASE)
+_LEADING_NUMBER = re.compile(rf"^\s*({NUMBER})")
+
+# WheelSpecification columns that get <column>_nominal/_min/_max companions
+MEASURED_COLUMNS = (
+    "tread_diameter_new",
+    "last_shop_issue_size",
+    "condemning_dia",
+    "wheel_gauge",
+)
+
+class Measurement(NamedTuple):
+    nominal: Optional[float]
+    min: Optional[float]
+    max: Optional[float]
+
+EMPTY = Measurement(None, None, None)
+
+def parse_measurement(text: Optional[str]) -> Measurement:
+    """Parse a form value into nominal/min/max (tolerances are folded into min/max)"""
+    if not text:
+        return EMPTY
+    match = _RANGE_IN_PARENS.match(text)
+    if match:
+        nominal, low, high = map(float, match.groups())
+        return Measurement(nominal, min(low, high), max(low, high))
+    match = _TOLERANCE.match(text)
+    if match:
+        nominal, first, second = map(float, match.groups())
+        bounds = (nominal + first, nominal + second)
+        return Measurement(nominal, round(min(bounds), 6), round(max(bounds), 6))
+    match = _RANGE_TO.match(text)
+    if match:
+        low, high = map(float, match.groups())
+        return Measurement(None, min(low, high), max(low, high))
+    match = _LEADING_NUMBER.match(text)
+    if match:
+        value = float(match.group(1))
+        return Measurement(value, value, value)
+    return EMPTY
+
+def measurement_columns(row: dict) -> dict:
+    """Numeric companion columns for a WheelSpecification row dict"""
+    columns = {}
+    for column in MEASURED_COLUMNS:
+        parsed = parse_measurement(row.get(column))
+        columns[f"{column}_nominal"] = parsed.nominal
+        columns[f"{column}_min"] = parsed.min
+        columns[f"{column}_max"] = parsed.max
+    columns["condemning_margin"] = condemning_margin(
+        columns["last_shop_issue_size_nominal"], columns["condemning_dia_nominal"]
+    )
+    return columns
+
+def condemning_margin(last_shop_issue: Optional[float], condemning: Optional[float]) -> Optional[float]:
+    """Millimetres of tread left between the last shop issue size and the condemning diameter"""
+    if last_shop_issue is None or condemning is None:
+        return None
+    return round(last_shop_issue - condemning, 6)
@@ -0,0 +1,151 @@
+"""
+In-process metrics for the KPA Form API
+
+Counters and histograms are kept in memory per worker and read by the
+internal endpoints in main.py. render_prometheus() exposes every registered
+metric in the Prometheus text format.
+"""
+import threading
+from typing import Dict, Sequence, Tuple
+
+# Bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+            else:
+                self._counts[-1] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, self._counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self._count
+            return {"count": self._count, "sum": round(self._sum, 6), "buckets": buckets}
+
+class LabeledHistogram:
+    """A family of histograms keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str], buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = buckets
+        self._children: Dict[Tuple[str, ...], Histogram] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value: float, *label_values: str):
+        child = self._children.get(label_values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(label_values, Histogram(self.buckets))
+        child.observe(value)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_values, child in sorted(self._children.items()):
+            labels = _format_labels(self.labels, label_values)
+            snapshot = child.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                bucket_labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {count}")
+            lines.append(f"{self.name}_sum{labels} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{labels} {snapshot['count']}")
+        return lines
+
+class LabeledCounter:
+    """A family of monotonically increasing counters keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, *label_values: str):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {round(value, 6)}")
+        return lines
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+REGISTRY: list = []
+
+def render_prometheus() -> str:
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_unlabeled("kpa_db_pool_wait_seconds", "Time waiting for a pooled connection", pool_wait_seconds))
+    return "\n".join(lines) + "\n"
+
+def _render_unlabeled(name: str, help_text: str, histogram: Histogram) -> list:
+    snapshot = histogram.snapshot()
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for bound, count in snapshot["buckets"].items():
+        lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+    lines.append(f"{name}_sum {snapshot['sum']}")
+    lines.append(f"{name}_count {snapshot['count']}")
+    return lines
+
+# Time spent waiting for a pooled connection in get_async_db
+pool_wait_seconds = Histogram()
+
+# Per-request instrumentation (see instrumentation.py)
+http_requests_total = LabeledCounter(
+    "kpa_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_request_seconds = LabeledHistogram(
+    "kpa_http_request_duration_seconds", "Total handler time per request", ("method", "route")
+)
+db_seconds = LabeledHistogram(
+    "kpa_db_time_seconds", "Database time per request", ("method", "route")
+)
+db_queries_total = LabeledCounter(
+    "kpa_db_queries_total", "Database queries executed", ("method", "route")
+)
+rows_returned_total = LabeledCounter(
+    "kpa_rows_returned_total", "Rows returned in responses", ("method", "route")
+)
+serialize_seconds = LabeledHistogram(
+    "kpa_serialize_seconds", "Response serialization time per request", ("method", "route")
+)
+slow_queries_total = LabeledCounter(
+    "kpa_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ("route",)
+)
+db_reads_total = LabeledCounter(
+    "kpa_db_reads_total", "Read sessions by target (replica or primary)", ("target",)
+)
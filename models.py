@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, Date, DateTime, Float, Text, ForeignKey, Boolean, JSON, Index, DDL, event, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,6 +18,11 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        # Fuzzy name search (see search.py)
+        Index("idx_users_full_name_trgm", "full_name", postgresql_using="gist", postgresql_ops={"full_name": "gist_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
 
 class WheelSpecification(Base):
     __tablename__ = "wheel_specifications"
@@ -24,7 +30,7 @@ class WheelSpecification(Base):
     id = Column(Integer, primary_key=True, index=True)
     form_number = Column(String(50), unique=True, index=True, nullable=False)
     submitted_by = Column(String(50), nullable=False)  # user_id reference
-    submitted_date = Column(String(20), nullable=False)  # Date as string to match API
+    submitted_date = Column(Date, nullable=False)  # "YYYY-MM-DD" string in the API
     
     # Wheel specification fields
     tread_diameter_new = Column(String(50))
@@ -43,9 +49,39 @@ class WheelSpecification(Base):
     axle_box_housing_bore_dia = Column(String(50))
     wheel_disc_width = Column(String(50))
     
+    # Numeric values parsed from the text fields above (see measurements.py)
+    tread_diameter_new_nominal = Column(Float, index=True)
+    tread_diameter_new_min = Column(Float)
+    tread_diameter_new_max = Column(Float)
+    last_shop_issue_size_nominal = Column(Float)
+    last_shop_issue_size_min = Column(Float)
+    last_shop_issue_size_max = Column(Float)
+    condemning_dia_nominal = Column(Float)
+    condemning_dia_min = Column(Float)
+    condemning_dia_max = Column(Float)
+    wheel_gauge_nominal = Column(Float)
+    wheel_gauge_min = Column(Float)
+    wheel_gauge_max = Column(Float)
+    condemning_margin = Column(Float, index=True)  # last shop issue size - condemning dia (mm)
+    
     status = Column(String(20), default="Saved")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_wheel_specs_submitted_by", "submitted_by"),
+        Index("idx_wheel_specs_submitted_date", "submitted_date"),
+        Index("idx_wheel_specs_submitted_by_date", "submitted_by", "submitted_date"),
+        # Substring and fuzzy search (see search.py)
+        Index(
+            "idx_wheel_specs_form_number_trgm", "form_number",
+            postgresql_using="gist", postgresql_ops={"form_number": "gist_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_wheel_specs_submitted_by_trgm", "submitted_by",
+            postgresql_using="gist", postgresql_ops={"submitted_by": "gist_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+    )
 
 class BogieChecksheet(Base):
     __tablename__ = "bogie_checksheets"
@@ -55,11 +91,195 @@ class BogieChecksheet(Base):
     inspection_by = Column(String(50), nullable=False)
     inspection_date = Column(String(20), nullable=False)
     
-    # Bogie details as JSON
-    bogie_details = Column(JSON)
-    bogie_checksheet = Column(JSON)
-    bmbc_checksheet = Column(JSON)
+    # Bogie details as JSON (JSONB on PostgreSQL)
+    bogie_details = Column(JSON().with_variant(JSONB, "postgresql"))
+    bogie_checksheet = Column(JSON().with_variant(JSONB, "postgresql"))
+    bmbc_checksheet = Column(JSON().with_variant(JSONB, "postgresql"))
     
     status = Column(String(20), default="Saved")
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_bogie_inspection_by", "inspection_by"),
+        Index("idx_bogie_inspection_date", "inspection_date"),
+        # Lookups by bogie number
+        Index("idx_bogie_bogie_no", text("(bogie_details ->> 'bogieNo')")).ddl_if(dialect="postgresql"),
+        Index("idx_bogie_bogie_no", text("json_extract(bogie_details, '$.bogieNo')")).ddl_if(dialect="sqlite"),
+        # Component-condition containment (@>) queries
+        Index(
+            "idx_bogie_checksheet_gin", "bogie_checksheet",
+            postgresql_using="gin", postgresql_ops={"bogie_checksheet": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_bogie_bmbc_checksheet_gin", "bmbc_checksheet",
+            postgresql_using="gin", postgresql_ops={"bmbc_checksheet": "jsonb_path_ops"}
+        ).ddl_if(dialect="postgresql"),
+        # Substring and fuzzy search (see search.py)
+        Index(
+            "idx_bogie_form_number_trgm", "form_number",
+            postgresql_using="gist", postgresql_ops={"form_number": "gist_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_bogie_inspection_by_trgm", "inspection_by",
+            postgresql_using="gist", postgresql_ops={"inspection_by": "gist_trgm_ops"}
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "idx_bogie_bogie_no_trgm", text("(bogie_details ->> 'bogieNo') gist_trgm_ops"),
+            postgresql_using="gist"
+        ).ddl_if(dialect="postgresql"),
+    )
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)
+    request_path = Column(String(255), primary_key=True)
+    request_hash = Column(String(64))  # sha256 of the validated request body
+    status_code = Column(Integer, nullable=False)
+    response_body = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Rollups kept up to date on every insert (see rollups.py), so summaries scan groups, not forms
+
+class FormDailyCount(Base):
+    __tablename__ = "form_daily_counts"
+    
+    form_type = Column(String(30), primary_key=True)  # wheel_specifications / bogie_checksheets
+    inspector = Column(String(50), primary_key=True)  # submitted_by / inspection_by
+    day = Column(Date, primary_key=True)
+    status = Column(String(20), primary_key=True)
+    form_count = Column(Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        Index("idx_form_daily_counts_day", "day"),
+    )
+
+class WheelTreadDaily(Base):
+    __tablename__ = "wheel_tread_daily"
+    
+    inspector = Column(String(50), primary_key=True)
+    day = Column(Date, primary_key=True)
+    measured_count = Column(Integer, nullable=False, default=0)  # forms with a parsed tread diameter
+    tread_diameter_sum = Column(Float, nullable=False, default=0)
+    tread_diameter_min = Column(Float)
+    tread_diameter_max = Column(Float)
+    
+    __table_args__ = (
+        Index("idx_wheel_tread_daily_day", "day"),
+    )
+
+# Change feed: one row per inserted form, in commit order (see changefeed.py)
+
+class FormChange(Base):
+    __tablename__ = "form_changes"
+    
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    form_type = Column(String(30), nullable=False)  # wheel_specifications / bogie_checksheets
+    form_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_form_changes_created_at", "created_at"),
+        # Never reuse a sequence number, even after pruning
+        {"sqlite_autoincrement": True},
+    )
+
+# Forms written by the ingest batcher (see ingest_queue.py), so a retried flush
+# can tell its own earlier commit from another submission's form
+
+class IngestReceipt(Base):
+    __tablename__ = "ingest_receipts"
+    
+    form_type = Column(String(30), primary_key=True)
+    form_number = Column(String(50), primary_key=True)
+    submission_hash = Column(String(64), nullable=False)  # sha256 of the queue entry (payload + enqueue time)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("idx_ingest_receipts_created_at", "created_at"),
+    )
+
+# Form numbers of rows moved to the Parquet archive (see archive.py). Inserts of
+# an archived form number are skipped by a trigger, so they report a conflict
+# exactly as if the row were still in the hot table.
+
+class ArchivedFormNumber(Base):
+    __tablename__ = "archived_form_numbers"
+    
+    form_type = Column(String(30), primary_key=True)  # wheel_specifications / bogie_checksheets
+    form_number = Column(String(50), primary_key=True)
+
+ARCHIVED_FORM_TABLES = ("wheel_specifications", "bogie_checksheets")
+
+event.listen(Base.metadata, "after_create", DDL("""
+CREATE OR REPLACE FUNCTION skip_archived_form_number() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM archived_form_numbers
+               WHERE form_type = TG_TABLE_NAME AND form_number = NEW.form_number) THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql
+""").execute_if(dialect="postgresql"))
+
+for _table in ARCHIVED_FORM_TABLES:
+    # Metadata-level after_create also runs against an existing schema
+    event.listen(Base.metadata, "after_create", DDL(
+        f"DROP TRIGGER IF EXISTS {_table}_skip_archived ON {_table}"
+    ).execute_if(dialect="postgresql"))
+    event.listen(Base.metadata, "after_create", DDL(
+        f"CREATE TRIGGER {_table}_skip_archived BEFORE INSERT ON {_table} "
+        f"FOR EACH ROW EXECUTE FUNCTION skip_archived_form_number()"
+    ).execute_if(dialect="postgresql"))
+    event.listen(Base.metadata, "after_create", DDL(
+        f"CREATE TRIGGER IF NOT EXISTS {_table}_skip_archived BEFORE INSERT ON {_table} "
+        f"WHEN EXISTS (SELECT 1 FROM archived_form_numbers "
+        f"WHERE form_type = '{_table}' AND form_number = new.form_number) "
+        f"BEGIN SELECT RAISE(IGNORE); END"
+    ).execute_if(dialect="sqlite"))
+
+# Search indexes (see search.py)
+
+# The trigram operator classes above come from pg_trgm
+event.listen(
+    Base.metadata, "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
+
+# SQLite: FTS5 trigram tables keyed by the source row id, kept in sync by triggers.
+# Table -> (FTS table, {FTS column: SQL expression over the row})
+SQLITE_SEARCH_TABLES = {
+    "wheel_specifications": ("wheel_spec_search", {
+        "form_number": "{row}.form_number",
+        "submitted_by": "{row}.submitted_by",
+    }),
+    "bogie_checksheets": ("bogie_search", {
+        "form_number": "{row}.form_number",
+        "bogie_no": "json_extract({row}.bogie_details, '$.bogieNo')",
+        "inspection_by": "{row}.inspection_by",
+    }),
+    "users": ("user_search", {
+        "full_name": "{row}.full_name",
+    }),
+}
+
+def sqlite_search_ddl(table: str) -> list:
+    """CREATE statements for one FTS5 search table and its sync triggers"""
+    fts_table, columns = SQLITE_SEARCH_TABLES[table]
+    names = ", ".join(columns)
+    values = ", ".join(expression.format(row="new") for expression in columns.values())
+    insert_row = f"INSERT INTO {fts_table} (rowid, {names}) VALUES (new.id, {values});"
+    delete_row = f"DELETE FROM {fts_table} WHERE rowid = old.id;"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5({names}, tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_insert AFTER INSERT ON {table} BEGIN {insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_update AFTER UPDATE ON {table} BEGIN {delete_row} {insert_row} END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts_table}_delete AFTER DELETE ON {table} BEGIN {delete_row} END",
+    ]
+
+for _table, (_fts_table, _) in SQLITE_SEARCH_TABLES.items():
+    for _statement in sqlite_search_ddl(_table):
+        event.listen(Base.metadata, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+    event.listen(Base.metadata, "before_drop", DDL(f"DROP TABLE IF EXISTS {_fts_table}").execute_if(dialect="sqlite"))
@@ -0,0 +1,238 @@
+"""
+Read-replica routing for read-only handlers
+
+Set READ_REPLICA_URLS to a comma-separated list of database URLs (sync or
+async drivers, like DATABASE_URL). Handlers that only read open their
+session with open_read_session() (or Depends(get_read_db)), which picks the
+next healthy replica round-robin and falls back to the primary when none is
+healthy or the chosen one cannot hand out a connection.
+
+Each worker checks its replicas every REPLICA_HEALTH_INTERVAL seconds. A
+PostgreSQL standby lagging more than REPLICA_MAX_LAG_SECONDS behind the
+primary is taken out of rotation until it catches up.
+
+Read-your-writes: a successful POST/PUT/PATCH/DELETE sets a short-lived
+cookie, and requests carrying it read from the primary for
+READ_YOUR_WRITES_SECONDS, so clients see their own submissions at once
+whichever worker serves them.
+
+Without READ_REPLICA_URLS every read goes to the primary as before.
+"""
+import asyncio
+import contextvars
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from http.cookies import SimpleCookie
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+
+from database import open_async_session, pool_options, pool_status, to_async_url, safe_url
+from metrics import pool_wait_seconds, db_reads_total
+from instrumentation import instrument_engine, logger
+
+READ_REPLICA_URLS = [url.strip() for url in os.getenv("READ_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", "5"))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", "2"))
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+READ_YOUR_WRITES_COOKIE = "kpa_read_primary_until"
+
+# Seconds since the last replayed transaction; 0 when the standby has
+# replayed everything it received (an idle primary is not lag)
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+class Replica:
+    """One read replica: its engine and last health check"""
+
+    def __init__(self, url: str):
+        self.url = to_async_url(url)
+        self.engine = None
+        self.session_factory = None
+        self.healthy = True  # until the first check says otherwise
+        self.lag_seconds: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    def connect(self):
+        """Create the engine; like the primary's, it connects on first use"""
+        if self.engine is None:
+            self.engine = create_async_engine(self.url, **pool_options(self.url))
+            instrument_engine(self.engine.sync_engine)
+            self.session_factory = async_sessionmaker(
+                bind=self.engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+            )
+
+    async def dispose(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+        self.engine = self.session_factory = None
+
+    def mark_down(self, error: BaseException):
+        if self.healthy:
+            logger.warning(f"Read replica {safe_url(self.url)} out of rotation: {error!r}")
+        self.healthy = False
+        self.last_error = str(error) or type(error).__name__
+
+    async def check(self):
+        """SELECT 1 (and the replay lag on PostgreSQL) within REPLICA_HEALTH_TIMEOUT"""
+        async def probe():
+            async with self.engine.connect() as conn:
+                if conn.dialect.name == "postgresql":
+                    return float(await conn.scalar(POSTGRES_LAG_QUERY))
+                await conn.execute(text("SELECT 1"))
+                return 0.0
+
+        self.checked_at = time.time()
+        try:
+            self.lag_seconds = await asyncio.wait_for(probe(), REPLICA_HEALTH_TIMEOUT)
+        except Exception as e:
+            self.mark_down(e)
+            return
+        if REPLICA_MAX_LAG_SECONDS and self.lag_seconds > REPLICA_MAX_LAG_SECONDS:
+            self.mark_down(RuntimeError(f"replication lag {self.lag_seconds:.1f}s"))
+            return
+        if not self.healthy:
+            logger.info(f"Read replica {safe_url(self.url)} back in rotation")
+        self.healthy = True
+        self.last_error = None
+
+    def stats(self) -> dict:
+        return {
+            "url": safe_url(self.url),
+            "healthy": self.healthy,
+            "lag_seconds": self.lag_seconds,
+            "last_error": self.last_error,
+            "checked_at": self.checked_at,
+            "pool": pool_status(self.engine.pool) if self.engine is not None else None,
+        }
+
+class ReplicaSet:
+    """Round-robin over the healthy replicas, with a background health check"""
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(url) for url in urls]
+        self._cycle = itertools.cycle(self.replicas)
+        self._task: Optional[asyncio.Task] = None
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def choose(self) -> Optional[Replica]:
+        """Next healthy replica, or None to read from the primary"""
+        for _ in range(len(self.replicas)):
+            replica = next(self._cycle)
+            if replica.healthy and replica.session_factory is not None:
+                return replica
+        return None
+
+    async def check_all(self):
+        await asyncio.gather(*(replica.check() for replica in self.replicas))
+
+    async def _run_checks(self):
+        while True:
+            await self.check_all()
+            await asyncio.sleep(REPLICA_HEALTH_INTERVAL)
+
+    def start(self):
+        """Create the engines and start health checks (FastAPI lifespan)"""
+        if not self.replicas:
+            return
+        for replica in self.replicas:
+            replica.connect()
+        self._task = asyncio.create_task(self._run_checks())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "read_your_writes_seconds": READ_YOUR_WRITES_SECONDS,
+        }
+
+replica_set = ReplicaSet(READ_REPLICA_URLS)
+
+# Set per request by ReadYourWritesMiddleware
+_read_primary: contextvars.ContextVar = contextvars.ContextVar("read_primary", default=False)
+
+def reads_pinned_to_primary() -> bool:
+    """Whether the current request must see the primary (it follows the client's own write)"""
+    return _read_primary.get()
+
+@asynccontextmanager
+async def open_read_session():
+    """Session for read-only work: a healthy replica, else the primary"""
+    replica = None if reads_pinned_to_primary() else replica_set.choose()
+    if replica is not None:
+        db = replica.session_factory()
+        try:
+            start = time.perf_counter()
+            await db.connection()
+            pool_wait_seconds.observe(time.perf_counter() - start)
+        except Exception as e:
+            await db.close()
+            replica.mark_down(e)
+            replica = None
+    if replica is None:
+        db_reads_total.inc(1, "primary")
+        async with open_async_session() as db:
+            yield db
+        return
+    db_reads_total.inc(1, "replica")
+    async with db:
+        yield db
+
+async def get_read_db():
+    async with open_read_session() as db:
+        yield db
+
+class ReadYourWritesMiddleware:
+    """Pure ASGI middleware: pin reads to the primary for a while after the client's own successful write"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_set:
+            await self.app(scope, receive, send)
+            return
+        try:
+            pinned_until = float(HTTPConnection(scope).cookies.get(READ_YOUR_WRITES_COOKIE, 0))
+        except ValueError:
+            pinned_until = 0
+        is_write = scope["method"] not in ("GET", "HEAD", "OPTIONS")
+
+        async def send_with_cookie(message):
+            if (is_write and message["type"] == "http.response.start"
+                    and message["status"] < 400 and READ_YOUR_WRITES_SECONDS > 0):
+                cookie = SimpleCookie()
+                cookie[READ_YOUR_WRITES_COOKIE] = f"{time.time() + READ_YOUR_WRITES_SECONDS:.3f}"
+                cookie[READ_YOUR_WRITES_COOKIE].update({
+                    "max-age": math.ceil(READ_YOUR_WRITES_SECONDS), "path": "/", "httponly": True, "samesite": "lax"
+                })
+                MutableHeaders(scope=message).append("set-cookie", cookie.output(header="").strip())
+            await send(message)
+
+        token = _read_primary.set(pinned_until > time.time())
+        try:
+            await self.app(scope, receive, send_with_cookie)
+        finally:
+            _read_primary.reset(token)
@@ -0,0 +1,179 @@
+"""
+Fleet summary rollups
+
+Two small tables hold pre-aggregated counts:
+    - form_daily_counts: forms per form type, inspector, day and status
+    - wheel_tread_daily: count/sum/min/max of the nominal new tread diameter
+      per inspector and day
+
+Every write path (single POST, bulk POST, import) upserts its inserted rows
+into them in the same transaction, grouped first so a batch costs one
+statement per table. GET /api/forms/summary therefore reads groups, not forms.
+Archived months stay counted, since archiving only moves the form rows.
+
+Rebuild from the forms (hot tables plus the Parquet archive) after manual
+data fixes or when adding the tables to an existing database:
+    python rollups.py --rebuild
+"""
+import argparse
+import os
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+import archive
+from database import dialect_insert, open_session
+from models import WheelSpecification, BogieChecksheet, FormDailyCount, WheelTreadDaily
+from form_engine import FORMS
+
+ROLLUP_BATCH_SIZE = int(os.getenv("ROLLUP_BATCH_SIZE", "10000"))
+
+# Form type -> (model, inspector column, date column)
+FORM_TYPES = {
+    "wheel_specifications": (WheelSpecification, "submitted_by", "submitted_date"),
+    "bogie_checksheets": (BogieChecksheet, "inspection_by", "inspection_date"),
+}
+FORM_TYPES.update({name: (form.model, form.inspector_column, form.date_column) for name, form in FORMS.items()})
+
+def _day(value) -> Optional[date]:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+def rollup_deltas(form_type: str, rows: Iterable[dict]) -> Tuple[List[dict], List[dict]]:
+    """Group inserted rows into form_daily_counts and wheel_tread_daily increments"""
+    _, inspector_column, date_column = FORM_TYPES[form_type]
+    counts = defaultdict(int)
+    treads = {}
+    for row in rows:
+        day = _day(row[date_column])
+        if day is None:
+            # Bogie checksheets stored before inspection dates were validated may not parse; they are not rolled up
+            continue
+        inspector = row[inspector_column]
+        counts[(inspector, day, row.get("status") or "Saved")] += 1
+        diameter = row.get("tread_diameter_new_nominal")
+        if diameter is not None:
+            count, total, low, high = treads.get((inspector, day), (0, 0.0, diameter, diameter))
+            treads[(inspector, day)] = (count + 1, total + diameter, min(low, diameter), max(high, diameter))
+
+    # Sorted so concurrent writers lock rollup rows in the same order
+    count_params = [
+        {"form_type": form_type, "inspector": inspector, "day": day, "status": status, "form_count": count}
+        for (inspector, day, status), count in sorted(counts.items())
+    ]
+    tread_params = [
+        {
+            "inspector": inspector,
+            "day": day,
+            "measured_count": count,
+            "tread_diameter_sum": total,
+            "tread_diameter_min": low,
+            "tread_diameter_max": high,
+        }
+        for (inspector, day), (count, total, low, high) in sorted(treads.items())
+    ]
+    return count_params, tread_params
+
+def rollup_statements(dialect_name: str, form_type: str, rows: Iterable[dict]) -> list:
+    """(upsert statement, parameter list) pairs adding the rows to the rollups"""
+    count_params, tread_params = rollup_deltas(form_type, rows)
+    statements = []
+    if count_params:
+        stmt = dialect_insert(FormDailyCount, dialect_name)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["form_type", "inspector", "day", "status"],
+            set_={"form_count": FormDailyCount.form_count + stmt.excluded.form_count}
+        )
+        statements.append((stmt, count_params))
+    if tread_params:
+        # Scalar min()/max() on SQLite
+        least, greatest = (func.least, func.greatest) if dialect_name == "postgresql" else (func.min, func.max)
+        stmt = dialect_insert(WheelTreadDaily, dialect_name)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["inspector", "day"],
+            set_={
+                "measured_count": WheelTreadDaily.measured_count + stmt.excluded.measured_count,
+                "tread_diameter_sum": WheelTreadDaily.tread_diameter_sum + stmt.excluded.tread_diameter_sum,
+                "tread_diameter_min": least(WheelTreadDaily.tread_diameter_min, stmt.excluded.tread_diameter_min),
+                "tread_diameter_max": greatest(WheelTreadDaily.tread_diameter_max, stmt.excluded.tread_diameter_max),
+            }
+        )
+        statements.append((stmt, tread_params))
+    return statements
+
+async def apply_rollups(db, form_type: str, rows: Iterable[dict]):
+    """Add inserted rows to the rollups inside the caller's (async) transaction"""
+    for stmt, params in rollup_statements(db.bind.dialect.name, form_type, rows):
+        await db.execute(stmt, params)
+
+def apply_rollups_sync(conn, form_type: str, rows: Iterable[dict]):
+    """apply_rollups() for a sync Connection or Session"""
+    dialect = conn.dialect if hasattr(conn, "dialect") else conn.get_bind().dialect
+    for stmt, params in rollup_statements(dialect.name, form_type, rows):
+        conn.execute(stmt, params)
+
+def rebuild_rollups(batch_size: int = ROLLUP_BATCH_SIZE) -> dict:
+    """Recompute both rollup tables from the forms in one transaction; returns forms read per type"""
+    db = open_session()
+    totals = {}
+    try:
+        if db.bind.dialect.name == "postgresql":
+            # Writers wait for the rebuild instead of racing it; their rollup updates land on top
+            db.connection().exec_driver_sql(
+                "LOCK TABLE form_daily_counts, wheel_tread_daily IN EXCLUSIVE MODE"
+            )
+        db.execute(delete(FormDailyCount))
+        db.execute(delete(WheelTreadDaily))
+
+        for form_type, (model, inspector_column, date_column) in FORM_TYPES.items():
+            columns = [inspector_column, date_column, "status"]
+            if form_type == "wheel_specifications":
+                columns.append("tread_diameter_new_nominal")
+            totals[form_type] = 0
+
+            # Archived months first, then the hot table in keyset batches
+            for batch in archive.iter_archived_batches(form_type, columns, [], date(1900, 1, 1)):
+                apply_rollups_sync(db, form_type, (dict(zip(columns, values)) for values in batch))
+                totals[form_type] += len(batch)
+
+            last_id = 0
+            while True:
+                rows = db.execute(
+                    select(model.id, *(getattr(model, column) for column in columns))
+                    .where(model.id > last_id).order_by(model.id).limit(batch_size)
+                ).mappings().all()
+                if not rows:
+                    break
+                apply_rollups_sync(db, form_type, rows)
+                totals[form_type] += len(rows)
+                last_id = rows[-1]["id"]
+
+        db.commit()
+        return totals
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the fleet summary rollup tables")
+    parser.add_argument("--rebuild", action="store_true", required=True, help="Recompute the rollups from all forms")
+    parser.add_argument("--batch-size", type=int, default=ROLLUP_BATCH_SIZE)
+    args = parser.parse_args()
+
+    print("Rebuilding fleet summary rollups...")
+    start = time.perf_counter()
+    totals = rebuild_rollups(args.batch_size)
+    for form_type, count in totals.items():
+        print(f" {count:,} {form_type} rolled up")
+    print(f" Rollups rebuilt in {time.perf_counter() - start:.1f}s")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 class UserLogin(BaseModel):
@@ -35,6 +35,25 @@ class WheelSpecificationFields(BaseModel):
     axleBoxHousingBoreDia: str
     wheelDiscWidth: str
 
+# Wheel specification field name -> WheelSpecification column, shared by the write and read paths
+WHEEL_SPEC_FIELD_COLUMNS = {
+    "treadDiameterNew": "tread_diameter_new",
+    "lastShopIssueSize": "last_shop_issue_size",
+    "condemningDia": "condemning_dia",
+    "wheelGauge": "wheel_gauge",
+    "variationSameAxle": "variation_same_axle",
+    "variationSameBogie": "variation_same_bogie",
+    "variationSameCoach": "variation_same_coach",
+    "wheelProfile": "wheel_profile",
+    "intermediateWWP": "intermediate_wwp",
+    "bearingSeatDiameter": "bearing_seat_diameter",
+    "rollerBearingOuterDia": "roller_bearing_outer_dia",
+    "rollerBearingBoreDia": "roller_bearing_bore_dia",
+    "rollerBearingWidth": "roller_bearing_width",
+    "axleBoxHousingBoreDia": "axle_box_housing_bore_dia",
+    "wheelDiscWidth": "wheel_disc_width",
+}
+
 class WheelSpecificationCreate(BaseModel):
     formNumber: str
     submittedBy: str
@@ -46,6 +65,14 @@ class WheelSpecificationCreate(BaseModel):
         if not v or not v.startswith('WHEEL-'):
             raise ValueError('Form number must start with WHEEL-')
         return v
+    
+    # fromisoformat also takes 20250603 and 2025-W23-2; store the canonical form
+    @validator('submittedDate')
+    def validate_submitted_date(cls, v):
+        try:
+            return datetime.strptime(v, '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            raise ValueError('Submitted date must be in YYYY-MM-DD format')
 
 class WheelSpecificationResponse(BaseModel):
     formNumber: str
@@ -72,6 +99,17 @@ class WheelSpecListResponse(BaseModel):
     success: bool = True
     message: str = "Filtered wheel specification forms fetched successfully."
     data: list
+    nextCursor: Optional[int] = None
+
+class WheelSpecBulkItemResult(BaseModel):
+    formNumber: str
+    success: bool
+    message: str
+
+class WheelSpecBulkResponse(BaseModel):
+    success: bool = True
+    message: str = "Wheel specifications submitted successfully."
+    data: List[WheelSpecBulkItemResult]
 
 # Bogie Checksheet Schemas (for future use)
 class BogieDetails(BaseModel):
@@ -101,3 +139,24 @@ class BogieChecksheetCreate(BaseModel):
     bogieDetails: BogieDetails
     bogieChecksheet: BogieChecksheetFields
     bmbcChecksheet: BMBCChecksheetFields
+    
+    # Stored as text, but compared as an ISO date by the date filters, archive months and rollups,
+    # so only YYYY-MM-DD is accepted and it is stored zero-padded
+    @validator('inspectionDate')
+    def validate_inspection_date(cls, v):
+        try:
+            return datetime.strptime(v, '%Y-%m-%d').date().isoformat()
+        except ValueError:
+            raise ValueError('Inspection date must be in YYYY-MM-DD format')
+
+class BogieChecksheetListResponse(BaseModel):
+    success: bool = True
+    message: str = "Filtered bogie checksheet forms fetched successfully."
+    data: list
+    nextCursor: Optional[int] = None
+
+# Checksheet component -> BogieChecksheet JSON column holding its condition
+BOGIE_COMPONENT_COLUMNS = {
+    **{name: "bogie_checksheet" for name in BogieChecksheetFields.model_fields},
+    **{name: "bmbc_checksheet" for name in BMBCChecksheetFields.model_fields},
+}
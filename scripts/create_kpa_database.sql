@@ -4,6 +4,9 @@ CREATE DATABASE kpa_db;
 -- Connect to the database
 \c kpa_db;
 
+-- trigram operator classes for search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- users table
 CREATE TABLE IF NOT EXISTS users (
     id SERIAL PRIMARY KEY,
@@ -22,7 +25,7 @@ CREATE TABLE IF NOT EXISTS wheel_specifications (
     id SERIAL PRIMARY KEY,
     form_number VARCHAR(50) UNIQUE NOT NULL,
     submitted_by VARCHAR(50) NOT NULL,
-    submitted_date VARCHAR(20) NOT NULL,
+    submitted_date DATE NOT NULL,
     tread_diameter_new VARCHAR(50),
     last_shop_issue_size VARCHAR(50),
     condemning_dia VARCHAR(50),
@@ -38,6 +41,19 @@ CREATE TABLE IF NOT EXISTS wheel_specifications (
     roller_bearing_width VARCHAR(50),
     axle_box_housing_bore_dia VARCHAR(50),
     wheel_disc_width VARCHAR(50),
+    tread_diameter_new_nominal DOUBLE PRECISION,
+    tread_diameter_new_min DOUBLE PRECISION,
+    tread_diameter_new_max DOUBLE PRECISION,
+    last_shop_issue_size_nominal DOUBLE PRECISION,
+    last_shop_issue_size_min DOUBLE PRECISION,
+    last_shop_issue_size_max DOUBLE PRECISION,
+    condemning_dia_nominal DOUBLE PRECISION,
+    condemning_dia_min DOUBLE PRECISION,
+    condemning_dia_max DOUBLE PRECISION,
+    wheel_gauge_nominal DOUBLE PRECISION,
+    wheel_gauge_min DOUBLE PRECISION,
+    wheel_gauge_max DOUBLE PRECISION,
+    condemning_margin DOUBLE PRECISION,
     status VARCHAR(20) DEFAULT 'Saved',
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
@@ -57,11 +73,104 @@ CREATE TABLE IF NOT EXISTS bogie_checksheets (
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- idempotency_keys table (stored responses for client retries)
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key VARCHAR(255) NOT NULL,
+    request_path VARCHAR(255) NOT NULL,
+    request_hash VARCHAR(64),
+    status_code INTEGER NOT NULL,
+    response_body JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (key, request_path)
+);
+
+-- rollup tables behind GET /api/forms/summary (maintained on insert, see rollups.py)
+CREATE TABLE IF NOT EXISTS form_daily_counts (
+    form_type VARCHAR(30) NOT NULL,
+    inspector VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    form_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (form_type, inspector, day, status)
+);
+
+CREATE TABLE IF NOT EXISTS wheel_tread_daily (
+    inspector VARCHAR(50) NOT NULL,
+    day DATE NOT NULL,
+    measured_count INTEGER NOT NULL DEFAULT 0,
+    tread_diameter_sum DOUBLE PRECISION NOT NULL DEFAULT 0,
+    tread_diameter_min DOUBLE PRECISION,
+    tread_diameter_max DOUBLE PRECISION,
+    PRIMARY KEY (inspector, day)
+);
+
+-- change feed: one row per inserted form, in commit order (see changefeed.py)
+CREATE TABLE IF NOT EXISTS form_changes (
+    seq SERIAL PRIMARY KEY,
+    form_type VARCHAR(30) NOT NULL,
+    form_id INTEGER NOT NULL,
+    created_at TIMESTAMP NOT NULL
+);
+
+-- forms written by the ingest batcher, so a retried flush recognises its own
+-- earlier commit (see ingest_queue.py)
+CREATE TABLE IF NOT EXISTS ingest_receipts (
+    form_type VARCHAR(30) NOT NULL,
+    form_number VARCHAR(50) NOT NULL,
+    submission_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (form_type, form_number)
+);
+
+-- form numbers of rows moved to the Parquet archive (see archive.py);
+-- inserts of an archived form number are skipped, like any other conflict
+CREATE TABLE IF NOT EXISTS archived_form_numbers (
+    form_type VARCHAR(30) NOT NULL,
+    form_number VARCHAR(50) NOT NULL,
+    PRIMARY KEY (form_type, form_number)
+);
+
+CREATE OR REPLACE FUNCTION skip_archived_form_number() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM archived_form_numbers
+               WHERE form_type = TG_TABLE_NAME AND form_number = NEW.form_number) THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS wheel_specifications_skip_archived ON wheel_specifications;
+CREATE TRIGGER wheel_specifications_skip_archived BEFORE INSERT ON wheel_specifications
+    FOR EACH ROW EXECUTE FUNCTION skip_archived_form_number();
+DROP TRIGGER IF EXISTS bogie_checksheets_skip_archived ON bogie_checksheets;
+CREATE TRIGGER bogie_checksheets_skip_archived BEFORE INSERT ON bogie_checksheets
+    FOR EACH ROW EXECUTE FUNCTION skip_archived_form_number();
+
 -- indexes for better performance
 CREATE INDEX idx_wheel_specs_form_number ON wheel_specifications(form_number);
 CREATE INDEX idx_wheel_specs_submitted_by ON wheel_specifications(submitted_by);
 CREATE INDEX idx_wheel_specs_submitted_date ON wheel_specifications(submitted_date);
+CREATE INDEX idx_wheel_specs_submitted_by_date ON wheel_specifications(submitted_by, submitted_date);
+CREATE INDEX ix_wheel_specifications_tread_diameter_new_nominal ON wheel_specifications(tread_diameter_new_nominal);
+CREATE INDEX ix_wheel_specifications_condemning_margin ON wheel_specifications(condemning_margin);
 CREATE INDEX idx_bogie_form_number ON bogie_checksheets(form_number);
 CREATE INDEX idx_bogie_inspection_by ON bogie_checksheets(inspection_by);
+CREATE INDEX idx_bogie_inspection_date ON bogie_checksheets(inspection_date);
+CREATE INDEX idx_bogie_bogie_no ON bogie_checksheets((bogie_details ->> 'bogieNo'));
+CREATE INDEX idx_bogie_checksheet_gin ON bogie_checksheets USING gin (bogie_checksheet jsonb_path_ops);
+CREATE INDEX idx_bogie_bmbc_checksheet_gin ON bogie_checksheets USING gin (bmbc_checksheet jsonb_path_ops);
 CREATE INDEX idx_users_user_id ON users(user_id);
 CREATE INDEX idx_users_phone ON users(phone_number);
+CREATE INDEX idx_form_daily_counts_day ON form_daily_counts(day);
+CREATE INDEX idx_wheel_tread_daily_day ON wheel_tread_daily(day);
+CREATE INDEX idx_form_changes_created_at ON form_changes(created_at);
+CREATE INDEX idx_ingest_receipts_created_at ON ingest_receipts(created_at);
+
+-- substring and fuzzy search (search.py)
+CREATE INDEX idx_wheel_specs_form_number_trgm ON wheel_specifications USING gist (form_number gist_trgm_ops);
+CREATE INDEX idx_wheel_specs_submitted_by_trgm ON wheel_specifications USING gist (submitted_by gist_trgm_ops);
+CREATE INDEX idx_bogie_form_number_trgm ON bogie_checksheets USING gist (form_number gist_trgm_ops);
+CREATE INDEX idx_bogie_inspection_by_trgm ON bogie_checksheets USING gist (inspection_by gist_trgm_ops);
+CREATE INDEX idx_bogie_bogie_no_trgm ON bogie_checksheets USING gist ((bogie_details ->> 'bogieNo') gist_trgm_ops);
+CREATE INDEX idx_users_full_name_trgm ON users USING gist (full_name gist_trgm_ops);
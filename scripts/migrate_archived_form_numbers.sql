@@ -0,0 +1,39 @@
+-- Keep the form numbers of archived rows reserved. archive.py deletes
+-- archived months from the hot tables, which also frees their form numbers
+-- in the unique index; the trigger below skips inserts of those numbers so
+-- they are reported as "already exists" like any other conflict.
+--
+-- Run once, before the next archive.py run:
+--   psql -d kpa_db -f scripts/migrate_archived_form_numbers.sql
+--
+-- Months archived before this migration are not recorded; to reserve them,
+-- load their form numbers from the Parquet files into archived_form_numbers.
+
+BEGIN;
+
+-- form numbers of rows moved to the Parquet archive (see archive.py);
+-- inserts of an archived form number are skipped, like any other conflict
+CREATE TABLE IF NOT EXISTS archived_form_numbers (
+    form_type VARCHAR(30) NOT NULL,
+    form_number VARCHAR(50) NOT NULL,
+    PRIMARY KEY (form_type, form_number)
+);
+
+CREATE OR REPLACE FUNCTION skip_archived_form_number() RETURNS trigger AS $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM archived_form_numbers
+               WHERE form_type = TG_TABLE_NAME AND form_number = NEW.form_number) THEN
+        RETURN NULL;
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS wheel_specifications_skip_archived ON wheel_specifications;
+CREATE TRIGGER wheel_specifications_skip_archived BEFORE INSERT ON wheel_specifications
+    FOR EACH ROW EXECUTE FUNCTION skip_archived_form_number();
+DROP TRIGGER IF EXISTS bogie_checksheets_skip_archived ON bogie_checksheets;
+CREATE TRIGGER bogie_checksheets_skip_archived BEFORE INSERT ON bogie_checksheets
+    FOR EACH ROW EXECUTE FUNCTION skip_archived_form_number();
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- Rewrite bogie_checksheets.inspection_date as zero-padded YYYY-MM-DD.
+-- The column is text compared as a string by the date filters and archive
+-- months, so dates stored as 20250603, 2025-6-3 or 2025-W23-2 (accepted
+-- before the API checked the format strictly) fell outside every range.
+--
+-- Run once, before archiving any month:
+--   psql -d kpa_db -f scripts/migrate_bogie_inspection_dates.sql
+
+BEGIN;
+
+UPDATE bogie_checksheets
+    SET inspection_date = to_char(to_date(inspection_date, 'YYYYMMDD'), 'YYYY-MM-DD')
+    WHERE inspection_date ~ '^\d{8}$';
+
+UPDATE bogie_checksheets
+    SET inspection_date = to_char(to_date(inspection_date, 'IYYY-"W"IW-ID'), 'YYYY-MM-DD')
+    WHERE inspection_date ~ '^\d{4}-W\d{2}-\d$';
+
+UPDATE bogie_checksheets
+    SET inspection_date = to_char(inspection_date::date, 'YYYY-MM-DD')
+    WHERE inspection_date ~ '^\d{4}-\d{1,2}-\d{1,2}$'
+      AND inspection_date !~ '^\d{4}-\d{2}-\d{2}$';
+
+COMMIT;
+
+-- Rows left that are not YYYY-MM-DD need fixing by hand; list them with:
+--   SELECT id, form_number, inspection_date FROM bogie_checksheets
+--   WHERE inspection_date !~ '^\d{4}-\d{2}-\d{2}$';
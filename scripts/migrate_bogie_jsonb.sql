@@ -0,0 +1,30 @@
+-- Unwrap double-encoded bogie checksheet JSON and add the query indexes
+-- used by GET /api/forms/bogie-checksheet.
+--
+-- Earlier versions stored json.dumps(...) output in the JSONB columns, so each
+-- value is a JSON *string* containing the object. This rewrites them as objects.
+--
+--   psql -d kpa_db -f scripts/migrate_bogie_jsonb.sql
+
+BEGIN;
+
+UPDATE bogie_checksheets
+SET bogie_details = (bogie_details #>> '{}')::jsonb
+WHERE jsonb_typeof(bogie_details) = 'string';
+
+UPDATE bogie_checksheets
+SET bogie_checksheet = (bogie_checksheet #>> '{}')::jsonb
+WHERE jsonb_typeof(bogie_checksheet) = 'string';
+
+UPDATE bogie_checksheets
+SET bmbc_checksheet = (bmbc_checksheet #>> '{}')::jsonb
+WHERE jsonb_typeof(bmbc_checksheet) = 'string';
+
+CREATE INDEX IF NOT EXISTS idx_bogie_inspection_date ON bogie_checksheets(inspection_date);
+CREATE INDEX IF NOT EXISTS idx_bogie_bogie_no ON bogie_checksheets((bogie_details ->> 'bogieNo'));
+CREATE INDEX IF NOT EXISTS idx_bogie_checksheet_gin ON bogie_checksheets USING gin (bogie_checksheet jsonb_path_ops);
+CREATE INDEX IF NOT EXISTS idx_bogie_bmbc_checksheet_gin ON bogie_checksheets USING gin (bmbc_checksheet jsonb_path_ops);
+
+COMMIT;
+
+ANALYZE bogie_checksheets;
@@ -0,0 +1,8 @@
+-- Store a hash of the request body with each Idempotency-Key, so a key
+-- reused for a different body is rejected instead of replayed.
+-- Existing keys keep a NULL hash and are replayed as before.
+--
+--   psql -d kpa_db -f scripts/migrate_idempotency_hash.sql
+
+ALTER TABLE idempotency_keys
+    ADD COLUMN IF NOT EXISTS request_hash VARCHAR(64);
@@ -0,0 +1,17 @@
+-- Record which queued submission wrote each form, so a retried ingest flush
+-- only reports "stored" when the existing form is its own earlier commit.
+--
+--   psql -d kpa_db -f scripts/migrate_ingest_receipts.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS ingest_receipts (
+    form_type VARCHAR(30) NOT NULL,
+    form_number VARCHAR(50) NOT NULL,
+    submission_hash VARCHAR(64) NOT NULL,
+    created_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (form_type, form_number)
+);
+CREATE INDEX IF NOT EXISTS idx_ingest_receipts_created_at ON ingest_receipts(created_at);
+
+COMMIT;
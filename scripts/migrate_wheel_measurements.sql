@@ -0,0 +1,28 @@
+-- Add numeric measurement columns to wheel_specifications.
+-- Populate them afterwards with: python backfill_measurements.py
+--
+--   psql -d kpa_db -f scripts/migrate_wheel_measurements.sql
+
+BEGIN;
+
+ALTER TABLE wheel_specifications
+    ADD COLUMN IF NOT EXISTS tread_diameter_new_nominal DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS tread_diameter_new_min DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS tread_diameter_new_max DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS last_shop_issue_size_nominal DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS last_shop_issue_size_min DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS last_shop_issue_size_max DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS condemning_dia_nominal DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS condemning_dia_min DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS condemning_dia_max DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS wheel_gauge_nominal DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS wheel_gauge_min DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS wheel_gauge_max DOUBLE PRECISION,
+    ADD COLUMN IF NOT EXISTS condemning_margin DOUBLE PRECISION;
+
+CREATE INDEX IF NOT EXISTS ix_wheel_specifications_tread_diameter_new_nominal
+    ON wheel_specifications(tread_diameter_new_nominal);
+CREATE INDEX IF NOT EXISTS ix_wheel_specifications_condemning_margin
+    ON wheel_specifications(condemning_margin);
+
+COMMIT;
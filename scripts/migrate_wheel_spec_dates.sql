@@ -0,0 +1,28 @@
+-- Migrate wheel_specifications.submitted_date from VARCHAR to DATE
+-- and add the filter indexes used by GET /api/forms/wheel-specifications.
+-- The API keeps accepting and returning "YYYY-MM-DD" strings.
+--
+-- Run once against an existing database:
+--   psql -d kpa_db -f scripts/migrate_wheel_spec_dates.sql
+
+BEGIN;
+
+-- Compact (20250603) and unpadded (2025-6-3) dates cast as they are; the
+-- API used to accept ISO week dates (2025-W23-2) too, which need converting
+UPDATE wheel_specifications
+    SET submitted_date = to_char(to_date(submitted_date, 'IYYY-"W"IW-ID'), 'YYYY-MM-DD')
+    WHERE submitted_date ~ '^\d{4}-W\d{2}-\d$';
+
+-- Any other rows that are not dates must be fixed first; list them with:
+--   SELECT id, form_number, submitted_date FROM wheel_specifications
+--   WHERE submitted_date !~ '^\d{4}-\d{2}-\d{2}$';
+ALTER TABLE wheel_specifications
+    ALTER COLUMN submitted_date TYPE DATE USING submitted_date::date;
+
+CREATE INDEX IF NOT EXISTS idx_wheel_specs_submitted_by ON wheel_specifications(submitted_by);
+CREATE INDEX IF NOT EXISTS idx_wheel_specs_submitted_date ON wheel_specifications(submitted_date);
+CREATE INDEX IF NOT EXISTS idx_wheel_specs_submitted_by_date ON wheel_specifications(submitted_by, submitted_date);
+
+COMMIT;
+
+ANALYZE wheel_specifications;
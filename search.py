@@ -0,0 +1,255 @@
+"""
+Substring and fuzzy search over form numbers, bogie numbers and inspectors
+
+Searched fields:
+    - wheel specifications: form number, submitted by
+    - bogie checksheets: form number, bogie number, inspection by
+    - users (active): full name
+
+Candidates come from trigram indexes, so a search never scans a table:
+    - PostgreSQL: pg_trgm GiST indexes. Each field is one query, filtered by
+      word similarity (<%) or ILIKE substring and ordered nearest-first
+      (<<->), so the index returns the best SEARCH_CANDIDATES matches.
+    - SQLite: FTS5 tables with the trigram tokenizer (see models.py). The
+      search text as a phrase finds substring matches; only when nothing
+      matches does a second query OR the search text's trigrams, with bm25
+      putting rows that share the most trigrams first.
+
+The candidates are then scored the same way on both backends: exact match,
+then prefix, then substring, with trigram similarity breaking ties. Results
+are paginated by offset within the first SEARCH_CANDIDATES matches.
+
+Rebuild the SQLite search tables for rows that existed before they did:
+    python search.py --rebuild
+"""
+import argparse
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, String, bindparam, literal, literal_column, select, text
+
+from models import WheelSpecification, BogieChecksheet, User, SQLITE_SEARCH_TABLES
+
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "200"))
+MIN_QUERY_LENGTH = 3  # one trigram
+
+# Result type -> (model, source table, {field: PostgreSQL column}, {response key: column})
+SEARCH_SOURCES = {
+    "wheelSpecification": (
+        WheelSpecification, "wheel_specifications",
+        {
+            "formNumber": WheelSpecification.form_number,
+            "submittedBy": WheelSpecification.submitted_by,
+        },
+        {
+            "formNumber": WheelSpecification.form_number,
+            "submittedBy": WheelSpecification.submitted_by,
+            "submittedDate": WheelSpecification.submitted_date,
+        },
+    ),
+    "bogieChecksheet": (
+        BogieChecksheet, "bogie_checksheets",
+        {
+            "formNumber": BogieChecksheet.form_number,
+            # Written like the idx_bogie_bogie_no_trgm expression so the index matches
+            "bogieNo": BogieChecksheet.bogie_details.op("->>")(literal_column("'bogieNo'")),
+            "inspectionBy": BogieChecksheet.inspection_by,
+        },
+        {
+            "formNumber": BogieChecksheet.form_number,
+            "inspectionBy": BogieChecksheet.inspection_by,
+            "inspectionDate": BogieChecksheet.inspection_date,
+        },
+    ),
+    "user": (
+        User, "users",
+        {"fullName": User.full_name},
+        {"userId": User.user_id, "fullName": User.full_name},
+    ),
+}
+
+# Search field -> FTS5 column
+SQLITE_FIELD_COLUMNS = {
+    "formNumber": "form_number",
+    "submittedBy": "submitted_by",
+    "bogieNo": "bogie_no",
+    "inspectionBy": "inspection_by",
+    "fullName": "full_name",
+}
+
+# Scoring (identical on both backends)
+
+def _trigrams(value: str) -> set:
+    """pg_trgm-style trigrams: lower-cased alphanumeric words padded with two leading blanks and one trailing"""
+    grams = set()
+    for word in re.findall(r"[0-9a-z]+", value.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def _similarity(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+def match_score(query: str, value: Optional[str]) -> float:
+    """Exact (3) > prefix (2) > substring (1) > fuzzy, plus trigram similarity in [0, 1]"""
+    if not value:
+        return 0.0
+    q, v = query.lower(), value.lower()
+    query_grams = _trigrams(q)
+    # Best of the whole value and each word, so a surname alone matches a full name
+    similarity = max(
+        [_similarity(query_grams, _trigrams(v))]
+        + [_similarity(query_grams, _trigrams(word)) for word in re.findall(r"[0-9a-z]+", v)]
+    )
+    if v == q:
+        bonus = 3
+    elif v.startswith(q):
+        bonus = 2
+    elif q in v:
+        bonus = 1
+    else:
+        bonus = 0
+    return round(bonus + similarity, 4)
+
+# Candidate queries
+
+def _like_pattern(query: str) -> str:
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+def _postgres_candidates(source: str, query: str, limit: int):
+    """One nearest-first index query per searched field"""
+    model, _, fields, summary = SEARCH_SOURCES[source]
+    statements = []
+    for field, column in fields.items():
+        stmt = select(
+            model.id.label("id"),
+            literal(field).label("field"),
+            column.label("value"),
+            *(value.label(key) for key, value in summary.items())
+        ).where(
+            literal(query).op("<%", is_comparison=True)(column) | column.ilike(_like_pattern(query), escape="\\")
+        ).order_by(literal(query).op("<<->")(column)).limit(limit)
+        if model is User:
+            stmt = stmt.where(User.is_active.is_(True))
+        statements.append(stmt)
+    return statements
+
+def _fts_phrase(text_: str) -> str:
+    return '"' + text_.replace('"', '""') + '"'
+
+def _fts_query(query: str, fuzzy: bool) -> Optional[str]:
+    """
+    FTS5 expression for the query. The trigram tokenizer turns a phrase into
+    a substring match; the fuzzy form ORs the query's trigrams instead.
+    None when the query has no trigram, which FTS5 cannot match.
+    """
+    if len(query) < MIN_QUERY_LENGTH:
+        return None
+    if not fuzzy:
+        return _fts_phrase(query)
+    lowered = query.lower()
+    grams = dict.fromkeys(lowered[i:i + 3] for i in range(len(lowered) - 2))
+    return " OR ".join(_fts_phrase(gram) for gram in grams)
+
+def _sqlite_candidates(source: str, query: str, limit: int, fuzzy: bool):
+    """
+    One FTS5 query per source returning every searched field. Substring
+    matches are taken as found; fuzzy matches are ordered by bm25 so rows
+    sharing the most trigrams come first. None when there is nothing to match.
+    """
+    match = _fts_query(query, fuzzy)
+    if match is None:
+        return None
+    model, table, fields, summary = SEARCH_SOURCES[source]
+    fts_table, _ = SQLITE_SEARCH_TABLES[table]
+    order_by = "ORDER BY rank " if fuzzy else ""
+    matches = text(
+        f"SELECT rowid AS id, {', '.join(SQLITE_FIELD_COLUMNS[field] for field in fields)} "
+        f"FROM {fts_table} WHERE {fts_table} MATCH :match {order_by}LIMIT :limit"
+    ).columns(id=Integer, **{SQLITE_FIELD_COLUMNS[field]: String for field in fields})
+    matches = matches.bindparams(bindparam("match", match), bindparam("limit", limit)).subquery("matches")
+    stmt = select(
+        model.id.label("id"),
+        *(matches.c[SQLITE_FIELD_COLUMNS[field]].label(f"match_{field}") for field in fields),
+        *(value.label(key) for key, value in summary.items())
+    ).join_from(model, matches, model.id == matches.c.id)
+    if model is User:
+        stmt = stmt.where(User.is_active.is_(True))
+    return stmt
+
+def _summary_value(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+async def search(db, query: str, sources: List[str], limit: int, offset: int) -> Tuple[List[dict], Optional[int]]:
+    """Ranked results for one page, and the offset of the next page (None on the last page)"""
+    dialect_name = db.bind.dialect.name
+    best: Dict[Tuple[str, int], dict] = {}
+
+    def consider(source: str, row, field: str, value: Optional[str]):
+        score = match_score(query, value)
+        key = (source, row.id)
+        if key in best and best[key]["score"] >= score:
+            return
+        _, _, _, summary = SEARCH_SOURCES[source]
+        best[key] = {
+            "type": source,
+            "score": score,
+            "matchedField": field,
+            "matchedText": value,
+            **{name: _summary_value(getattr(row, name)) for name in summary},
+        }
+
+    if dialect_name == "postgresql":
+        for source in sources:
+            for stmt in _postgres_candidates(source, query, SEARCH_CANDIDATES):
+                for row in (await db.execute(stmt)).all():
+                    consider(source, row, row.field, row.value)
+    else:
+        # Ranking every row that shares a trigram is costly, so fuzzy
+        # matching only runs when the text is not a substring of anything
+        for fuzzy in (False, True):
+            for source in sources:
+                _, _, fields, _ = SEARCH_SOURCES[source]
+                stmt = _sqlite_candidates(source, query, SEARCH_CANDIDATES, fuzzy)
+                if stmt is None:
+                    continue
+                for row in (await db.execute(stmt)).all():
+                    for field in fields:
+                        consider(source, row, field, getattr(row, f"match_{field}"))
+            if best:
+                break
+
+    ranked = sorted(
+        best.items(),
+        key=lambda item: (-item[1]["score"], item[1]["matchedText"] or "", item[0][0], item[0][1])
+    )
+    page = [result for _, result in ranked[offset:offset + limit]]
+    next_offset = offset + limit if len(ranked) > offset + limit else None
+    return page, next_offset
+
+def rebuild_sqlite_search_tables(conn):
+    """Refill the FTS5 tables from their source tables"""
+    for table, (fts_table, columns) in SQLITE_SEARCH_TABLES.items():
+        names = ", ".join(columns)
+        values = ", ".join(expression.format(row=table) for expression in columns.values())
+        conn.exec_driver_sql(f"DELETE FROM {fts_table}")
+        conn.exec_driver_sql(f"INSERT INTO {fts_table} (rowid, {names}) SELECT {table}.id, {values} FROM {table}")
+
+if __name__ == "__main__":
+    from database import get_engine
+    from init_db import create_schema
+
+    parser = argparse.ArgumentParser(description="Maintain the search indexes")
+    parser.add_argument("--rebuild", action="store_true", required=True, help="Refill the SQLite search tables")
+    args = parser.parse_args()
+
+    engine = get_engine()
+    if engine.dialect.name != "sqlite":
+        print("PostgreSQL trigram indexes are maintained by the database; run `python init_db.py` to create them")
+    else:
+        create_schema()
+        with engine.begin() as conn:
+            rebuild_sqlite_search_tables(conn)
+        print("Search tables rebuilt")
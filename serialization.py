@@ -0,0 +1,88 @@
+"""
+Fast serialization for wheel specification responses
+
+Rows are selected as plain column tuples (no ORM objects) and encoded
+straight to JSON bytes with orjson, using the shared field mapping in
+schemas.WHEEL_SPEC_FIELD_COLUMNS.
+"""
+from typing import Iterable, Optional
+
+import orjson
+
+from models import WheelSpecification, BogieChecksheet
+from schemas import WHEEL_SPEC_FIELD_COLUMNS
+
+FIELD_NAMES = tuple(WHEEL_SPEC_FIELD_COLUMNS)
+
+# Column order of every row passed to the functions below
+WHEEL_SPEC_COLUMNS = (
+    WheelSpecification.id,
+    WheelSpecification.form_number,
+    WheelSpecification.submitted_by,
+    WheelSpecification.submitted_date,
+    *(getattr(WheelSpecification, column) for column in WHEEL_SPEC_FIELD_COLUMNS.values()),
+    WheelSpecification.status,
+)
+
+WHEEL_SPEC_COLUMN_NAMES = tuple(column.key for column in WHEEL_SPEC_COLUMNS)
+
+_FIELDS = slice(4, 4 + len(FIELD_NAMES))
+_STATUS = 4 + len(FIELD_NAMES)
+
+def wheel_spec_row_to_dict(row) -> dict:
+    """Format a WHEEL_SPEC_COLUMNS row as the API response shape"""
+    return {
+        "formNumber": row[1],
+        "submittedBy": row[2],
+        "submittedDate": row[3],
+        "fields": dict(zip(FIELD_NAMES, row[_FIELDS])),
+        "status": row[_STATUS],
+    }
+
+def dump_wheel_spec_list(rows: Iterable, message: str, next_cursor: Optional[int] = None) -> bytes:
+    """Encode rows as a WheelSpecListResponse body"""
+    return orjson.dumps({
+        "success": True,
+        "message": message,
+        "data": [wheel_spec_row_to_dict(row) for row in rows],
+        "nextCursor": next_cursor,
+    })
+
+def dump_wheel_spec_ndjson(row) -> bytes:
+    """Encode one row as an NDJSON line"""
+    return orjson.dumps(wheel_spec_row_to_dict(row)) + b"\n"
+
+# Column order of every bogie row passed to the functions below
+BOGIE_COLUMNS = (
+    BogieChecksheet.id,
+    BogieChecksheet.form_number,
+    BogieChecksheet.inspection_by,
+    BogieChecksheet.inspection_date,
+    BogieChecksheet.bogie_details,
+    BogieChecksheet.bogie_checksheet,
+    BogieChecksheet.bmbc_checksheet,
+    BogieChecksheet.status,
+)
+
+BOGIE_COLUMN_NAMES = tuple(column.key for column in BOGIE_COLUMNS)
+
+def bogie_row_to_dict(row) -> dict:
+    """Format a BOGIE_COLUMNS row as the API response shape"""
+    return {
+        "formNumber": row[1],
+        "inspectionBy": row[2],
+        "inspectionDate": row[3],
+        "bogieDetails": row[4],
+        "bogieChecksheet": row[5],
+        "bmbcChecksheet": row[6],
+        "status": row[7],
+    }
+
+def dump_bogie_list(rows: Iterable, message: str, next_cursor: Optional[int] = None) -> bytes:
+    """Encode rows as a BogieChecksheetListResponse body"""
+    return orjson.dumps({
+        "success": True,
+        "message": message,
+        "data": [bogie_row_to_dict(row) for row in rows],
+        "nextCursor": next_cursor,
+    })
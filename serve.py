@@ -0,0 +1,124 @@
+"""
+Production server: several worker processes with budgeted connection pools
+
+Workers default to the CPU count. The database's connection budget is
+max_connections minus DB_RESERVED_CONNECTIONS (left for psql, migrations,
+archive and backfill scripts). Each worker gets an equal share of it as
+DB_POOL_SIZE + DB_MAX_OVERFLOW, so adding workers cannot exhaust PostgreSQL.
+Connections a worker opens outside its pool (IMPORT_CONNECTIONS for imports
+started through the API, and on PostgreSQL the change feed's LISTEN
+connection) come off its share first.
+
+Runs gunicorn with uvicorn workers when gunicorn is installed:
+    - SIGHUP starts new workers and retires the old ones gracefully
+    - SIGTERM stops accepting connections and drains in-flight requests for
+      up to GRACEFUL_TIMEOUT seconds
+    - TTIN/TTOU add or remove a worker
+Without gunicorn it falls back to `uvicorn --workers`, which drains on SIGTERM.
+
+Point load balancer health checks at GET /health/ready.
+
+Usage:
+    python serve.py [--workers 4] [--host 0.0.0.0] [--port 8000]
+"""
+import argparse
+import importlib.util
+import os
+import sys
+from typing import Optional, Tuple
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from database import DATABASE_URL, IMPORT_CONNECTIONS, safe_url
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "0"))
+WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+WEB_PORT = int(os.getenv("WEB_PORT", "8000"))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+KEEP_ALIVE_SECONDS = int(os.getenv("KEEP_ALIVE_SECONDS", "5"))
+
+# 0 asks the database (SHOW max_connections)
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))
+
+def default_workers() -> int:
+    return WEB_WORKERS or os.cpu_count() or 1
+
+def database_max_connections(url: str) -> Optional[int]:
+    """The server's max_connections, or None for databases without a connection limit"""
+    if DB_MAX_CONNECTIONS:
+        return DB_MAX_CONNECTIONS
+    if not url.startswith("postgresql"):
+        return None
+    engine = create_engine(url, poolclass=NullPool)
+    try:
+        with engine.connect() as conn:
+            return int(conn.execute(text("SHOW max_connections")).scalar())
+    finally:
+        engine.dispose()
+
+def dedicated_connections(url: str) -> int:
+    """Connections each worker opens outside its pool"""
+    # The change feed LISTENs on its own connection on PostgreSQL (changefeed.py)
+    listen = 1 if url.startswith("postgresql") else 0
+    return IMPORT_CONNECTIONS + listen
+
+def pool_budget(
+    max_connections: int, workers: int, reserved: int = DB_RESERVED_CONNECTIONS, dedicated: int = IMPORT_CONNECTIONS
+) -> Tuple[int, int]:
+    """Split the connection budget into (pool_size, max_overflow) per worker, after its `dedicated` connections"""
+    per_worker = (max_connections - reserved) // workers - dedicated
+    if per_worker < 1:
+        raise ValueError(
+            f"{workers} workers do not fit in max_connections={max_connections} "
+            f"with {reserved} reserved and {dedicated} dedicated per worker; "
+            f"use fewer workers or raise max_connections"
+        )
+    # Keep a third of the share open, allow bursts up to the rest
+    pool_size = max(1, per_worker // 3)
+    return pool_size, per_worker - pool_size
+
+def server_command(workers: int, host: str, port: int) -> list:
+    if importlib.util.find_spec("gunicorn") is not None:
+        return [
+            sys.executable, "-m", "gunicorn", "main:app",
+            "--worker-class", "uvicorn.workers.UvicornWorker",
+            "--workers", str(workers),
+            "--bind", f"{host}:{port}",
+            "--graceful-timeout", str(GRACEFUL_TIMEOUT),
+            "--keep-alive", str(KEEP_ALIVE_SECONDS),
+        ]
+    return [
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--workers", str(workers),
+        "--host", host,
+        "--port", str(port),
+        "--timeout-graceful-shutdown", str(GRACEFUL_TIMEOUT),
+        "--timeout-keep-alive", str(KEEP_ALIVE_SECONDS),
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the KPA Form Data API with multiple workers")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="Worker processes (default: CPU count)")
+    parser.add_argument("--host", default=WEB_HOST)
+    parser.add_argument("--port", type=int, default=WEB_PORT)
+    args = parser.parse_args()
+    
+    max_connections = database_max_connections(DATABASE_URL)
+    if max_connections is not None:
+        try:
+            dedicated = dedicated_connections(DATABASE_URL)
+            pool_size, max_overflow = pool_budget(max_connections, args.workers, dedicated=dedicated)
+        except ValueError as e:
+            sys.exit(f" {e}")
+        # Inherited by every worker process
+        os.environ["DB_POOL_SIZE"] = str(pool_size)
+        os.environ["DB_MAX_OVERFLOW"] = str(max_overflow)
+        print(f" Connection budget: max_connections={max_connections}, {DB_RESERVED_CONNECTIONS} reserved, "
+              f"{args.workers} workers x (pool {pool_size} + overflow {max_overflow} + {dedicated} dedicated)")
+    
+    print(f" Starting {args.workers} workers for {safe_url(DATABASE_URL)} on http://{args.host}:{args.port}")
+    command = server_command(args.workers, args.host, args.port)
+    # Replace this process so signals go straight to the server master
+    os.execv(command[0], command)